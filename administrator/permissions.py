@@ -0,0 +1,118 @@
+from django.contrib.auth.models import Permission
+from django.db import transaction
+from django.db.models import Prefetch
+from users.models import Users
+
+# Usuarios por página en la matriz de permisos
+MATRIX_PAGE_SIZE = 25
+
+# Aplicación cuyos permisos se muestran por defecto como columnas
+DEFAULT_APP = 'users'
+
+
+def permission_apps():
+    """
+    Aplicaciones que tienen permisos y sus modelos, {app_label: [modelos]}, para elegir las
+    columnas de la matriz: una aplicación completa puede tener decenas de permisos, así que se
+    muestra un modelo por vez.
+    """
+    apps = {}
+    for app_label, model in (
+        Permission.objects.order_by('content_type__app_label', 'content_type__model')
+        .values_list('content_type__app_label', 'content_type__model').distinct()
+    ):
+        apps.setdefault(app_label, []).append(model)
+    return apps
+
+
+def app_permissions(app_label, model=None):
+    """Permisos de una aplicación, o solo de uno de sus modelos (columnas de la matriz)"""
+    permisos = Permission.objects.filter(content_type__app_label=app_label)
+    if model:
+        permisos = permisos.filter(content_type__model=model)
+    return list(permisos.select_related('content_type').order_by('content_type__model', 'codename'))
+
+
+def matrix_users():
+    """
+    Usuarios con todo lo que necesita la matriz en consultas fijas:
+    roles por select_related, permisos directos y permisos de grupo por prefetch.
+    """
+    permisos = Permission.objects.select_related('content_type')
+    return (
+        Users.objects.select_related('administrator', 'receptions')
+        .prefetch_related(
+            Prefetch('user_permissions', queryset=permisos),
+            Prefetch('groups__permissions', queryset=permisos),
+        )
+        .order_by('username')
+    )
+
+
+def matrix_rows(users, columnas):
+    """
+    Filas de la matriz: para cada usuario y permiso indica si está asignado
+    directamente o si lo hereda de un grupo. Usa solo los datos precargados.
+    """
+    filas = []
+    for user in users:
+        directos = {perm.id for perm in user.user_permissions.all()}
+        heredados = {perm.id for group in user.groups.all() for perm in group.permissions.all()}
+        filas.append({
+            'user': user,
+            'permisos': user.user_permissions.all(),
+            'celdas': [
+                {'perm': perm, 'directo': perm.id in directos, 'heredado': perm.id in heredados}
+                for perm in columnas
+            ],
+        })
+    return filas
+
+
+def parse_ids(valores):
+    """Convierte una lista de valores del POST en ids enteros, ignorando los inválidos"""
+    ids = set()
+    for valor in valores:
+        try:
+            ids.add(int(valor))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+def parse_grants(valores):
+    """Convierte los checkbox "usuario:permiso" de la matriz en pares (user_id, perm_id)"""
+    pares = set()
+    for valor in valores:
+        user_id, _, perm_id = valor.partition(':')
+        try:
+            pares.add((int(user_id), int(perm_id)))
+        except ValueError:
+            continue
+    return pares
+
+
+def set_user_permissions(user_ids, perm_ids, add=(), remove=()):
+    """
+    Aplica en bloque los cambios de permisos directos con un INSERT y un DELETE.
+    Solo se tocan los pares dentro de user_ids x perm_ids; devuelve (agregados, quitados).
+    """
+    user_ids = set(Users.objects.filter(pk__in=parse_ids(user_ids)).values_list('pk', flat=True))
+    perm_ids = set(Permission.objects.filter(pk__in=parse_ids(perm_ids)).values_list('pk', flat=True))
+    add = {(u, p) for u, p in add if u in user_ids and p in perm_ids}
+    remove = {(u, p) for u, p in remove if u in user_ids and p in perm_ids} - add
+    if not add and not remove:
+        return 0, 0
+
+    Through = Users.user_permissions.through
+    with transaction.atomic():
+        actuales = {
+            (u, p): pk for pk, u, p in
+            Through.objects.filter(users_id__in=user_ids, permission_id__in=perm_ids)
+            .values_list('pk', 'users_id', 'permission_id')
+        }
+        nuevos = add - actuales.keys()
+        Through.objects.bulk_create([Through(users_id=u, permission_id=p) for u, p in nuevos])
+        quitar = [actuales[par] for par in remove if par in actuales]
+        Through.objects.filter(pk__in=quitar).delete()
+    return len(nuevos), len(quitar)
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from users.counters import record_total
+from users.models import Users
+
+# Clave de las estadísticas de usuarios del dashboard en la caché
+DASHBOARD_STATS_KEY = 'admin_dashboard_stats'
+
+
+def _compute_user_stats():
+    # Todos los conteos de usuarios en una sola consulta (LEFT JOIN a los perfiles)
+    conteos = Users.objects.aggregate(
+        total_users=Count('id'),
+        total_doctors=Count('id', filter=Q(is_doctor=True)),
+        admin_count=Count('administrator'),
+        reception_count=Count('receptions'),
+    )
+    conteos['total_staff'] = conteos['admin_count'] + conteos['reception_count']
+    return conteos
+
+
+def dashboard_stats():
+    """
+    Estadísticas del dashboard de administración. El total de pacientes sale del contador
+    RecordCount (users/counters.py). Los conteos de usuarios se guardan en la caché hasta que
+    cambien solo si ADMIN_STATS_CACHE_TIMEOUT > 0, que por defecto es solo con REDIS_URL: la
+    invalidación en una caché por proceso no llega a los otros workers.
+    """
+    timeout = getattr(settings, 'ADMIN_STATS_CACHE_TIMEOUT', 0)
+    stats = cache.get(DASHBOARD_STATS_KEY) if timeout else None
+    if stats is None:
+        stats = _compute_user_stats()
+        if timeout:
+            cache.set(DASHBOARD_STATS_KEY, stats, timeout)
+    return dict(stats, total_patients=record_total('patient'))
+
+
+def invalidate_dashboard_stats():
+    cache.delete(DASHBOARD_STATS_KEY)
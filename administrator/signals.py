@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from users.models import Users, Doctor, Administrator, Receptions
+from .services import invalidate_dashboard_stats
+
+
+@receiver([post_save, post_delete], sender=Doctor)
+@receiver([post_save, post_delete], sender=Administrator)
+@receiver([post_save, post_delete], sender=Receptions)
+def invalidate_stats_on_change(sender, **kwargs):
+    invalidate_dashboard_stats()
+
+
+@receiver([post_save, post_delete], sender=Users)
+def invalidate_stats_on_user_change(sender, update_fields=None, **kwargs):
+    # El login solo actualiza last_login y no cambia ningún conteo
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    invalidate_dashboard_stats()
@@ -180,4 +180,228 @@ class AdminSecurityTest(TestCase):
          
          # 🟢 ASERSION CORREGIDA: Debe ser (initial_count - 1)
          self.assertEqual(Users.objects.count(), initial_count - 1, 
-                          "El usuario DEBE ser eliminado por el administrador, reduciendo el conteo.")
\ No newline at end of file
+                          "El usuario DEBE ser eliminado por el administrador, reduciendo el conteo.")
+
+from django.core.cache import cache
+from django.test import override_settings
+from administrator.services import dashboard_stats
+
+
+class AdminDashboardStatsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin_user = Users.objects.create_user(
+            username='stats_admin', email='stats@test.com', password='Password123!'
+        )
+        Administrator.objects.create(user=self.admin_user)
+        reception_user = Users.objects.create_user(username='stats_rec', email='stats_rec@test.com', password='x')
+        Receptions.objects.create(user=reception_user)
+        Users.objects.create_user(username='stats_doc', email='stats_doc@test.com', password='x', is_doctor=True)
+
+    @override_settings(ADMIN_STATS_CACHE_TIMEOUT=600)
+    def test_stats_single_query_then_cached(self):
+        # Un aggregate para usuarios y el contador de pacientes
+        with self.assertNumQueries(2):
+            stats = dashboard_stats()
+        self.assertEqual(stats['total_users'], 3)
+        self.assertEqual(stats['total_doctors'], 1)
+        self.assertEqual(stats['admin_count'], 1)
+        self.assertEqual(stats['reception_count'], 1)
+        self.assertEqual(stats['total_staff'], 2)
+        self.assertEqual(stats['total_patients'], 0)
+        with self.assertNumQueries(1):
+            dashboard_stats()
+
+    @override_settings(ADMIN_STATS_CACHE_TIMEOUT=600)
+    def test_stats_invalidated_on_save(self):
+        dashboard_stats()
+        Patient.objects.create(
+            first_name='Stats', last_name='Paciente', phone='12345678',
+            identification_type='CI', identification_number='8880001',
+            gender='Other', date_of_birth=date(1990, 1, 1),
+            address_line='Calle 1', city='City', region='Region', postal_code='1111',
+            emergency_contact_name='E', emergency_contact_relationship='Madre',
+            emergency_contact_phone='98765432'
+        )
+        # El alta de un paciente no invalida la caché: el total viene del contador
+        with self.assertNumQueries(1):
+            self.assertEqual(dashboard_stats()['total_patients'], 1)
+        Users.objects.filter(username='stats_doc').delete()
+        self.assertEqual(dashboard_stats()['total_doctors'], 0)
+
+    @override_settings(ADMIN_STATS_CACHE_TIMEOUT=600)
+    def test_login_does_not_invalidate(self):
+        dashboard_stats()
+        self.client.login(username='stats_admin', password='Password123!')
+        with self.assertNumQueries(1):
+            dashboard_stats()
+
+    @override_settings(ADMIN_STATS_CACHE_TIMEOUT=0)
+    def test_stats_not_cached_without_shared_cache(self):
+        dashboard_stats()
+        # Un cambio hecho en otro proceso (sin señal en este) se ve en el siguiente request
+        Users.objects.filter(username='stats_doc').update(is_doctor=False)
+        self.assertEqual(dashboard_stats()['total_doctors'], 0)
+
+    def test_dashboard_view_renders_counts(self):
+        self.client.login(username='stats_admin', password='Password123!')
+        response = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_staff'], 2)
+        self.assertEqual(response.context['doctors_percentage'], 33.3)
+
+
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class PermissionMatrixTest(TestCase):
+    def setUp(self):
+        self.admin_user = Users.objects.create_user(
+            username='perm_admin', email='perm_admin@test.com', password='Password123!'
+        )
+        Administrator.objects.create(user=self.admin_user)
+        self.client.login(username='perm_admin', password='Password123!')
+        self.add_users = Permission.objects.get(codename='add_users')
+        self.change_users = Permission.objects.get(codename='change_users')
+        grupo = Group.objects.create(name='Recepción')
+        grupo.permissions.add(self.change_users)
+        self.staff = []
+        for i in range(3):
+            user = Users.objects.create_user(username=f'perm_{i}', email=f'perm_{i}@test.com', password='x')
+            user.user_permissions.add(self.add_users)
+            user.groups.add(grupo)
+            self.staff.append(user)
+
+    def _queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('admin_permissions_list'), {'app': 'users', 'model': 'users'})
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_matrix_queries_do_not_grow_with_users(self):
+        self._queries()
+        antes, response = self._queries()
+        fila = next(r for r in response.context['rows'] if r['user'] == self.staff[0])
+        celda = next(c for c in fila['celdas'] if c['perm'] == self.change_users)
+        self.assertTrue(celda['heredado'])
+        self.assertFalse(celda['directo'])
+        for i in range(3, 8):
+            Users.objects.create_user(username=f'perm_{i}', email=f'perm_{i}@test.com', password='x')
+        despues, _ = self._queries()
+        self.assertEqual(antes, despues)
+
+    def test_matrix_columns_are_one_model(self):
+        response = self.client.get(reverse('admin_permissions_list'), {'app': 'users', 'model': 'users'})
+        self.assertEqual(response.context['model'], 'users')
+        self.assertEqual({p.content_type.model for p in response.context['perms']}, {'users'})
+        self.assertIn(self.change_users, response.context['perms'])
+        # Un modelo desconocido vuelve al primero de la aplicación
+        response = self.client.get(reverse('admin_permissions_list'), {'app': 'users', 'model': 'nada'})
+        self.assertEqual(response.context['model'], response.context['models'][0])
+        self.assertLess(len(response.context['perms']), Permission.objects.filter(content_type__app_label='users').count())
+
+    def test_matrix_post_syncs_page_in_bulk(self):
+        user_ids = [u.id for u in self.staff]
+        response = self.client.post(reverse('assign_permission'), {
+            'action': 'matrix', 'app': 'users', 'model': 'users', 'page': '1',
+            'user_id': user_ids, 'perm_id': [self.add_users.id, self.change_users.id],
+            # Se mantiene add_users solo al primero y se agrega change_users al segundo
+            'grant': [f'{user_ids[0]}:{self.add_users.id}', f'{user_ids[1]}:{self.change_users.id}'],
+        })
+        self.assertRedirects(response, reverse('admin_permissions_list') + '?app=users&model=users&page=1')
+        directos = set(
+            Users.user_permissions.through.objects.filter(users_id__in=user_ids)
+            .values_list('users_id', 'permission_id')
+        )
+        self.assertEqual(directos, {(user_ids[0], self.add_users.id), (user_ids[1], self.change_users.id)})
+
+    def test_add_and_remove_cross_product(self):
+        user_ids = [u.id for u in self.staff[:2]]
+        self.client.post(reverse('assign_permission'), {
+            'action': 'add', 'user_id': user_ids, 'perm_id': [self.change_users.id],
+        })
+        self.assertEqual(
+            Users.user_permissions.through.objects.filter(permission=self.change_users).count(), 2
+        )
+        self.client.post(reverse('assign_permission'), {
+            'action': 'remove', 'user_id': user_ids, 'perm_id': [self.add_users.id, self.change_users.id],
+        })
+        self.assertFalse(Users.user_permissions.through.objects.filter(users_id__in=user_ids).exists())
+        self.assertTrue(self.staff[2].user_permissions.filter(pk=self.add_users.pk).exists())
+
+
+import json
+import os
+import tempfile
+from django.test import override_settings
+
+
+class SlowQueriesPageTest(TestCase):
+    def setUp(self):
+        self.admin_user = Users.objects.create_user(
+            username='slow_page_admin', email='slow_page_admin@test.com', password='Password123!'
+        )
+        Administrator.objects.create(user=self.admin_user)
+        self.client.login(username='slow_page_admin', password='Password123!')
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.log = os.path.join(directorio.name, 'slow_queries.jsonl')
+        registro = {'ts': '2026-01-01T10:00:00+00:00', 'ms': 250.0, 'db': 'default',
+                    'sql': 'SELECT "users_patient"."id" FROM "users_patient"',
+                    'origin': 'reception/views.py:10 in lista', 'template': None, 'many': False, 'explain': None}
+        with open(self.log, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(registro) + '\n')
+        # Archivo rotado por RotatingFileHandler
+        with open(self.log + '.1', 'w', encoding='utf-8') as f:
+            f.write(json.dumps(dict(registro, ms=150.0)) + '\nlínea inválida\n')
+
+    def test_page_lists_grouped_queries(self):
+        with override_settings(SLOW_QUERY_LOG=self.log):
+            response = self.client.get(reverse('admin_slow_queries'))
+        self.assertEqual(response.status_code, 200)
+        grupo, = response.context['queries']
+        self.assertEqual(grupo['count'], 2)
+        self.assertEqual(grupo['total_ms'], 400.0)
+        self.assertContains(response, 'reception/views.py:10 in lista')
+
+    def test_page_requires_admin(self):
+        usuario = Users.objects.create_user(username='slow_page_user', email='slow_page_user@test.com', password='x')
+        self.client.force_login(usuario)
+        response = self.client.get(reverse('admin_slow_queries'))
+        self.assertNotEqual(response.status_code, 200)
+
+
+from users.models import WaitTimeRollup
+
+
+class WaitTimesPageTest(TestCase):
+    def setUp(self):
+        self.admin_user = Users.objects.create_user(
+            username='wait_page_admin', email='wait_page_admin@test.com', password='Password123!'
+        )
+        Administrator.objects.create(user=self.admin_user)
+        self.client.login(username='wait_page_admin', password='Password123!')
+        specialty = Specialty.objects.create(name='Pediatría', description='Niños')
+        doctor_user = Users.objects.create_user(username='wait_page_dr', email='wait_page_dr@test.com', password='x')
+        self.doctor = Doctor.objects.create(user=doctor_user, specialty=specialty, bio='Bio')
+        ayer = date.today() - timedelta(days=1)
+        WaitTimeRollup.objects.create(date=ayer, level='day', count=3, p50=4.0, p90=12.5, p99=14.0, mean=6.0, max=15.0)
+        WaitTimeRollup.objects.create(date=ayer, level='doctor', doctor=self.doctor, specialty=specialty, shift='MAÑANA',
+                                      count=3, p50=4.0, p90=12.5, p99=14.0, mean=6.0, max=15.0)
+
+    def test_page_lists_rollups_by_level(self):
+        response = self.client.get(reverse('admin_wait_times'))
+        self.assertEqual(response.status_code, 200)
+        fila, = response.context['rollups']
+        self.assertEqual(fila.doctor, self.doctor)
+        self.assertContains(response, '12.5')
+        response = self.client.get(reverse('admin_wait_times'), {'level': 'day'})
+        self.assertEqual([r.level for r in response.context['rollups']], ['day'])
+
+    def test_page_requires_admin(self):
+        usuario = Users.objects.create_user(username='wait_page_user', email='wait_page_user@test.com', password='x')
+        self.client.force_login(usuario)
+        response = self.client.get(reverse('admin_wait_times'))
+        self.assertNotEqual(response.status_code, 200)
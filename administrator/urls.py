@@ -27,6 +27,10 @@ urlpatterns = [
     path('admin-dashboard/users/permissions/', admin_permissions_list, name='admin_permissions_list'),
     path('admin-dashboard/users/assign_permission/', views.assign_permission, name='assign_permission'),
 
+    # Consultas SQL lentas
+    path('admin-dashboard/slow-queries/', views.admin_slow_queries, name='admin_slow_queries'),
+    path('admin-dashboard/wait-times/', views.admin_wait_times, name='admin_wait_times'),
+
     # Eliminar usuarios
     path('admin-dashboard/users/delete/<int:user_id>/', views.admin_delete_user, name='admin_delete_user'),
 
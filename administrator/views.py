@@ -1,27 +1,36 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.core.paginator import Paginator
+from django.urls import reverse
+from urllib.parse import urlencode
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth import update_session_auth_hash, get_user_model
+from django.contrib.auth import update_session_auth_hash
 from django.http import JsonResponse
 from django.db import transaction
-from users.models import Users, Doctor, Administrator, Receptions, Specialty, Patient, DoctorSchedule
+from django.conf import settings
+from users.models import Users, Doctor, Administrator, Receptions, Specialty, Patient, DoctorSchedule, WaitTimeRollup
+from users.roles import role_required
+from users.db_router import use_replica
+from .services import dashboard_stats
+from users.slow_queries import summarize_slow_queries
+from .permissions import (
+    DEFAULT_APP, MATRIX_PAGE_SIZE, app_permissions, matrix_rows, matrix_users, parse_grants,
+    parse_ids, permission_apps, set_user_permissions,
+)
 from django.views.decorators.http import require_POST
-from django.contrib.auth.models import Permission
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from django.utils import timezone
 import re
 from django.db.models import Q
 
 # Create your views here.
 
 @login_required
+@role_required('admin')
 def admin_dashboard_view(request):
     """Dashboard específico para administradores - PROTEGIDO"""
     # Primera protección: @login_required
-    # Segunda protección: verificar que sea administrador
-    if not hasattr(request.user, 'administrator'):
-        messages.error(request, 'No tienes permisos para acceder a esta sección.')
-        return redirect('dashboard')
-    
+    # Segunda protección: @role_required (verificar que sea administrador)
     admin = request.user.administrator
     return render(request, 'admin_backup/admin_dashboard.html', {
         'user': request.user,
@@ -31,21 +40,16 @@ def admin_dashboard_view(request):
 
 # Acciones del dashboard de Admnistrador
 @login_required
+@role_required('admin', message='No tienes permisos para acceder al panel de administración.')
+@use_replica
 def admin_dashboard_view(request):
     """Vista del dashboard para administradores"""
-    # Verificar que el usuario sea administrador
-    if not hasattr(request.user, 'administrator'):
-        messages.error(request, 'No tienes permisos para acceder al panel de administración.')
-        return redirect('dashboard')
-    
-    # Obtener estadísticas
-    from users.models import Users, Doctor, Administrator, Receptions, Patient
-    
-    # Contar usuarios por tipo
-    total_users = Users.objects.count()
-    total_doctors = Users.objects.filter(is_doctor=True).count()
-    total_staff = Administrator.objects.count() + Receptions.objects.count()
-    total_patients = Patient.objects.count()
+    # Obtener estadísticas (una consulta agregada, guardada en caché)
+    stats = dashboard_stats()
+    total_users = stats['total_users']
+    total_doctors = stats['total_doctors']
+    total_staff = stats['total_staff']
+    total_patients = stats['total_patients']
     
     # Usuarios recientes (últimos 10)
     recent_users = Users.objects.order_by('-date_joined')[:10]
@@ -53,10 +57,8 @@ def admin_dashboard_view(request):
     # Calcular porcentajes para las barras de progreso
     if total_users > 0:
         doctors_percentage = round((total_doctors / total_users) * 100, 1)
-        admin_count = Administrator.objects.count()
-        reception_count = Receptions.objects.count()
-        admin_percentage = round((admin_count / total_users) * 100, 1)
-        staff_percentage = round((reception_count / total_users) * 100, 1)
+        admin_percentage = round((stats['admin_count'] / total_users) * 100, 1)
+        staff_percentage = round((stats['reception_count'] / total_users) * 100, 1)
     else:
         doctors_percentage = admin_percentage = staff_percentage = 0
     
@@ -76,12 +78,9 @@ def admin_dashboard_view(request):
 
 #Listar usuarios
 @login_required
+@role_required('admin', message='No tienes permisos.')
 def admin_users_list(request):
     """Lista todos los usuarios"""
-    if not hasattr(request.user, 'administrator'):
-        messages.error(request, 'No tienes permisos.')
-        return redirect('dashboard')
-    
     users = Users.objects.all().order_by('-date_joined')
 
     context = {
@@ -95,12 +94,9 @@ def admin_users_list(request):
 # Crear usuario desde Acciones rapidas  --- REMOVIDO (ERRORES EN LAS PRUEBAS DE ADMINISTRADOR)
 
 @login_required
+@role_required('admin', perm='users.add_users', message='No tienes permisos.')
 def admin_create_user(request):
      """Crear nuevo usuario con validaciones robustas"""
-     if not hasattr(request.user, 'administrator') or not request.user.has_perm('users.add_users'):
-         messages.error(request, 'No tienes permisos.')
-         return redirect('dashboard')
-    
      specialties = Specialty.objects.all().order_by('name')
      errores = []
 
@@ -272,12 +268,9 @@ def admin_create_user(request):
 
 # Crear doctor desde Acciones rapidas
 @login_required
+@role_required('admin', perm='users.add_users', message='No tienes permisos.')
 def admin_create_doctor(request):
     """Crear nuevo doctor y asignar horarios"""
-    if not hasattr(request.user, 'administrator') or not request.user.has_perm('users.add_users'):
-        messages.error(request, 'No tienes permisos.')
-        return redirect('dashboard')
-    
     if request.method == 'POST':
         username = request.POST.get('username')
         email = request.POST.get('email')
@@ -427,12 +420,9 @@ def admin_create_doctor(request):
 
 # Crear personal desde Acciones rapidas
 @login_required
+@role_required('admin', perm='users.add_users', message='No tienes permisos.')
 def admin_create_staff(request):
     """Crear personal administrativo"""
-    if not hasattr(request.user, 'administrator') or not request.user.has_perm('users.add_users'):
-        messages.error(request, 'No tienes permisos.')
-        return redirect('dashboard')
-    
     if request.method == 'POST':
         username = request.POST.get('username')
         email = request.POST.get('email')
@@ -469,12 +459,9 @@ def admin_create_staff(request):
 
 # Acciones desde la tabla USUARIOS RECIENTES
 @login_required
+@role_required('admin', message='No tienes permisos.')
 def admin_edit_user(request, user_id):
     """Editar usuario"""
-    if not hasattr(request.user, 'administrator'):
-        messages.error(request, 'No tienes permisos.')
-        return redirect('dashboard')
-    
     user = get_object_or_404(Users, id=user_id)
     
     if request.method == 'POST':
@@ -493,11 +480,9 @@ def admin_edit_user(request, user_id):
 # Boton para cambiar estado de usuarios
 @login_required
 @require_POST
+@role_required('admin', ajax=True)
 def admin_toggle_user_status(request, user_id):
     """Cambiar estado activo/inactivo del usuario (AJAX)"""
-    if not hasattr(request.user, 'administrator'):
-        return JsonResponse({'success': False, 'error': 'Sin permisos'})
-    
     try:
         user = get_object_or_404(Users, id=user_id)
         user.is_active = not user.is_active
@@ -514,12 +499,9 @@ def admin_toggle_user_status(request, user_id):
     
 
 @login_required
+@role_required('admin')
 def admin_profile_view(request):
     """Vista del perfil del administrador"""
-    if not hasattr(request.user, 'administrator'):
-        messages.error(request, 'No tienes permisos para acceder a esta sección.')
-        return redirect('dashboard')
-    
     updated_profile_successfully = False
     updated_password_successfully = False
     
@@ -576,11 +558,8 @@ def admin_profile_view(request):
 
 # Asignar Roles
 @login_required
+@role_required('admin', message='No tienes permisos.')
 def admin_assign_role(request, user_id):
-    if not hasattr(request.user, 'administrator'):
-        messages.error(request, 'No tienes permisos.')
-        return redirect('dashboard')
-
     user = get_object_or_404(Users, id=user_id)
     specialties = Specialty.objects.all()
     if request.method == 'POST':
@@ -607,33 +586,85 @@ def admin_assign_role(request, user_id):
     return render(request, 'admin_backup/assign_role.html', {'user': user, 'specialties': specialties})
 
 @login_required
+@role_required('admin', message='No tienes permisos.')
 def admin_select_user_for_role(request):
-    if not hasattr(request.user, 'administrator'):
-        messages.error(request, 'No tienes permisos.')
-        return redirect('dashboard')
     users = Users.objects.all().order_by('username')
     return render(request, 'admin_backup/select_user_for_role.html', {'users': users})
 
 
 # Permisos
 @login_required
+@role_required('admin', message='No tienes permisos.')
 def admin_permissions_list(request):
-    if not hasattr(request.user, 'administrator'):
-        messages.error(request, 'No tienes permisos.')
-        return redirect('dashboard')
-    User = get_user_model()
-    users = User.objects.all().order_by('username')
-    perms = Permission.objects.all().order_by('name')
-    return render(request, 'admin_backup/permissions_list.html', {'users': users, 'perms': perms})
+    """Matriz de permisos: usuarios paginados por filas y permisos de un modelo por columnas"""
+    apps = permission_apps()
+    app = request.GET.get('app', DEFAULT_APP)
+    if app not in apps:
+        app = DEFAULT_APP
+    modelos = apps.get(app, [])
+    modelo = request.GET.get('model')
+    if modelo not in modelos:
+        modelo = modelos[0] if modelos else None
+    columnas = app_permissions(app, modelo)
+    page_obj = Paginator(matrix_users(), MATRIX_PAGE_SIZE).get_page(request.GET.get('page'))
+    return render(request, 'admin_backup/permissions_list.html', {
+        'rows': matrix_rows(page_obj.object_list, columnas),
+        'perms': columnas,
+        'apps': apps,
+        'app': app,
+        'models': modelos,
+        'model': modelo,
+        'page_obj': page_obj,
+    })
+
+
+
+# Consultas SQL lentas
+@login_required
+@role_required('admin', message='No tienes permisos.')
+def admin_slow_queries(request):
+    """Consultas lentas del log (SLOW_QUERY_LOG) agrupadas por SQL y origen, las más costosas primero"""
+    consultas = summarize_slow_queries()
+    return render(request, 'admin_backup/slow_queries.html', {
+        'queries': consultas,
+        'threshold_ms': getattr(settings, 'SLOW_QUERY_MS', 200),
+    })
 
 
+# Tiempos de espera (resúmenes de manage.py rollup_wait_times)
+@login_required
+@role_required('admin', message='No tienes permisos.')
+@use_replica
+def admin_wait_times(request):
+    """Percentiles de espera por día y agrupación, leídos de WaitTimeRollup (nunca de los eventos)"""
+    niveles = dict(WaitTimeRollup.level_choices)
+    nivel = request.GET.get('level') if request.GET.get('level') in niveles else 'doctor'
+    hoy = timezone.localdate()
+    try:
+        hasta = date.fromisoformat(request.GET['hasta'])
+    except (KeyError, ValueError):
+        hasta = hoy
+    try:
+        desde = date.fromisoformat(request.GET['desde'])
+    except (KeyError, ValueError):
+        desde = hasta - timedelta(days=6)
+    resumenes = WaitTimeRollup.objects.filter(level=nivel, date__range=(desde, hasta)).select_related(
+        'doctor__user', 'specialty'
+    ).order_by('-date', 'shift', 'specialty__name', 'doctor__user__last_name')
+    return render(request, 'admin_backup/wait_times.html', {
+        'rollups': resumenes,
+        'levels': WaitTimeRollup.level_choices,
+        'level': nivel,
+        'desde': desde,
+        'hasta': hasta,
+    })
+
 
 # Eliminar usuario
 @login_required
 @require_POST
+@role_required('admin', ajax=True)
 def admin_delete_user(request, user_id):
-    if not hasattr(request.user, 'administrator'):
-        return JsonResponse({'success': False, 'error': 'Sin permisos'})
     try:
         user = get_object_or_404(Users, id=user_id)
         user.delete()
@@ -644,22 +675,31 @@ def admin_delete_user(request, user_id):
 
 # Asignar permisos a usuario
 @login_required
+@role_required('admin', message='No tienes permisos.')
 def assign_permission(request):
-    if not hasattr(request.user, 'administrator'):
-        messages.error(request, 'No tienes permisos.')
-        return redirect('dashboard')
+    """
+    Cambios de permisos en un solo POST.
+    - action=matrix: sincroniza la página de la matriz (user_id[] x perm_id[]) con los checkbox grant[].
+    - action=add/remove: asigna o quita cada perm_id[] a cada user_id[].
+    """
     if request.method == 'POST':
-        user_id = request.POST.get('user_id')
-        perm_id = request.POST.get('perm_id')
+        user_ids = request.POST.getlist('user_id')
+        perm_ids = request.POST.getlist('perm_id')
         action = request.POST.get('action')
-        User = get_user_model()
-        user = User.objects.get(pk=user_id)
-        perm = Permission.objects.get(pk=perm_id)
-        if action == 'add':
-            user.user_permissions.add(perm)
+        pares = {(u, p) for u in parse_ids(user_ids) for p in parse_ids(perm_ids)}
+        if action == 'matrix':
+            grant = parse_grants(request.POST.getlist('grant'))
+            agregados, quitados = set_user_permissions(user_ids, perm_ids, add=grant, remove=pares - grant)
+            messages.success(request, f'Permisos actualizados: {agregados} asignados, {quitados} removidos.')
+        elif action == 'add':
+            set_user_permissions(user_ids, perm_ids, add=pares)
             messages.success(request, 'Permiso asignado correctamente.')
         elif action == 'remove':
-            user.user_permissions.remove(perm)
+            set_user_permissions(user_ids, perm_ids, remove=pares)
             messages.success(request, 'Permiso removido correctamente.')
+        # Volver a la misma página, aplicación y modelo de la matriz
+        filtros = {k: request.POST[k] for k in ('app', 'model', 'page') if request.POST.get(k)}
+        if filtros:
+            return redirect(f"{reverse('admin_permissions_list')}?{urlencode(filtros)}")
         return redirect('admin_permissions_list')
-    return redirect('admin_permissions_list')
\ No newline at end of file
+    return redirect('admin_permissions_list')
@@ -0,0 +1,53 @@
+from datetime import time
+from django.db import transaction
+from django.utils import timezone
+from users.models import Consultation
+from users.triage import triage_order_by
+from users.wait_times import record_status_event
+
+# Hora de inicio de cada turno, en orden
+SHIFT_STARTS = [
+    (time(0, 0), 'MAÑANA'),
+    (time(13, 0), 'TARDE'),
+    (time(19, 0), 'NOCHE'),
+]
+
+# Estados de la cola del doctor
+STATUS_WAITING = 'EN ESPERA'
+STATUS_CALLED = 'EN CONSULTA'
+
+
+def current_shift(hora=None):
+    """Turno que corresponde a la hora indicada (por defecto, la hora local actual)"""
+    hora = hora or timezone.localtime().time()
+    turno = SHIFT_STARTS[0][1]
+    for inicio, nombre in SHIFT_STARTS:
+        if hora >= inicio:
+            turno = nombre
+    return turno
+
+
+def call_next_consultation(doctor, fecha=None, turno=None, actor=None):
+    """
+    Toma la siguiente consulta en espera del doctor para la fecha y turno, en el orden de la
+    cola de triage (users/triage.py), y la pasa a EN CONSULTA. La fila se bloquea con SKIP LOCKED:
+    si otra sesión del doctor está llamando al mismo tiempo, cada una obtiene un paciente distinto
+    sin esperar a la otra. El llamado queda en el registro de estados a nombre de `actor`.
+    Devuelve la consulta con su paciente, o None si no queda nadie en espera.
+    """
+    fecha = fecha or timezone.localdate()
+    turno = turno or current_shift()
+    with transaction.atomic():
+        consulta = (
+            Consultation.objects.select_for_update(skip_locked=True, of=('self',))
+            .select_related('patient')
+            .filter(doctor=doctor, date=fecha, shift=turno, status=STATUS_WAITING)
+            .order_by(*triage_order_by(fecha))
+            .first()
+        )
+        if consulta is None:
+            return None
+        consulta.status = STATUS_CALLED
+        consulta.save(update_fields=['status'])
+        record_status_event(consulta, 'called', actor)
+    return consulta
@@ -8,7 +8,9 @@ urlpatterns = [
     path('pacientes/', views.doctor_patient_list_view, name='doctor_patient_list'),
     path('consultation/<int:consultation_id>/change-status/', views.change_consultation_status_view, name='change_consultation_status'),
     path('consultation-history/', views.doctor_consultation_history_view, name='doctor_consultation_history'),
+    path('consultation-history/data/', views.doctor_consultation_history_data_view, name='doctor_consultation_history_data'),
     path('consultation/<int:consultation_id>/attend/', views.attend_consultation_view, name='attend_consultation'),
+    path('consultation/call-next/', views.call_next_consultation_view, name='call_next_consultation'),
     path('consultation/edit/<int:id>/', views.edit_consultation, name='edit_consultation')
     
 ]
\ No newline at end of file
@@ -4,28 +4,49 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from users.models import Consultation, Patient, Doctor, Specialty
 from django.shortcuts import get_object_or_404, render
+from django.db import transaction
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils import formats
+from django.views.decorators.http import require_POST
 from .forms import ConsultationAttendForm
+from .services import STATUS_CALLED, STATUS_WAITING, call_next_consultation
+from users.search import patient_search_q
+from users.roles import role_required
+from users.datatables import cached_total, datatables_params, datatables_response
+from users.db_router import use_replica
+from users.triage import triage_queues
+from users.wait_times import record_status_change
 import datetime
 
+# Datos clínicos de una consulta atendida que se muestran en el detalle del historial
+CLINICAL_FIELDS = [
+    'temperatura', 'presion_sistolica', 'presion_diastolica', 'frecuencia_respiratoria', 'pulso',
+    'saturacion_oxigeno', 'peso', 'talla', 'circunferencia_abdominal', 'historia_actual', 'evolucion',
+    'impresion_diagnostica', 'indicaciones', 'hba1c',
+]
+
 # Create your views here.
 @login_required
+@role_required('doctor')
+@use_replica
 def doctor_dashboard_view(request):
     """Dashboard específico para doctores - PROTEGIDO"""
     # Primera protección: @login_required (usuario autenticado)
-
-    # Segunda protección: verificar que sea doctor
-    if not hasattr(request.user, 'doctor'):
-        messages.error(request, 'No tienes permisos para acceder a esta sección.')
-        return redirect('dashboard')
-    
+    # Segunda protección: @role_required (verificar que sea doctor)
     doctor = request.user.doctor
 
     hoy = datetime.date.today()
-    consultas_hoy = Consultation.objects.filter(
+    consultas_hoy = list(Consultation.objects.filter(
         doctor=request.user.doctor,  # Asumiendo que el usuario tiene relación con Doctor
         date=hoy
-    ).order_by('shift', 'order')
-    
+    ).select_related('patient').order_by('shift', 'order'))
+    # En cada turno, primero los pacientes en espera en el orden de la cola de triage
+    posiciones = triage_queues.positions((doctor.pk, shift) for shift, _ in Consultation.shift_choices)
+    for consulta in consultas_hoy:
+        consulta.triage_position = posiciones.get(consulta.pk)
+    consultas_hoy.sort(key=lambda c: (c.shift, c.triage_position is None, c.triage_position or 0))
+
     return render(request, 'doctors/doctor_dashboard.html',{
         'user': request.user,
         'doctor': doctor,
@@ -35,14 +56,11 @@ def doctor_dashboard_view(request):
 
 
 @login_required
+@role_required('doctor', message='No tienes perfil de doctor.')
 def doctor_profile_view(request):
     updated_profile_successfully = False
     updated_password_successfully = False
 
-    if not hasattr(request.user, 'doctor'):
-        messages.error(request, 'No tienes perfil de doctor.')
-        return redirect('doctor_dashboard')
-
     doctor = request.user.doctor
 
     if request.method == 'POST':
@@ -99,10 +117,12 @@ def doctor_patient_list_view(request):
             'especialidades': Specialty.objects.all(),
             'error': 'No tienes perfil de doctor.'
         })
-    consultas = Consultation.objects.filter(doctor=doctor, status="EN ESPERA")
+    consultas = Consultation.objects.filter(
+        doctor=doctor, status__in=[STATUS_WAITING, STATUS_CALLED]
+    ).select_related('patient')
     query = request.GET.get('ci', '')
     if query:
-        consultas = consultas.filter(patient__identification_number__icontains=query)
+        consultas = consultas.filter(patient_search_q(query, prefix='patient__'))
     especialidades = Specialty.objects.all()
     return render(request, 'doctors/patient_list.html', {
         'consultations': consultas,
@@ -114,39 +134,115 @@ def doctor_patient_list_view(request):
 
 @login_required
 def change_consultation_status_view(request, consultation_id):
-    consulta = get_object_or_404(Consultation, id=consultation_id, doctor__user=request.user)
-    if request.method == "POST":
-        nuevo_estado = request.POST.get("nuevo_estado")
-        if nuevo_estado in dict(Consultation.status_choices).keys():
-            consulta.status = nuevo_estado
-            consulta.save()
-            messages.success(request, f"Estado cambiado a {consulta.get_status_display()}.")
-        else:
-            messages.error(request, "Estado inválido.")
+    if request.method != "POST":
+        get_object_or_404(Consultation, id=consultation_id, doctor__user=request.user)
+        return redirect('doctor_patient_list')
+    nuevo_estado = request.POST.get("nuevo_estado")
+    if nuevo_estado not in dict(Consultation.status_choices).keys():
+        messages.error(request, "Estado inválido.")
+        return redirect('doctor_patient_list')
+    # La fila queda bloqueada hasta guardar: dos cambios simultáneos no se pisan
+    with transaction.atomic():
+        consulta = get_object_or_404(
+            Consultation.objects.select_for_update(), id=consultation_id, doctor__user=request.user
+        )
+        estado_anterior = consulta.status
+        consulta.status = nuevo_estado
+        consulta.save()
+        record_status_change(consulta, estado_anterior, request.user)
+    messages.success(request, f"Estado cambiado a {consulta.get_status_display()}.")
     return redirect('doctor_patient_list')
 
 
+# Llama al siguiente paciente de la cola del doctor (prioridad y orden) en un solo request
+@login_required
+@role_required('doctor', ajax=True)
+@require_POST
+def call_next_consultation_view(request):
+    turno = request.POST.get('shift')
+    if turno and turno not in dict(Consultation.shift_choices):
+        return JsonResponse({'success': False, 'error': 'Turno inválido'}, status=400)
+    consulta = call_next_consultation(request.user.doctor, turno=turno, actor=request.user)
+    if consulta is None:
+        return JsonResponse({'success': True, 'consultation': None})
+    return JsonResponse({'success': True, 'consultation': {
+        'id': consulta.pk,
+        'order': consulta.order,
+        'shift': consulta.shift,
+        'priority': consulta.priority,
+        'time': consulta.time.strftime('%H:%M'),
+        'consultorio': consulta.consultorio,
+        'patient': consulta.patient.full_name,
+        'identification_number': consulta.patient.identification_number,
+        'attend_url': reverse('attend_consultation', args=[consulta.pk]),
+    }})
+
+
 @login_required
 def doctor_consultation_history_view(request):
-    # Obtener solo consultas atendidas del doctor actual
-    consultas = Consultation.objects.filter(
-        doctor__user=request.user,
-        status="ATENDIDO"
-    ).order_by('-date', '-time')
-    query = request.GET.get('ci', '')
-    if query:
-        consultas = consultas.filter(patient__identification_number__icontains=query)
+    # La tabla pide cada página a doctor_consultation_history_data_view (DataTables del lado del servidor)
     return render(request, 'doctors/consultation_history.html', {
-        'consultations': consultas,
-        'ci_query': query,
+        'ci_query': request.GET.get('ci', ''),
         'user': request.user,
     })
 
 
+# Columnas ordenables del historial del doctor
+history_column_sorts = {
+    'identification_number': 'patient__identification_number',
+    'first_name': 'patient__first_name',
+    'last_name': 'patient__last_name',
+    'date': 'date',
+    'time': 'time',
+}
+
+
+@login_required
+@role_required('doctor', ajax=True)
+@use_replica
+def doctor_consultation_history_data_view(request):
+    params = datatables_params(request)
+    # Solo consultas atendidas del doctor actual
+    consultas = Consultation.objects.filter(doctor__user=request.user, status="ATENDIDO")
+    total = cached_total(f'doctor_history:{request.user.pk}', consultas)
+    if params['search']:
+        consultas = consultas.filter(patient_search_q(params['search'], prefix='patient__'))
+        filtrado = consultas.count()
+    else:
+        filtrado = total
+
+    orden = ['-date', '-time', '-id']
+    campo = history_column_sorts.get(params['order_column'])
+    if campo:
+        orden = [f'-{campo}' if params['order_dir'] == 'desc' else campo, *orden]
+    consultas = consultas.select_related('patient', 'doctor__specialty').order_by(*orden)
+
+    # Cada fila trae los datos clínicos del modal de detalle de esa consulta
+    return datatables_response(params, consultas, total, filtrado, lambda consulta: {
+        'id': consulta.id,
+        'identification_number': consulta.patient.identification_number,
+        'first_name': consulta.patient.first_name,
+        'last_name': consulta.patient.last_name,
+        'full_name': consulta.patient.full_name,
+        'age': consulta.patient.age,
+        'phone': consulta.patient.phone,
+        'date': formats.localize(consulta.date),
+        'time': formats.localize(consulta.time),
+        'status': consulta.get_status_display(),
+        'order': consulta.order,
+        'consultorio': consulta.consultorio,
+        'specialty': consulta.doctor.specialty.name if consulta.doctor.specialty_id else '',
+        'description': consulta.description,
+        **{campo: getattr(consulta, campo) for campo in CLINICAL_FIELDS},
+        'edit_url': reverse('edit_consultation', args=[consulta.id]),
+    })
+
+
 @login_required
 def attend_consultation_view(request, consultation_id):
     consulta = get_object_or_404(Consultation, id=consultation_id, doctor__user=request.user)
     if request.method == "POST":
+        estado_anterior = consulta.status
         form = ConsultationAttendForm(request.POST, instance=consulta)
         if form.is_valid():
             consulta = form.save(commit=False)
@@ -154,7 +250,9 @@ def attend_consultation_view(request, consultation_id):
             if consulta.doctor and hasattr(consulta.doctor, 'specialty'):
                 consulta.servicio = consulta.doctor.specialty
             consulta.status = "ATENDIDO"
-            consulta.save()
+            with transaction.atomic():
+                consulta.save()
+                record_status_change(consulta, estado_anterior, request.user)
             messages.success(request, "Consulta atendida y guardada correctamente.")
             return redirect('doctor_patient_list')
         else:
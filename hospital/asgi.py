@@ -3,6 +3,11 @@ ASGI config for hospital project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Con ASGI (por ejemplo ``uvicorn hospital.asgi:application``) el tablero de la agenda
+(reception:consultation_events) mantiene un stream abierto por cliente sin ocupar un hilo;
+con WSGI el mismo endpoint responde los eventos pendientes y el navegador vuelve a pedir.
+Con ASGI CONN_MAX_AGE es 0; para reutilizar conexiones se activa el pool con DB_POOL=1.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,5 +17,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hospital.settings')
+# settings.py desactiva las conexiones persistentes con ASGI (usar DB_POOL para reutilizarlas)
+os.environ.setdefault('DJANGO_ASGI', '1')
 
 application = get_asgi_application()
@@ -46,11 +46,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'users.middleware.ServerTimingMiddleware',
+    'users.middleware.MetricsMiddleware',
+    'users.middleware.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.middleware.RoleMiddleware',
+    'users.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,16 +84,72 @@ WSGI_APPLICATION = 'hospital.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Se configura por variables de entorno (DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT);
+# los valores por defecto son los de desarrollo.
+#   DB_CONN_MAX_AGE        segundos que una conexión se reutiliza entre requests
+#                          (0 = una conexión por request, "none" = sin límite); con ASGI siempre 0
+#   DB_CONN_HEALTH_CHECKS  verificar la conexión reutilizada antes del primer uso en cada request
+#   DB_POOL                usar el pool de conexiones de psycopg 3 (requiere psycopg[pool]);
+#                          reemplaza a las conexiones persistentes, recomendado con ASGI
+#   DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE  conexiones abiertas por proceso
+#   DB_POOL_TIMEOUT        segundos de espera por una conexión libre antes de fallar
+# Comparar configuraciones con: python manage.py benchmark_requests
+
+
+def env_bool(nombre, defecto=False):
+    valor = os.environ.get(nombre)
+    if valor is None or not valor.strip():
+        return defecto
+    return valor.strip().lower() in ('1', 'true', 'yes', 'on', 'si', 'sí')
+
+
+DB_POOL = env_bool('DB_POOL')
+DB_CONN_MAX_AGE = os.environ.get('DB_CONN_MAX_AGE', '60').strip().lower()
+# hospital/asgi.py define DJANGO_ASGI: las consultas de los streams corren en hilos que no terminan
+# con el request, así que con ASGI no hay conexiones persistentes (se usa DB_POOL para reutilizarlas)
+SERVING_ASGI = env_bool('DJANGO_ASGI')
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
-        'NAME': 'taller_hosp',
-        'USER': 'postgres',
-        'PASSWORD': '1304',
-        'HOST':'localhost',
-        'PORT':'5432'
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('DB_NAME', 'taller_hosp'),
+        'USER': os.environ.get('DB_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', '1304'),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        # Con pool las conexiones vuelven al pool al terminar cada request
+        'CONN_MAX_AGE': 0 if DB_POOL or SERVING_ASGI else (None if DB_CONN_MAX_AGE == 'none' else int(DB_CONN_MAX_AGE)),
+        'CONN_HEALTH_CHECKS': env_bool('DB_CONN_HEALTH_CHECKS', True),
+        'OPTIONS': {},
     }
 }
+if DB_POOL:
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    }
+
+# Réplica de lectura para dashboards e historiales (users/db_router.py). Se activa con DB_REPLICA_HOST;
+# DB_REPLICA_NAME, DB_REPLICA_PORT, DB_REPLICA_USER y DB_REPLICA_PASSWORD toman por defecto los de la principal.
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'USER': os.environ.get('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        # En las pruebas la réplica apunta a la misma base de pruebas
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['users.db_router.ReplicaRouter']
+# Alias de la réplica; si no está en DATABASES todas las lecturas van a la principal
+REPLICA_DATABASE = 'replica'
+# Segundos que un usuario lee de la principal después de escribir (lectura de sus propios cambios)
+REPLICA_PIN_SECONDS = 5
 
 
 # Password validation
@@ -168,4 +229,148 @@ PASSWORD_HASHERS = [
     'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
 ]
 
-AUTH_USER_MODEL = 'users.Users'
\ No newline at end of file
+AUTH_USER_MODEL = 'users.Users'
+
+# request.user se carga solo con las columnas de users.backends.LEAN_USER_FIELDS.
+# ModelBackend queda para las sesiones iniciadas antes del cambio (guardan la ruta del backend).
+AUTHENTICATION_BACKENDS = [
+    'users.backends.LeanModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# *** SESIONES Y CACHÉ ***
+# Sin REDIS_URL la caché es local de cada proceso (LocMemCache). Con REDIS_URL (requiere el
+# paquete redis) la comparten todos los workers.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+
+# SESSION_BACKEND:
+#   "cached_db"       se leen de la caché y se escriben también en la base (sin consulta por request).
+#                     Por defecto solo con REDIS_URL: con una caché por proceso, una sesión cerrada
+#                     en un worker seguiría válida en la caché de otro.
+#   "db"              solo la tabla django_session
+#   "signed_cookies"  en la cookie firmada, sin consultas; cerrar sesión no invalida copias de la cookie
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = SESSION_ENGINES[
+    os.environ.get('SESSION_BACKEND') or ('cached_db' if os.environ.get('REDIS_URL') else 'db')
+]
+
+# *** CACHÉ DE ROLES Y ESTADÍSTICAS ***
+# Segundos que se guarda el rol de cada usuario (se invalida al cambiar sus perfiles). Solo con
+# REDIS_URL: la invalidación en una caché por proceso no llega a los otros workers. Los requests
+# autenticados con LeanModelBackend no la usan: el rol viene en la misma consulta que request.user
+ROLE_CACHE_TIMEOUT = 300 if os.environ.get('REDIS_URL') else 0
+# Segundos que se guardan los conteos de usuarios del dashboard de administración; igual que el
+# rol, solo con REDIS_URL. El total de pacientes se lee siempre del contador RecordCount
+ADMIN_STATS_CACHE_TIMEOUT = 600 if os.environ.get('REDIS_URL') else 0
+# Segundos que se guarda el total sin filtrar (recordsTotal) de las tablas DataTables del historial
+# (users/datatables.py), para no hacer COUNT(*) en cada página. Un total atrasado no invalida nada,
+# así que también vale la caché por proceso; 0 cuenta en cada request
+DATATABLES_TOTAL_SECONDS = 60
+# Segundos que se guarda el total de consultas del dashboard de recepción cuando no hay estimación
+# de PostgreSQL (pg_class.reltuples, ver consultation_total en users/counters.py); 0 cuenta siempre
+CONSULTATION_TOTAL_SECONDS = 300
+
+# *** TABLERO DE CONSULTAS EN TIEMPO REAL (users/events.py, reception/events.py) ***
+# Segundos entre lecturas de la tabla de eventos cuando no hay LISTEN/NOTIFY de PostgreSQL
+CONSULTATION_EVENTS_POLL_SECONDS = 1.0
+# Segundos entre comentarios de keepalive en un stream abierto
+SSE_KEEPALIVE_SECONDS = 15
+# Duración máxima de un stream (ASGI); el navegador se reconecta solo desde su Last-Event-ID
+SSE_STREAM_SECONDS = 300
+# Milisegundos que espera el navegador antes de reconectarse (con WSGI, intervalo entre lecturas)
+SSE_RETRY_MS = 3000
+# Segundos hacia atrás que se repasan en cada lectura de eventos: una transacción que confirma más
+# tarde que otras posteriores entrega su evento con un id menor (ver EventCursor en users/events.py)
+CONSULTATION_EVENTS_REORDER_SECONDS = 10
+# Horas que se guardan los eventos (manage.py prune_consultation_events)
+CONSULTATION_EVENTS_RETENTION_HOURS = 24
+
+# *** TABLERO DE LA SALA DE ESPERA (users/waiting_board.py) ***
+# Números siguientes al actual que se muestran por turno
+WAITING_BOARD_NEXT_COUNT = 3
+# Segundos entre reconstrucciones completas del tablero en memoria (cubre cambios hechos sin señales)
+WAITING_BOARD_REBUILD_SECONDS = 600
+# Milisegundos entre consultas de cada pantalla
+WAITING_BOARD_POLL_MS = 5000
+
+# *** COLA DE TRIAGE (users/triage.py) ***
+# La cola ordena por prioridad y número de orden. Cada TRIAGE_AGING_MINUTES de espera real (desde la
+# hora agendada o el alta) una consulta sube un nivel hasta llegar al Nivel II, nunca al Nivel I, así un
+# Nivel V termina atendido aunque sigan llegando prioridades más altas. TRIAGE_MAX_BOOST limita los
+# niveles que se pueden subir (None: sin límite; 0 apaga el envejecimiento)
+TRIAGE_AGING_MINUTES = 60
+TRIAGE_MAX_BOOST = None
+# Segundos entre reconstrucciones completas de las colas en memoria
+TRIAGE_REBUILD_SECONDS = 600
+
+# *** INSTRUMENTACIÓN DE REQUESTS (users.middleware.ServerTimingMiddleware) ***
+# Fracción de requests medidos (0 desactiva, 1 mide todos); un request con el header
+# "X-Server-Timing: 1" se mide siempre. El header Server-Timing solo se envía a admins y staff
+SERVER_TIMING_SAMPLE_RATE = float(os.environ.get('SERVER_TIMING_SAMPLE_RATE', 0.01))
+# Un request se registra como lento si supera alguno de estos límites (la cantidad de consultas
+# y las más lentas solo en los requests medidos)
+SLOW_REQUEST_MS = 500
+SLOW_REQUEST_QUERIES = 50
+# Cantidad de consultas SQL más lentas incluidas en el log
+SLOW_REQUEST_TOP_SQL = 5
+
+# Perfilado a pedido de administradores (?_profile=1 o ?_profile=sample, users.middleware.ProfilingMiddleware)
+PROFILING_ENABLED = True
+PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+# Segundos entre muestras del perfilado por muestreo
+PROFILE_SAMPLE_INTERVAL = 0.005
+
+# Token del scraper de /metrics (header "Authorization: Bearer <token>"). Sin token el endpoint
+# solo responde a administradores con sesión iniciada
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+# Segundos entre las sumas de los contadores de cada worker a la caché compartida (users/metrics.py).
+# /metrics muestra el total de todos los workers (con REDIS_URL), atrasado a lo sumo este tiempo
+METRICS_FLUSH_SECONDS = 10
+
+# *** LOG DE CONSULTAS SQL LENTAS (users/slow_queries.py) ***
+# Milisegundos a partir de los cuales una consulta se registra (0 desactiva)
+SLOW_QUERY_MS = 200
+# Agregar el plan EXPLAIN (solo PostgreSQL, consultas SELECT)
+SLOW_QUERY_EXPLAIN = True
+# Guardar los parámetros de la consulta (pueden contener datos de pacientes)
+SLOW_QUERY_LOG_PARAMS = False
+LOG_DIR = os.path.join(BASE_DIR, 'logs')
+os.makedirs(LOG_DIR, exist_ok=True)
+SLOW_QUERY_LOG = os.path.join(LOG_DIR, 'slow_queries.jsonl')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+        'slow_queries_file': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'hospital.performance': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+        'hospital.slow_queries': {'handlers': ['slow_queries_file'], 'level': 'WARNING', 'propagate': False},
+        'hospital.events': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+        # Comparación de mytests/tests/test_benchmarks.py con BENCHMARK_BASELINE
+        'hospital.benchmarks': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
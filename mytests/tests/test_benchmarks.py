@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import statistics
+import subprocess
+import time
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from users.counters import rebuild_counters
+from users.datagen import generate_hospital_data
+from users.models import Administrator, Consultation, Doctor, Patient, Receptions, Users
+
+
+# python manage.py test mytests.tests.test_benchmarks -v 2
+#
+# Por defecto solo se verifica la cantidad de consultas SQL, que no depende de la máquina.
+#
+# Variables de entorno:
+#   BENCHMARK_SCALE=5          multiplica el volumen de datos generados
+#   BENCHMARK_LATENCY=1        verifica también los presupuestos de latencia
+#   BENCHMARK_LATENCY_FACTOR=2 relaja los presupuestos de latencia en máquinas lentas
+#   BENCHMARK_REPORT=ruta.json escribe el reporte JSON (sin esta variable no se escribe)
+#   BENCHMARK_BASELINE=ruta    reporte anterior contra el que se comparan los resultados (logger hospital.benchmarks)
+
+BENCHMARK_SCALE = int(os.environ.get('BENCHMARK_SCALE', 1))
+CHECK_LATENCY = os.environ.get('BENCHMARK_LATENCY', '') not in ('', '0')
+LATENCY_FACTOR = float(os.environ.get('BENCHMARK_LATENCY_FACTOR', 1))
+REPORT_PATH = os.environ.get('BENCHMARK_REPORT')
+BASELINE_PATH = os.environ.get('BENCHMARK_BASELINE')
+
+logger = logging.getLogger('hospital.benchmarks')
+
+# Repeticiones medidas por vista (después de una petición de calentamiento)
+REPEAT = 5
+
+# (nombre, rol, url, kwargs, parámetros GET, máximo de consultas SQL, latencia mediana máxima en ms)
+# Los kwargs y parámetros pueden ser nombres de ids del dataset (ver cls.ids).
+# La cantidad de consultas SQL no debe crecer con los datos: un presupuesto excedido suele ser un N+1.
+# Las vistas que muestran la cola de triage (users/triage.py) pueden leer una vez la tabla de eventos.
+VIEW_BUDGETS = [
+    # users
+    ('login', None, 'login', {}, {}, 0, 50),
+    ('dashboard', 'reception', 'dashboard', {}, {}, 2, 50),
+    # reception
+    ('reception_dashboard', 'reception', 'reception_dashboard', {}, {}, 4, 100),
+    ('consultation_list', 'reception', 'consultation_list', {}, {}, 5, 250),
+    ('consultation_history', 'reception', 'consultation_history', {}, {}, 2, 50),
+    ('consultation_history_data', 'reception', 'consultation_history_data', {}, {'length': 50}, 4, 150),
+    ('consultation_create', 'reception', 'consultation_create', {}, {}, 3, 150),
+    ('consultation_edit', 'reception', 'consultation_edit', {'pk': 'consultation'}, {}, 9, 150),
+    ('patient_list', 'reception', 'patient_list', {}, {}, 2, 50),
+    ('patient_list_data', 'reception', 'patient_list_data', {}, {'length': 50}, 4, 150),
+    ('patient_search', 'reception', 'patient_search', {}, {'q': 'gonz'}, 3, 50),
+    ('patient_detail', 'reception', 'patient_detail', {'pk': 'patient'}, {}, 3, 100),
+    ('patient_edit', 'reception', 'patient_edit', {'pk': 'patient'}, {}, 3, 150),
+    ('doctor_schedule_modal', 'reception', 'doctor_schedule_view', {'doctor_id': 'doctor'}, {'fecha': 'monday'}, 5, 50),
+    ('doctor_days', 'reception', 'doctor_days_view', {'doctor_id': 'doctor'}, {}, 3, 50),
+    # doctors
+    ('doctor_dashboard', 'doctor', 'doctor_dashboard', {}, {}, 6, 100),
+    ('doctor_patient_list', 'doctor', 'doctor_patient_list', {}, {}, 4, 300),
+    ('doctor_consultation_history', 'doctor', 'doctor_consultation_history', {}, {}, 2, 50),
+    ('doctor_consultation_history_data', 'doctor', 'doctor_consultation_history_data', {}, {'length': 50}, 4, 150),
+    ('attend_consultation', 'doctor', 'attend_consultation', {'consultation_id': 'doctor_consultation'}, {}, 7, 100),
+    # administrator
+    # Sin REDIS_URL las estadísticas no se guardan en caché: un aggregate de usuarios y el contador de pacientes
+    ('admin_dashboard', 'admin', 'admin_dashboard', {}, {}, 8, 100),
+    ('admin_users_list', 'admin', 'admin_users_list', {}, {}, 7, 150),
+    ('admin_permissions_list', 'admin', 'admin_permissions_list', {}, {}, 8, 300),
+    ('admin_select_user_for_role', 'admin', 'admin_select_user_for_role', {}, {}, 6, 100),
+]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class ViewBenchmarkTest(TestCase):
+    """
+    Mide latencia y cantidad de consultas SQL de las vistas principales sobre un dataset generado,
+    falla cuando se excede el presupuesto de consultas de alguna vista (y el de latencia con
+    BENCHMARK_LATENCY) y con BENCHMARK_REPORT escribe un reporte JSON para comparar commits.
+    """
+
+    results = []
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.volumes = {
+            'patients': 2000 * BENCHMARK_SCALE,
+            'doctors': 10 * BENCHMARK_SCALE,
+            'consultations': 8000 * BENCHMARK_SCALE,
+        }
+        generate_hospital_data(**cls.volumes, seed=42)
+        rebuild_counters()
+
+        cls.users = {}
+        cls.users['reception'] = Users.objects.create_user(username='bench_rec', email='bench_rec@example.com', password='x')
+        Receptions.objects.create(user=cls.users['reception'])
+        cls.users['admin'] = Users.objects.create_user(username='bench_admin', email='bench_admin@example.com', password='x')
+        Administrator.objects.create(user=cls.users['admin'])
+        doctor = Doctor.objects.select_related('user').order_by('user__username').first()
+        cls.users['doctor'] = doctor.user
+
+        hoy = date.today()
+        cls.ids = {
+            'doctor': doctor.pk,
+            'patient': Patient.objects.order_by('pk').values_list('pk', flat=True).first(),
+            'consultation': Consultation.objects.filter(status='EN ESPERA').order_by('pk').values_list('pk', flat=True).first(),
+            'doctor_consultation': Consultation.objects.filter(doctor=doctor, status='EN ESPERA').order_by('pk').values_list('pk', flat=True).first(),
+            'monday': (hoy + timedelta(days=7 - hoy.weekday())).isoformat(),
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._write_report()
+        super().tearDownClass()
+
+    @classmethod
+    def _write_report(cls):
+        if not cls.results or not REPORT_PATH:
+            return
+        reporte = {
+            'commit': _git_commit(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'database': connection.vendor,
+            'scale': BENCHMARK_SCALE,
+            'volumes': getattr(cls, 'volumes', {}),
+            'views': {r['name']: r for r in cls.results},
+        }
+        with open(REPORT_PATH, 'w', encoding='utf-8') as f:
+            json.dump(reporte, f, indent=2, ensure_ascii=False)
+        if BASELINE_PATH and os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH, encoding='utf-8') as f:
+                anterior = json.load(f).get('views', {})
+            lineas = [f"Comparación con {BASELINE_PATH} (consultas, mediana ms):"]
+            for nombre, actual in reporte['views'].items():
+                base = anterior.get(nombre)
+                if not base:
+                    lineas.append(f"  {nombre:32} {actual['queries']:>4} q {actual['median_ms']:>8.1f} ms  (nueva)")
+                    continue
+                lineas.append(
+                    f"  {nombre:32} {base['queries']:>4} -> {actual['queries']:<4} q "
+                    f"{base['median_ms']:>8.1f} -> {actual['median_ms']:.1f} ms"
+                )
+            logger.info('\n'.join(lineas))
+
+    def _url(self, url_name, kwargs, params):
+        url = reverse(url_name, kwargs={k: self.ids.get(v, v) for k, v in kwargs.items()})
+        return url, {k: self.ids.get(v, v) if isinstance(v, str) else v for k, v in params.items()}
+
+    def _measure(self, url, params):
+        response = self.client.get(url, params)
+        self.assertLess(response.status_code, 400, url)
+        tiempos = []
+        for _ in range(REPEAT):
+            with CaptureQueriesContext(connection) as ctx:
+                inicio = time.perf_counter()
+                response = self.client.get(url, params)
+                # Las respuestas en streaming se consumen para medir el render completo
+                b''.join(response) if response.streaming else response.content
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+        return len(ctx.captured_queries), tiempos
+
+    def test_view_budgets(self):
+        cache.clear()
+        for nombre, rol, url_name, kwargs, params, max_queries, max_ms in VIEW_BUDGETS:
+            with self.subTest(view=nombre):
+                if rol:
+                    self.client.force_login(self.users[rol])
+                else:
+                    self.client.logout()
+                url, query = self._url(url_name, kwargs, params)
+                consultas, tiempos = self._measure(url, query)
+                mediana = statistics.median(tiempos)
+                limite_ms = max_ms * LATENCY_FACTOR
+                self.results.append({
+                    'name': nombre, 'url': url, 'queries': consultas,
+                    'median_ms': round(mediana, 2), 'max_ms': round(max(tiempos), 2),
+                    'query_budget': max_queries, 'latency_budget_ms': limite_ms,
+                })
+                self.assertLessEqual(consultas, max_queries, f"{nombre}: {consultas} consultas SQL")
+                if CHECK_LATENCY:
+                    self.assertLessEqual(mediana, limite_ms, f"{nombre}: {mediana:.1f} ms")
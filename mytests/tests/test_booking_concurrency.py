@@ -0,0 +1,138 @@
+import threading
+from collections import Counter
+from datetime import date, time
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from reception.services import BookingError, book_consultation
+from users.models import Users, Specialty, Doctor, DoctorSchedule, Patient, Consultation
+
+
+# python manage.py test mytests.tests.test_booking_concurrency -v 2
+
+LUNES = date(2025, 1, 6)
+
+
+def _crear_agenda(pacientes):
+    specialty = Specialty.objects.create(name="Clínica", description="General")
+    doctor_user = Users.objects.create_user(
+        username='doc_lock', email='lock@example.com', password='pass12345', is_doctor=True
+    )
+    doctor = Doctor.objects.create(user=doctor_user, specialty=specialty, bio="Bio")
+    DoctorSchedule.objects.create(
+        doctor=doctor, day='LUNES', start_time=time(8, 0), end_time=time(12, 0), consultorio='a101'
+    )
+    Patient.objects.bulk_create([
+        Patient(
+            first_name='Carga', last_name=f'Paciente {n}', phone='+595111222333',
+            identification_type='CI', identification_number=f'5550{n:04d}',
+            gender='Other', date_of_birth=date(1990, 1, 1),
+            address_line='Av 1', city='Asunción', region='Central', postal_code='1000',
+            emergency_contact_name='E', emergency_contact_relationship='Madre',
+            emergency_contact_phone='+595444555666'
+        )
+        for n in range(pacientes)
+    ])
+    return doctor, list(Patient.objects.order_by('pk'))
+
+
+def _consulta(doctor, paciente, hora):
+    return Consultation(
+        description='Control', date=LUNES, time=hora, shift='MAÑANA',
+        doctor=doctor, patient=paciente
+    )
+
+
+class BookingServiceTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, cls.pacientes = _crear_agenda(3)
+
+    def test_assigns_room_and_queue_order(self):
+        primera = book_consultation(_consulta(self.doctor, self.pacientes[0], time(8, 0)))
+        segunda = book_consultation(_consulta(self.doctor, self.pacientes[1], time(8, 30)))
+        self.assertEqual(primera.consultorio, 'a101')
+        self.assertEqual((primera.order, segunda.order), (1, 2))
+
+    def test_rejects_taken_slot_and_missing_schedule(self):
+        book_consultation(_consulta(self.doctor, self.pacientes[0], time(9, 0)))
+        with self.assertRaisesMessage(BookingError, "ya está ocupado"):
+            book_consultation(_consulta(self.doctor, self.pacientes[1], time(9, 0)))
+        with self.assertRaisesMessage(BookingError, "no está disponible"):
+            book_consultation(_consulta(self.doctor, self.pacientes[2], time(15, 0)))
+        self.assertEqual(Consultation.objects.count(), 1)
+
+    def test_reschedule_keeps_order_in_same_queue(self):
+        consulta = book_consultation(_consulta(self.doctor, self.pacientes[0], time(9, 0)))
+        cola = (consulta.doctor_id, consulta.date, consulta.shift)
+        consulta.time = time(9, 30)
+        book_consultation(consulta, cola_original=cola, asignar_consultorio=False)
+        self.assertEqual(Consultation.objects.get().order, 1)
+
+
+def _supports_concurrent_writes():
+    """
+    PostgreSQL, o SQLite en archivo con OPTIONS transaction_mode='IMMEDIATE' (las transacciones
+    esperan su turno en lugar de fallar con "database is locked"). La base en memoria no sirve.
+    """
+    if connection.vendor == 'postgresql':
+        return True
+    return (
+        connection.vendor == 'sqlite'
+        and not connection.is_in_memory_db()
+        and connection.settings_dict.get('OPTIONS', {}).get('transaction_mode') == 'IMMEDIATE'
+    )
+
+
+class ConcurrentBookingStressTest(TransactionTestCase):
+    """Cientos de reservas simultáneas sobre pocos bloques: ningún bloque ni orden puede repetirse"""
+
+    HILOS = 16
+    RESERVAS = 240
+    # 8 bloques de 30 minutos entre las 8:00 y las 12:00
+    BLOQUES = [time(8 + m // 60, m % 60) for m in range(0, 240, 30)]
+
+    def setUp(self):
+        if not _supports_concurrent_writes():
+            self.skipTest("Requiere PostgreSQL o SQLite en archivo con transaction_mode IMMEDIATE")
+
+    def test_no_double_booking_under_contention(self):
+        doctor, pacientes = _crear_agenda(self.RESERVAS)
+        barrera = threading.Barrier(self.HILOS)
+        resultados = Counter()
+        errores = []
+        lock = threading.Lock()
+
+        def reservar(indices):
+            try:
+                barrera.wait()
+                for i in indices:
+                    hora = self.BLOQUES[i % len(self.BLOQUES)]
+                    try:
+                        book_consultation(_consulta(doctor, pacientes[i], hora))
+                        resultado = 'ok'
+                    except BookingError:
+                        resultado = 'conflicto'
+                    with lock:
+                        resultados[resultado] += 1
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connections.close_all()
+
+        hilos = [
+            threading.Thread(target=reservar, args=(range(n, self.RESERVAS, self.HILOS),))
+            for n in range(self.HILOS)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        self.assertEqual(resultados['ok'] + resultados['conflicto'], self.RESERVAS)
+        self.assertEqual(resultados['ok'], len(self.BLOQUES))
+        consultas = Consultation.objects.filter(doctor=doctor, date=LUNES)
+        horas = list(consultas.values_list('time', flat=True))
+        self.assertEqual(len(horas), len(set(horas)))
+        ordenes = sorted(consultas.values_list('order', flat=True))
+        self.assertEqual(ordenes, list(range(1, len(self.BLOQUES) + 1)))
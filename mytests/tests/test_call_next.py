@@ -0,0 +1,139 @@
+import threading
+from datetime import time
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from doctors.services import call_next_consultation, current_shift
+from users.models import Consultation, Receptions, Users
+from users.wait_times import record_status_event
+from .test_booking_concurrency import LUNES, _crear_agenda, _supports_concurrent_writes
+
+
+# python manage.py test mytests.tests.test_call_next -v 2
+
+def _encolar(doctor, pacientes, prioridades, shift='MAÑANA', hora=8):
+    """Una consulta en espera por paciente cada 15 minutos desde `hora`, con orden 1, 2, ... y la prioridad indicada"""
+    return [
+        Consultation.objects.create(
+            description='Control', date=LUNES, time=time(*divmod(hora * 60 + 15 * n, 60)), shift=shift,
+            order=n + 1, priority=prioridad, consultorio='a101', doctor=doctor, patient=paciente
+        )
+        for n, (paciente, prioridad) in enumerate(zip(pacientes, prioridades))
+    ]
+
+
+class CallNextConsultationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, cls.pacientes = _crear_agenda(4)
+
+    def test_priority_then_order(self):
+        consultas = _encolar(self.doctor, self.pacientes[:3], ['Nivel IV', 'Nivel II', 'NIVEL I'])
+        # Recién dados de alta: ninguno sube de nivel por la espera
+        for consulta in consultas:
+            record_status_event(consulta, 'created')
+        llamadas = [call_next_consultation(self.doctor, LUNES, 'MAÑANA') for _ in range(3)]
+        self.assertEqual([c.pk for c in llamadas], [consultas[2].pk, consultas[1].pk, consultas[0].pk])
+        self.assertIsNone(call_next_consultation(self.doctor, LUNES, 'MAÑANA'))
+        self.assertEqual(set(Consultation.objects.values_list('status', flat=True)), {'EN CONSULTA'})
+
+    def test_waiting_time_ages(self):
+        # El Nivel V espera desde las 8:00 (sube hasta el Nivel II); los otros dos se dieron de alta recién
+        consultas = _encolar(self.doctor, self.pacientes[:3], ['Nivel V', 'Nivel IV', 'NIVEL I'])
+        for consulta in consultas[1:]:
+            record_status_event(consulta, 'created')
+        llamadas = [call_next_consultation(self.doctor, LUNES, 'MAÑANA').pk for _ in range(3)]
+        self.assertEqual(llamadas, [consultas[2].pk, consultas[0].pk, consultas[1].pk])
+
+    @override_settings(TRIAGE_MAX_BOOST=0)
+    def test_without_aging(self):
+        consultas = _encolar(self.doctor, self.pacientes[:2], ['Nivel V', 'Nivel IV'])
+        record_status_event(consultas[1], 'created')
+        self.assertEqual(call_next_consultation(self.doctor, LUNES, 'MAÑANA').pk, consultas[1].pk)
+
+    def test_single_locking_query(self):
+        _encolar(self.doctor, self.pacientes[:3], ['Nivel IV', 'Nivel II', 'NIVEL I'])
+        with CaptureQueriesContext(connection) as queries:
+            call_next_consultation(self.doctor, LUNES, 'MAÑANA')
+        # Una sola lectura de la cola, ordenada y limitada en la base
+        cola = [
+            q['sql'] for q in queries.captured_queries
+            if 'FROM "users_consultation"' in q['sql'] and "'EN ESPERA'" in q['sql']
+        ]
+        self.assertEqual(len(cola), 1)
+        self.assertIn('ORDER BY', cola[0])
+        self.assertIn('LIMIT 1', cola[0])
+
+    def test_only_current_shift_and_waiting(self):
+        tarde = _encolar(self.doctor, self.pacientes[:1], ['Nivel IV'], shift='TARDE', hora=14)[0]
+        cancelada = _encolar(self.doctor, self.pacientes[1:2], ['NIVEL I'])[0]
+        Consultation.objects.filter(pk=cancelada.pk).update(status='CANCELADA')
+        self.assertIsNone(call_next_consultation(self.doctor, LUNES, 'MAÑANA'))
+        self.assertEqual(call_next_consultation(self.doctor, LUNES, 'TARDE').pk, tarde.pk)
+
+    def test_current_shift(self):
+        self.assertEqual(current_shift(time(9, 0)), 'MAÑANA')
+        self.assertEqual(current_shift(time(15, 0)), 'TARDE')
+        self.assertEqual(current_shift(time(22, 0)), 'NOCHE')
+
+    def test_endpoint(self):
+        consulta = _encolar(self.doctor, self.pacientes[:1], ['Nivel IV'])[0]
+        self.client.force_login(self.doctor.user)
+        url = reverse('call_next_consultation')
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.client.post(url, {'shift': 'NOCHE'}).json(), {'success': True, 'consultation': None})
+
+        # El endpoint llama la cola del día: se mueve la consulta a hoy
+        Consultation.objects.filter(pk=consulta.pk).update(date=timezone.localdate())
+        data = self.client.post(url, {'shift': 'MAÑANA'}).json()['consultation']
+        self.assertEqual(data['id'], consulta.pk)
+        self.assertEqual(data['patient'], self.pacientes[0].full_name)
+        self.assertEqual(data['attend_url'], reverse('attend_consultation', args=[consulta.pk]))
+        self.assertEqual(self.client.post(url, {'shift': 'OTRO'}).status_code, 400)
+
+    def test_endpoint_requires_doctor(self):
+        recepcion = Users.objects.create_user(username='rec_llamar', password='123', email='rec_llamar@test.com')
+        Receptions.objects.create(user=recepcion)
+        self.client.force_login(recepcion)
+        self.assertEqual(self.client.post(reverse('call_next_consultation')).status_code, 403)
+
+
+class ConcurrentCallNextTest(TransactionTestCase):
+    """Varias sesiones del mismo doctor llamando a la vez: ningún paciente se llama dos veces"""
+
+    HILOS = 8
+    PACIENTES = 40
+
+    def setUp(self):
+        if not _supports_concurrent_writes():
+            self.skipTest("Requiere PostgreSQL o SQLite en archivo con transaction_mode IMMEDIATE")
+
+    def test_each_patient_called_once(self):
+        doctor, pacientes = _crear_agenda(self.PACIENTES)
+        _encolar(doctor, pacientes, ['Nivel IV'] * self.PACIENTES)
+        barrera = threading.Barrier(self.HILOS)
+        llamadas, errores = [], []
+        lock = threading.Lock()
+
+        def llamar():
+            try:
+                barrera.wait()
+                while (consulta := call_next_consultation(doctor, LUNES, 'MAÑANA')) is not None:
+                    with lock:
+                        llamadas.append(consulta.pk)
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=llamar) for _ in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        self.assertEqual(len(llamadas), self.PACIENTES)
+        self.assertEqual(len(set(llamadas)), self.PACIENTES)
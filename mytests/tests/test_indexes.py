@@ -0,0 +1,86 @@
+from unittest import skipUnless
+from django.test import TestCase
+from django.db import connection, IntegrityError, transaction
+from users.models import Users, Specialty, Doctor, Patient, Consultation
+from datetime import date, time
+
+
+# python manage.py test mytests.tests.test_indexes -v 2
+
+class ConsultationSlotConstraintTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        specialty = Specialty.objects.create(name="Neurología", description="Cerebro")
+        doctor_user = Users.objects.create_user(
+            username='doc_idx', email='idx@example.com', password='pass12345', is_doctor=True
+        )
+        cls.doctor = Doctor.objects.create(user=doctor_user, specialty=specialty, bio="Bio")
+        cls.patient = Patient.objects.create(
+            first_name='Eva', last_name='Índice', phone='+595111222333',
+            identification_type='CI', identification_number='77700011',
+            gender='Female', date_of_birth=date(1995, 5, 5),
+            address_line='Av 2', city='Asunción', region='Central', postal_code='2000',
+            emergency_contact_name='Luis', emergency_contact_relationship='Padre',
+            emergency_contact_phone='+595444555666'
+        )
+
+    def _consulta(self, order, status='EN ESPERA'):
+        return Consultation.objects.create(
+            description='Control', date=date(2025, 1, 6), time=time(9, 0), shift='MAÑANA',
+            order=order, consultorio='a101', status=status, doctor=self.doctor, patient=self.patient
+        )
+
+    def test_same_doctor_slot_rejected(self):
+        self._consulta(1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self._consulta(2)
+
+    def test_cancelled_consultation_frees_slot(self):
+        self._consulta(1, status='CANCELADA')
+        self._consulta(2)
+        self.assertEqual(Consultation.objects.count(), 2)
+
+
+@skipUnless(connection.vendor == 'postgresql', "EXPLAIN de índices solo en PostgreSQL")
+class HotQueryIndexTest(TestCase):
+    """Verifica que las consultas más usadas de recepción y doctores se resuelvan con índices"""
+
+    def assertUsesIndex(self, queryset):
+        # Con tablas de prueba pequeñas el planificador prefiere seq scan; se desactiva para ver si hay índice
+        with connection.cursor() as cur:
+            cur.execute("SET LOCAL enable_seqscan = off")
+        plan = queryset.explain()
+        self.assertIn("Index", plan, plan)
+
+    def test_doctor_day_queue(self):
+        self.assertUsesIndex(
+            Consultation.objects.filter(doctor_id=1, date=date(2025, 1, 6)).order_by('shift', 'order')
+        )
+
+    def test_doctor_booked_slots(self):
+        self.assertUsesIndex(
+            Consultation.objects.filter(doctor_id=1, date=date(2025, 1, 6)).values_list('time', 'consultorio')
+        )
+
+    def test_doctor_waiting_list(self):
+        self.assertUsesIndex(Consultation.objects.filter(doctor_id=1, status="EN ESPERA"))
+
+    def test_history_by_status(self):
+        self.assertUsesIndex(Consultation.objects.filter(status="ATENDIDO").order_by('-date', '-time'))
+
+    def test_today_count(self):
+        self.assertUsesIndex(Consultation.objects.filter(date=date(2025, 1, 6)))
+
+    def test_pending_agenda(self):
+        self.assertUsesIndex(
+            Consultation.objects.exclude(status="ATENDIDO").order_by('date', 'shift', 'order')
+        )
+
+    def test_patient_sort_by_name(self):
+        self.assertUsesIndex(Patient.objects.order_by('last_name', 'first_name'))
+
+    def test_patient_ci_substring_search(self):
+        self.assertUsesIndex(Patient.objects.filter(identification_number__icontains='2345'))
+
+    def test_patient_name_trigram_search(self):
+        self.assertUsesIndex(Patient.objects.filter(last_name__icontains='gonz'))
@@ -149,4 +149,22 @@ class BasicFlow(TestCase):
         resp = self.client.post(url, {'nuevo_estado': 'CANCELADA'}, follow=True)
         self.assertIn(resp.status_code, (200, 302))
         consulta.refresh_from_db()
-        self.assertEqual(consulta.status, 'CANCELADA')
\ No newline at end of file
+        self.assertEqual(consulta.status, 'CANCELADA')
+    def test_4_doctor_history_page(self):
+        patient = self._create_patient_for_consultation()
+        consulta = Consultation.objects.create(
+            description='Control', date=date(2025, 1, 6), time=time(9, 0), shift='MAÑANA', order=1,
+            priority='Nivel IV', consultorio='a101', status='ATENDIDO', doctor=self.doctor, patient=patient,
+            pulso=72, indicaciones='Reposo',
+        )
+        self.assertTrue(self.client.login(username='doctor', password='pass12345'))
+        with self.settings(DATATABLES_TOTAL_SECONDS=0):
+            data = self.client.get(reverse('doctor_consultation_history_data'), {'draw': 2, 'length': 10}).json()
+        self.assertEqual((data['draw'], data['recordsTotal'], data['recordsFiltered']), (2, 1, 1))
+        fila = data['data'][0]
+        self.assertEqual((fila['id'], fila['pulso'], fila['indicaciones']), (consulta.pk, 72, 'Reposo'))
+        self.assertEqual(fila['edit_url'], reverse('edit_consultation', args=[consulta.pk]))
+
+        # Solo los doctores piden las filas
+        self.assertTrue(self.client.login(username='reception', password='pass12345'))
+        self.assertEqual(self.client.get(reverse('doctor_consultation_history_data')).status_code, 403)
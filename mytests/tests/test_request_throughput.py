@@ -0,0 +1,33 @@
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TransactionTestCase
+from django.urls import reverse
+from users.models import Receptions, Users
+
+
+# python manage.py test mytests.tests.test_request_throughput -v 2
+
+class RequestThroughputCommandTest(TransactionTestCase):
+    """benchmark_requests pasa por el handler WSGI y sus señales, así que CONN_MAX_AGE se aplica"""
+
+    # Las vistas pueden leer de la réplica si está configurada
+    databases = '__all__'
+
+    def test_compares_connection_modes(self):
+        user = Users.objects.create_user(username='rps_rec', email='rps_rec@example.com', password='x')
+        Receptions.objects.create(user=user)
+        conn_max_age = connection.settings_dict['CONN_MAX_AGE']
+        salida = StringIO()
+        call_command(
+            'benchmark_requests', username='rps_rec', path=[reverse('reception_dashboard')],
+            requests=20, threads=2, modes='none,persistent', host='testserver', stdout=salida,
+        )
+        filas = {linea.split()[0]: linea.split() for linea in salida.getvalue().splitlines()[2:4]}
+        self.assertEqual(set(filas), {'none', 'persistent'})
+        for columnas in filas.values():
+            self.assertGreater(float(columnas[1]), 0)
+            self.assertEqual(columnas[5], '0')
+        # Una conexión por hilo y por base como máximo cuando se reutilizan
+        self.assertLessEqual(int(filas['persistent'][4]), 2 * len(connections.settings))
+        self.assertEqual(connection.settings_dict['CONN_MAX_AGE'], conn_max_age)
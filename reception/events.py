@@ -0,0 +1,71 @@
+"""
+Streams Server-Sent Events del tablero de consultas (ver users/events.py).
+Con ASGI la conexión queda abierta y recibe los eventos a medida que ocurren; con WSGI
+se envían los eventos pendientes y se cierra, y el navegador vuelve a pedir a los
+SSE_RETRY_MS milisegundos (no se bloquea un hilo del worker por cliente).
+"""
+import asyncio
+import json
+from django.conf import settings
+from users.events import EventCursor, broker, db_call
+
+
+def sse_frame(evento, cursor):
+    # El id del frame es el cursor (el mayor id enviado) y no el del evento: uno que confirmó tarde
+    # no debe hacer retroceder el Last-Event-ID del navegador
+    data = json.dumps({'action': evento['action'], 'event_id': evento['id'], **evento['data']}, ensure_ascii=False)
+    return f"id: {cursor}\nevent: consultation\ndata: {data}\n\n"
+
+
+def _start_frames(cursor, retry_ms):
+    # Un bloque con solo "id:" fija el Last-Event-ID del navegador sin disparar un evento
+    return f"retry: {retry_ms}\nid: {cursor}\n\n"
+
+
+def _event_cursor(last_id):
+    # Al reconectarse se repasa la ventana detrás del Last-Event-ID (ver EventCursor): los eventos
+    # repetidos llevan el mismo event_id y el navegador los descarta
+    return EventCursor.current() if last_id is None else EventCursor(last_id)
+
+
+def consultation_event_batch(last_id):
+    """Eventos posteriores a `last_id` y fin de la respuesta (WSGI)"""
+    cursor = _event_cursor(last_id)
+    enviado = cursor.last_id
+    yield _start_frames(enviado, getattr(settings, 'SSE_RETRY_MS', 3000))
+    while eventos := cursor.fetch():
+        for evento in eventos:
+            enviado = max(enviado, evento['id'])
+            yield sse_frame(evento, enviado)
+
+
+async def consultation_event_stream(last_id):
+    """Eventos posteriores a `last_id` y luego los nuevos, hasta SSE_STREAM_SECONDS (ASGI)"""
+    keepalive = getattr(settings, 'SSE_KEEPALIVE_SECONDS', 15)
+    loop = asyncio.get_running_loop()
+    fin = loop.time() + getattr(settings, 'SSE_STREAM_SECONDS', 300)
+    cola = await broker.subscribe()
+    try:
+        cursor = await db_call(_event_cursor, last_id)
+        enviado = cursor.last_id
+        yield _start_frames(enviado, getattr(settings, 'SSE_RETRY_MS', 3000))
+        while eventos := await db_call(cursor.fetch):
+            for evento in eventos:
+                enviado = max(enviado, evento['id'])
+                yield sse_frame(evento, enviado)
+
+        while (restante := fin - loop.time()) > 0:
+            try:
+                evento = await asyncio.wait_for(cola.get(), timeout=min(keepalive, restante))
+            except asyncio.TimeoutError:
+                # Comentario SSE: mantiene viva la conexión a través de proxies
+                yield ": ping\n\n"
+                continue
+            if evento is None:
+                break
+            # El broker y la lectura inicial pueden traer el mismo evento
+            if cursor.mark(evento):
+                enviado = max(enviado, evento['id'])
+                yield sse_frame(evento, enviado)
+    finally:
+        broker.unsubscribe(cola)
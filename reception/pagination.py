@@ -0,0 +1,80 @@
+import base64
+import json
+from django.db.models import Q
+
+# Cantidad de filas por página en los listados
+PAGE_SIZE = 50
+
+
+def encode_cursor(obj, ordering):
+    """Codifica los valores de ordenamiento de una fila como cursor opaco para la URL"""
+    valores = [str(getattr(obj, campo.lstrip('-'))) for campo in ordering]
+    return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode()
+
+
+def decode_cursor(cursor, model, ordering):
+    """Decodifica un cursor; retorna None si es inválido"""
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        if len(valores) != len(ordering):
+            return None
+        return [
+            model._meta.get_field(campo.lstrip('-')).to_python(valor)
+            for campo, valor in zip(ordering, valores)
+        ]
+    except Exception:
+        return None
+
+
+def _seek_filter(ordering, valores, reverse=False):
+    """
+    Condición "fila posterior al cursor" para un ordenamiento compuesto:
+    (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+    """
+    condicion = Q()
+    iguales = {}
+    for campo, valor in zip(ordering, valores):
+        nombre = campo.lstrip('-')
+        descendente = campo.startswith('-') != reverse
+        lookup = 'lt' if descendente else 'gt'
+        condicion |= Q(**iguales, **{f'{nombre}__{lookup}': valor})
+        iguales[nombre] = valor
+    return condicion
+
+
+def keyset_page(queryset, ordering, after=None, before=None, page_size=PAGE_SIZE):
+    """
+    Paginación por cursor (keyset): en lugar de OFFSET filtra por los valores
+    de la última fila vista, así cada página cuesta lo mismo sin importar la página.
+    `ordering` debe terminar en un campo único (por ejemplo 'id') para desempatar.
+    """
+    model = queryset.model
+    cursor_after = decode_cursor(after, model, ordering) if after else None
+    cursor_before = decode_cursor(before, model, ordering) if before and not cursor_after else None
+
+    if cursor_before:
+        # Página anterior: se recorre en orden inverso y luego se da vuelta
+        invertido = [campo[1:] if campo.startswith('-') else f'-{campo}' for campo in ordering]
+        filas = list(
+            queryset.filter(_seek_filter(ordering, cursor_before, reverse=True))
+            .order_by(*invertido)[:page_size + 1]
+        )
+        has_previous = len(filas) > page_size
+        filas = filas[:page_size][::-1]
+        has_next = True
+    else:
+        consulta = queryset.order_by(*ordering)
+        if cursor_after:
+            consulta = consulta.filter(_seek_filter(ordering, cursor_after))
+        filas = list(consulta[:page_size + 1])
+        has_next = len(filas) > page_size
+        filas = filas[:page_size]
+        has_previous = cursor_after is not None
+
+    return {
+        'object_list': filas,
+        'has_next': has_next and bool(filas),
+        'has_previous': has_previous and bool(filas),
+        'next_cursor': encode_cursor(filas[-1], ordering) if filas else None,
+        'previous_cursor': encode_cursor(filas[0], ordering) if filas else None,
+    }
@@ -0,0 +1,150 @@
+from datetime import datetime, timedelta
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Max
+from users.metrics import count_booking
+from users.models import Consultation, Doctor, DoctorSchedule, QueueSequence
+
+# Nombre del día según el modelo DoctorSchedule (0 = lunes)
+DIAS_SEMANA = {
+    0: 'LUNES', 1: 'MARTES', 2: 'MIERCOLES', 3: 'JUEVES',
+    4: 'VIERNES', 5: 'SABADO', 6: 'DOMINGO'
+}
+
+# Duración de cada consulta (en minutos)
+DURACION_CONSULTA = 30
+
+# Mensajes de los conflictos al agendar
+MENSAJE_SIN_HORARIO = "El doctor no está disponible en ese horario."
+MENSAJE_OCUPADO = "El horario seleccionado ya está ocupado."
+
+
+class BookingError(Exception):
+    """No se pudo agendar: el doctor no atiende en ese horario o el bloque ya está ocupado"""
+
+
+def weekday_name(fecha):
+    """Retorna el día de la semana en español para una fecha"""
+    return DIAS_SEMANA[fecha.weekday()]
+
+
+def booked_slots(doctor, fecha, exclude_id=None):
+    """Conjunto de (hora, consultorio) ya agendados para el doctor en la fecha, en una sola consulta"""
+    consultas = Consultation.objects.filter(doctor=doctor, date=fecha).exclude(status='CANCELADA')
+    if exclude_id:
+        consultas = consultas.exclude(pk=exclude_id)
+    return set(consultas.values_list('time', 'consultorio'))
+
+
+def expand_blocks(horario, ocupados, duracion=DURACION_CONSULTA):
+    """Divide un horario en bloques de `duracion` minutos marcando los ocupados"""
+    inicio = datetime.combine(datetime.today(), horario.start_time)
+    fin = datetime.combine(datetime.today(), horario.end_time)
+    paso = timedelta(minutes=duracion)
+    bloques = []
+    actual = inicio
+    while actual + paso <= fin:
+        bloque_inicio = actual.time()
+        bloques.append({
+            'dia': horario.day,
+            'inicio': bloque_inicio.strftime('%H:%M'),
+            'fin': (actual + paso).time().strftime('%H:%M'),
+            'consultorio': horario.consultorio,
+            'ocupado': (bloque_inicio, horario.consultorio) in ocupados,
+        })
+        actual += paso
+    return bloques
+
+
+def doctor_availability(doctor, fecha, exclude_id=None):
+    """
+    Disponibilidad del doctor para una fecha: horarios del día y sus bloques.
+    Usa dos consultas en total sin importar la duración del turno.
+    """
+    horarios = list(
+        DoctorSchedule.objects.filter(doctor=doctor, day=weekday_name(fecha)).order_by('start_time')
+    )
+    if not horarios:
+        return []
+    ocupados = booked_slots(doctor, fecha, exclude_id)
+    return [
+        {'horario': horario, 'bloques': expand_blocks(horario, ocupados)}
+        for horario in horarios
+    ]
+
+
+def find_schedule(doctor, fecha, hora):
+    """Horario del doctor que cubre la fecha y hora indicadas, o None"""
+    return DoctorSchedule.objects.filter(
+        doctor=doctor,
+        day=weekday_name(fecha),
+        start_time__lte=hora,
+        end_time__gte=hora
+    ).first()
+
+
+def next_queue_order(doctor, fecha, turno):
+    """
+    Asigna el siguiente número de orden de la cola del doctor para la fecha y turno.
+    La fila contador se bloquea e incrementa con F(), por lo que dos recepcionistas
+    nunca obtienen el mismo número. Debe llamarse dentro de la transacción que guarda la consulta.
+    """
+    with transaction.atomic():
+        secuencia, _ = QueueSequence.objects.select_for_update().get_or_create(
+            doctor=doctor,
+            date=fecha,
+            shift=turno,
+            # Al crear el contador se parte del último orden ya registrado
+            defaults={'last_order': lambda: Consultation.objects.filter(
+                doctor=doctor, date=fecha, shift=turno
+            ).aggregate(ultimo=Max('order'))['ultimo'] or 0},
+        )
+        QueueSequence.objects.filter(pk=secuencia.pk).update(last_order=F('last_order') + 1)
+        secuencia.refresh_from_db(fields=['last_order'])
+    return secuencia.last_order
+
+
+def lock_doctor_day(doctor_id, fecha):
+    """
+    Bloquea la agenda del doctor para la fecha hasta el fin de la transacción actual.
+    En PostgreSQL usa un advisory lock (doctor, día) que no bloquea a otros doctores ni otros días;
+    en otras bases se bloquea la fila del doctor (SQLite ya serializa todas las escrituras).
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [doctor_id, fecha.toordinal()])
+    else:
+        list(Doctor.objects.select_for_update().filter(pk=doctor_id).values_list('pk', flat=True))
+
+
+def book_consultation(consulta, cola_original=None, asignar_consultorio=True):
+    """
+    Agenda (o reprograma) una consulta con la agenda del doctor bloqueada:
+    verifica el horario y el bloque, asigna consultorio y número de orden y guarda.
+    `cola_original` es (doctor_id, fecha, turno) antes de editar; solo se asigna un nuevo
+    orden si la consulta es nueva o cambia de cola. Lanza BookingError ante un conflicto.
+    """
+    try:
+        with transaction.atomic():
+            if consulta.doctor_id:
+                lock_doctor_day(consulta.doctor_id, consulta.date)
+                if asignar_consultorio:
+                    horario = find_schedule(consulta.doctor, consulta.date, consulta.time)
+                    if not horario:
+                        raise BookingError(MENSAJE_SIN_HORARIO)
+                    consulta.consultorio = horario.consultorio
+                if consulta.status != 'CANCELADA' and Consultation.objects.filter(
+                    doctor_id=consulta.doctor_id, date=consulta.date, time=consulta.time
+                ).exclude(status='CANCELADA').exclude(pk=consulta.pk).exists():
+                    raise BookingError(MENSAJE_OCUPADO)
+                if consulta.pk is None or (consulta.doctor_id, consulta.date, consulta.shift) != cola_original:
+                    consulta.order = next_queue_order(consulta.doctor, consulta.date, consulta.shift)
+            consulta.save()
+    except IntegrityError:
+        # Última defensa: las restricciones únicas de horario y orden en la base
+        count_booking('conflict')
+        raise BookingError(MENSAJE_OCUPADO)
+    except BookingError:
+        count_booking('conflict')
+        raise
+    count_booking('ok')
+    return consulta
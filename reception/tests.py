@@ -1,9 +1,23 @@
 # reception/tests.py
-from django.test import TestCase, Client
+import json
+from unittest import mock
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.core.cache import cache
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from datetime import date, time, timedelta
-from users.models import Receptions, Patient, Doctor, Specialty, Consultation
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from users.models import (
+    Receptions, Patient, Doctor, Specialty, Consultation, ConsultationEvent, ConsultationStatusEvent, DoctorSchedule, QueueSequence,
+)
+from reception.pagination import keyset_page
+from reception.services import doctor_availability, next_queue_order
+from users.events import EventCursor, db_call
+from users.triage import TriageQueues
+from users.waiting_board import WaitingBoard
 
 Users = get_user_model()
 
@@ -163,3 +177,575 @@ class ReceptionViewsTest(TestCase):
             Consultation.objects.filter(description='Intento de consulta no autorizado').exists() # <-- CORRECCIÓN 2: Usar 'description'
         )
         self.assertEqual(Consultation.objects.count(), 0)
+
+
+class SlotAvailabilityTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.specialty = Specialty.objects.create(name='Clínica', description='Clínica médica')
+        cls.doctor_user = Users.objects.create_user(username='dr_slots', password='123', email='slots@test.com', is_doctor=True)
+        cls.doctor = Doctor.objects.create(user=cls.doctor_user, specialty=cls.specialty, bio='Bio')
+        cls.reception_user = Users.objects.create_user(username='rec_slots', password='123', email='rec_slots@test.com')
+        Receptions.objects.create(user=cls.reception_user)
+        # Lunes 2025-01-06, turno de 4 horas = 8 bloques
+        cls.fecha = date(2025, 1, 6)
+        DoctorSchedule.objects.create(
+            doctor=cls.doctor, day='LUNES', start_time=time(8, 0), end_time=time(12, 0), consultorio='a101'
+        )
+        cls.patient = Patient.objects.create(
+            first_name='Ana', last_name='Slots', phone='12345678',
+            identification_type='CI', identification_number='5550001',
+            gender='Female', date_of_birth=date(1990, 1, 1),
+            address_line='Calle 1', city='City', region='Region',
+            postal_code='1111', country='Paraguay', blood_type='O+',
+            emergency_contact_name='E', emergency_contact_relationship='Madre',
+            emergency_contact_phone='98765432'
+        )
+        cls.consulta = Consultation.objects.create(
+            description='Control', date=cls.fecha, time=time(9, 0), shift='MAÑANA',
+            consultorio='a101', doctor=cls.doctor, patient=cls.patient
+        )
+
+    def test_availability_uses_constant_queries(self):
+        """Los bloques se calculan con dos consultas sin importar la cantidad de bloques."""
+        with self.assertNumQueries(2):
+            bloques_por_horario = doctor_availability(self.doctor, self.fecha)
+        bloques = bloques_por_horario[0]['bloques']
+        self.assertEqual(len(bloques), 8)
+        ocupados = [b['inicio'] for b in bloques if b['ocupado']]
+        self.assertEqual(ocupados, ['09:00'])
+
+    def test_availability_excludes_edited_consultation(self):
+        bloques = doctor_availability(self.doctor, self.fecha, exclude_id=self.consulta.pk)[0]['bloques']
+        self.assertFalse(any(b['ocupado'] for b in bloques))
+
+    def test_schedule_modal_marks_occupied(self):
+        self.client.login(username='rec_slots', password='123')
+        url = reverse('reception:doctor_schedule_view', args=[self.doctor.pk])
+        response = self.client.get(url, {'fecha': self.fecha.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['doctor_no_atiende'])
+        self.assertContains(response, 'Ocupado', count=1)
+
+    def test_schedule_modal_day_without_schedule(self):
+        self.client.login(username='rec_slots', password='123')
+        url = reverse('reception:doctor_schedule_view', args=[self.doctor.pk])
+        response = self.client.get(url, {'fecha': (self.fecha + timedelta(days=1)).isoformat()})
+        self.assertTrue(response.context['doctor_no_atiende'])
+        self.assertEqual(response.context['dia_semana'], 'MARTES')
+
+
+class QueueOrderTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.specialty = Specialty.objects.create(name='Traumatología', description='Huesos')
+        cls.doctor_user = Users.objects.create_user(username='dr_cola', password='123', email='cola@test.com', is_doctor=True)
+        cls.doctor = Doctor.objects.create(user=cls.doctor_user, specialty=cls.specialty, bio='Bio')
+        cls.reception_user = Users.objects.create_user(username='rec_cola', password='123', email='rec_cola@test.com')
+        Receptions.objects.create(user=cls.reception_user)
+        cls.fecha = date(2025, 1, 6)  # Lunes
+        DoctorSchedule.objects.create(
+            doctor=cls.doctor, day='LUNES', start_time=time(8, 0), end_time=time(12, 0), consultorio='b202'
+        )
+        cls.patient = Patient.objects.create(
+            first_name='Luis', last_name='Cola', phone='12345678',
+            identification_type='CI', identification_number='5550002',
+            gender='Male', date_of_birth=date(1990, 1, 1),
+            address_line='Calle 1', city='City', region='Region',
+            postal_code='1111', country='Paraguay', blood_type='O+',
+            emergency_contact_name='E', emergency_contact_relationship='Madre',
+            emergency_contact_phone='98765432'
+        )
+
+    def test_sequence_increments_per_queue(self):
+        self.assertEqual(next_queue_order(self.doctor, self.fecha, 'MAÑANA'), 1)
+        self.assertEqual(next_queue_order(self.doctor, self.fecha, 'MAÑANA'), 2)
+        self.assertEqual(next_queue_order(self.doctor, self.fecha, 'TARDE'), 1)
+        self.assertEqual(QueueSequence.objects.count(), 2)
+
+    def test_sequence_starts_after_existing_orders(self):
+        """Si ya hay consultas sin contador, la secuencia continúa desde el mayor orden."""
+        Consultation.objects.create(
+            description='Previa', date=self.fecha, time=time(8, 0), shift='MAÑANA', order=4,
+            consultorio='b202', doctor=self.doctor, patient=self.patient
+        )
+        self.assertEqual(next_queue_order(self.doctor, self.fecha, 'MAÑANA'), 5)
+
+    def test_duplicate_order_rejected_by_database(self):
+        Consultation.objects.create(
+            description='Uno', date=self.fecha, time=time(8, 0), shift='MAÑANA', order=1,
+            consultorio='b202', doctor=self.doctor, patient=self.patient
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Consultation.objects.create(
+                description='Dos', date=self.fecha, time=time(8, 30), shift='MAÑANA', order=1,
+                consultorio='b202', doctor=self.doctor, patient=self.patient
+            )
+
+    def test_create_view_assigns_queue_order(self):
+        self.client.login(username='rec_cola', password='123')
+        url = reverse('reception:consultation_create') + f'?ci_query={self.patient.identification_number}'
+        for hora in ('08:00', '08:30'):
+            self.client.post(url, {
+                'especialidad': self.specialty.pk, 'doctor': self.doctor.pk,
+                'date': self.fecha.isoformat(), 'time': hora, 'shift': 'MAÑANA',
+                'status': 'EN ESPERA', 'description': 'Control',
+            })
+        ordenes = list(Consultation.objects.filter(doctor=self.doctor).order_by('order').values_list('order', flat=True))
+        self.assertEqual(ordenes, [1, 2])
+
+    def test_edit_and_delete_record_status_events(self):
+        consulta = Consultation.objects.create(
+            description='Control', date=self.fecha, time=time(8, 0), shift='MAÑANA', order=1,
+            consultorio='b202', doctor=self.doctor, patient=self.patient
+        )
+        self.client.login(username='rec_cola', password='123')
+        url = reverse('reception:consultation_edit', args=[consulta.pk])
+        datos = {
+            'especialidad': self.specialty.pk, 'doctor': self.doctor.pk, 'time': '08:00', 'shift': 'MAÑANA',
+            'status': 'EN ESPERA', 'description': 'Control',
+        }
+        # Cambiar solo la descripción no es reagendar
+        self.client.post(url, {**datos, 'date': self.fecha.isoformat(), 'description': 'Control anual'})
+        self.assertFalse(ConsultationStatusEvent.objects.filter(consultation_id=consulta.pk).exists())
+        # Pasarla al lunes siguiente sí
+        semana = self.fecha + timedelta(days=7)
+        self.client.post(url, {**datos, 'date': semana.isoformat()})
+        evento = ConsultationStatusEvent.objects.get(consultation_id=consulta.pk)
+        self.assertEqual((evento.event, evento.date, evento.actor), ('rescheduled', semana, self.reception_user))
+
+        self.client.post(reverse('reception:consultation_delete', args=[consulta.pk]))
+        self.assertFalse(Consultation.objects.filter(pk=consulta.pk).exists())
+        eventos = ConsultationStatusEvent.objects.filter(consultation_id=consulta.pk).order_by('id')
+        self.assertEqual(list(eventos.values_list('event', flat=True)), ['rescheduled', 'cancelled'])
+
+
+class KeysetPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.specialty = Specialty.objects.create(name='Dermatología', description='Piel')
+        cls.doctor_user = Users.objects.create_user(
+            username='dr_pag', password='123', email='pag@test.com', first_name='Pag', last_name='Doc', is_doctor=True
+        )
+        cls.doctor = Doctor.objects.create(user=cls.doctor_user, specialty=cls.specialty, bio='Bio')
+        cls.reception_user = Users.objects.create_user(username='rec_pag', password='123', email='rec_pag@test.com')
+        Receptions.objects.create(user=cls.reception_user)
+        cls.patient = Patient.objects.create(
+            first_name='Rosa', last_name='Pag', phone='12345678',
+            identification_type='CI', identification_number='5550003',
+            gender='Female', date_of_birth=date(1990, 1, 1),
+            address_line='Calle 1', city='City', region='Region',
+            postal_code='1111', country='Paraguay', blood_type='O+',
+            emergency_contact_name='E', emergency_contact_relationship='Madre',
+            emergency_contact_phone='98765432'
+        )
+        # 5 días x 2 turnos x 3 pacientes = 30 consultas
+        for dia in range(5):
+            for turno, hora_base in (('MAÑANA', 8), ('TARDE', 14)):
+                for orden in range(1, 4):
+                    Consultation.objects.create(
+                        description='Control', date=date(2025, 1, 6) + timedelta(days=dia),
+                        time=time(hora_base + orden, 0), shift=turno, order=orden,
+                        status='ATENDIDO' if dia % 2 else 'EN ESPERA',
+                        consultorio='c1', doctor=cls.doctor, patient=cls.patient
+                    )
+
+    def test_walk_forward_and_back(self):
+        ordering = ['date', 'shift', 'order', 'id']
+        esperado = list(Consultation.objects.order_by(*ordering).values_list('id', flat=True))
+        vistos, paginas, after = [], [], None
+        while True:
+            pagina = keyset_page(Consultation.objects.all(), ordering, after=after, page_size=7)
+            paginas.append(pagina)
+            vistos += [c.id for c in pagina['object_list']]
+            if not pagina['has_next']:
+                break
+            after = pagina['next_cursor']
+        self.assertEqual(vistos, esperado)
+        self.assertFalse(paginas[0]['has_previous'])
+
+        anterior = keyset_page(Consultation.objects.all(), ordering, before=paginas[2]['previous_cursor'], page_size=7)
+        self.assertEqual(
+            [c.id for c in anterior['object_list']],
+            [c.id for c in paginas[1]['object_list']]
+        )
+
+    def test_descending_history_order(self):
+        ordering = ['-date', '-time', '-id']
+        primera = keyset_page(Consultation.objects.all(), ordering, page_size=4)
+        segunda = keyset_page(Consultation.objects.all(), ordering, after=primera['next_cursor'], page_size=4)
+        esperado = list(Consultation.objects.order_by(*ordering).values_list('id', flat=True))[:8]
+        self.assertEqual([c.id for c in primera['object_list'] + segunda['object_list']], esperado)
+
+    def test_invalid_cursor_returns_first_page(self):
+        pagina = keyset_page(Consultation.objects.all(), ['date', 'shift', 'order', 'id'], after='basura', page_size=5)
+        self.assertEqual(len(pagina['object_list']), 5)
+        self.assertFalse(pagina['has_previous'])
+
+    @override_settings(DATATABLES_TOTAL_SECONDS=0)
+    def test_list_views_query_count_is_constant(self):
+        """El número de consultas SQL no depende de la cantidad de filas mostradas."""
+        self.client.login(username='rec_pag', password='123')
+        urls = [reverse('reception:consultation_list'), reverse('reception:consultation_history_data')]
+        self.client.get(urls[0])  # primera visita: carga las colas en memoria
+        con_filas = []
+        for url in urls:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, {'length': 50})
+            self.assertEqual(response.status_code, 200)
+            con_filas.append(len(queries))
+        Consultation.objects.all().delete()
+        for url, total in zip(urls, con_filas):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url, {'length': 50})
+            self.assertEqual(total, len(queries))
+
+
+@override_settings(DATATABLES_TOTAL_SECONDS=0)
+class DataTablesEndpointTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reception_user = Users.objects.create_user(username='rec_dt', password='123', email='rec_dt@test.com')
+        Receptions.objects.create(user=cls.reception_user)
+        cls.other_user = Users.objects.create_user(username='otro_dt', password='123', email='otro_dt@test.com')
+        for i, nombre in enumerate(['Carlos', 'Ana', 'Beatriz', 'Diego', 'Elena']):
+            Patient.objects.create(
+                first_name=nombre, last_name=f'Apellido{i}', phone='12345678',
+                identification_type='CI', identification_number=f'40000{i}',
+                gender='Other', date_of_birth=date(1990, 1, 1),
+                address_line='Calle 1', city='City', region='Region',
+                postal_code='1111', country='Paraguay', blood_type='O+',
+                emergency_contact_name='E', emergency_contact_relationship='Madre',
+                emergency_contact_phone='98765432'
+            )
+
+    def test_patient_page_order_and_search(self):
+        self.client.login(username='rec_dt', password='123')
+        url = reverse('reception:patient_list_data')
+        response = self.client.get(url, {
+            'draw': 3, 'start': 0, 'length': 2,
+            'order[0][column]': 0, 'order[0][dir]': 'desc', 'columns[0][data]': 'first_name',
+        })
+        data = response.json()
+        self.assertEqual(data['draw'], 3)
+        self.assertEqual(data['recordsTotal'], 5)
+        self.assertEqual(data['recordsFiltered'], 5)
+        self.assertEqual([p['first_name'] for p in data['data']], ['Elena', 'Diego'])
+        self.assertEqual(data['data'][0]['delete_url'], reverse('reception:patient_delete', args=[
+            Patient.objects.get(first_name='Elena').id
+        ]))
+
+        data = self.client.get(url, {'draw': 4, 'search[value]': 'beat'}).json()
+        self.assertEqual(data['recordsFiltered'], 1)
+        self.assertEqual(data['data'][0]['first_name'], 'Beatriz')
+
+    def test_unknown_order_column_is_ignored(self):
+        self.client.login(username='rec_dt', password='123')
+        data = self.client.get(reverse('reception:patient_list_data'), {
+            'order[0][column]': 0, 'columns[0][data]': 'medical_notes',
+        }).json()
+        self.assertEqual(data['data'][0]['first_name'], 'Ana')
+
+    def test_data_endpoints_require_reception(self):
+        self.client.login(username='otro_dt', password='123')
+        for nombre in ('patient_list_data', 'consultation_history_data'):
+            response = self.client.get(reverse(f'reception:{nombre}'))
+            self.assertEqual(response.status_code, 403)
+
+    def test_consultation_history_endpoint_returns_json(self):
+        self.client.login(username='rec_dt', password='123')
+        data = self.client.get(reverse('reception:consultation_history_data'), {'draw': 1}).json()
+        self.assertEqual(data['recordsTotal'], 0)
+        self.assertEqual(data['data'], [])
+
+    @override_settings(DATATABLES_TOTAL_SECONDS=60)
+    def test_history_total_is_cached(self):
+        """El total sin filtrar no se vuelve a contar en cada página"""
+        cache.delete('datatables_total:consultation_history')
+        self.client.login(username='rec_dt', password='123')
+        url = reverse('reception:consultation_history_data')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {'start': 10})
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql'].upper()])
+        cache.delete('datatables_total:consultation_history')
+
+
+class PatientSearchEndpointTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reception_user = Users.objects.create_user(username='rec_busq', password='123', email='rec_busq@test.com')
+        Receptions.objects.create(user=cls.reception_user)
+        Patient.objects.create(
+            first_name='Irma', last_name='Busqueda', phone='12345678',
+            identification_type='CI', identification_number='3216549',
+            gender='Female', date_of_birth=date(1990, 1, 1),
+            address_line='Calle 1', city='City', region='Region', postal_code='1111',
+            emergency_contact_name='E', emergency_contact_relationship='Madre',
+            emergency_contact_phone='98765432'
+        )
+
+    def test_typeahead_returns_matches(self):
+        self.client.login(username='rec_busq', password='123')
+        data = self.client.get(reverse('reception:patient_search'), {'q': '3216'}).json()
+        self.assertEqual(data['results'], [
+            {'id': Patient.objects.get().id, 'identification_number': '3216549', 'full_name': 'Irma Busqueda'}
+        ])
+        self.assertEqual(self.client.get(reverse('reception:patient_search'), {'q': '999'}).json()['results'], [])
+
+    def test_patient_list_passes_search_to_table(self):
+        self.client.login(username='rec_busq', password='123')
+        response = self.client.get(reverse('reception:patient_list'), {'ci': 'Irma & co'})
+        self.assertContains(response, 'data-search="Irma &amp; co"')
+        self.assertContains(response, f'data-source="{reverse("reception:patient_list_data")}"')
+
+
+def _sse_events(texto):
+    """Eventos 'consultation' de un cuerpo text/event-stream, como (id, datos)"""
+    eventos = []
+    for bloque in texto.split('\n\n'):
+        campos = dict(linea.split(': ', 1) for linea in bloque.splitlines() if ': ' in linea and not linea.startswith(':'))
+        if campos.get('event') == 'consultation':
+            eventos.append((int(campos['id']), json.loads(campos['data'])))
+    return eventos
+
+
+def _crear_datos_tablero(sufijo):
+    specialty = Specialty.objects.create(name=f'Clínica {sufijo}', description='General')
+    doctor_user = Users.objects.create_user(username=f'dr_sse_{sufijo}', password='123', email=f'dr_sse_{sufijo}@test.com', is_doctor=True)
+    doctor = Doctor.objects.create(user=doctor_user, specialty=specialty, bio='Bio')
+    reception_user = Users.objects.create_user(username=f'rec_sse_{sufijo}', password='123', email=f'rec_sse_{sufijo}@test.com')
+    Receptions.objects.create(user=reception_user)
+    patient = Patient.objects.create(
+        first_name='Eva', last_name='Tablero', phone='12345678',
+        identification_type='CI', identification_number=f'77{sufijo}',
+        gender='Female', date_of_birth=date(1990, 1, 1),
+        address_line='Calle 1', city='City', region='Region', postal_code='1111',
+        emergency_contact_name='E', emergency_contact_relationship='Madre',
+        emergency_contact_phone='98765432'
+    )
+    return doctor, patient, reception_user
+
+
+class ConsultationEventsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, cls.patient, cls.reception_user = _crear_datos_tablero('1')
+
+    def _crear_consulta(self, hora=8):
+        return Consultation.objects.create(
+            description='Control', date=date(2025, 1, 6), time=time(hora, 0), shift='MAÑANA', order=hora,
+            consultorio='a101', doctor=self.doctor, patient=self.patient
+        )
+
+    def test_changes_are_recorded_as_events(self):
+        consulta = self._crear_consulta()
+        consulta.status = 'CANCELADA'
+        consulta.save()
+        pk = consulta.pk
+        consulta.delete()
+        eventos = list(ConsultationEvent.objects.order_by('id').values_list('consultation_id', 'action'))
+        self.assertEqual(eventos, [(pk, 'created'), (pk, 'updated'), (pk, 'deleted')])
+        creado = ConsultationEvent.objects.order_by('id').first().data
+        self.assertEqual(creado['patient'], 'Eva Tablero')
+        self.assertEqual(creado['edit_url'], reverse('reception:consultation_edit', args=[pk]))
+
+    def test_wsgi_batch_resumes_from_last_event_id(self):
+        self.client.login(username='rec_sse_1', password='123')
+        url = reverse('reception:consultation_events')
+        self._crear_consulta()
+        cursor = ConsultationEvent.objects.get().id
+        segunda = self._crear_consulta(hora=9)
+
+        with self.settings(CONSULTATION_EVENTS_REORDER_SECONDS=0):
+            response = self.client.get(url, HTTP_LAST_EVENT_ID=str(cursor))
+            eventos = _sse_events(b''.join(response.streaming_content).decode())
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertEqual([(d['id'], d['action']) for _, d in eventos], [(segunda.pk, 'created')])
+
+        # Dentro de la ventana se repiten los eventos recientes detrás del cursor, con su event_id
+        repetidos = _sse_events(b''.join(self.client.get(url, HTTP_LAST_EVENT_ID=str(cursor)).streaming_content).decode())
+        self.assertEqual([d['event_id'] for _, d in repetidos], [cursor, eventos[0][1]['event_id']])
+
+        # Sin cursor solo se fija el Last-Event-ID actual
+        cuerpo = b''.join(self.client.get(url).streaming_content).decode()
+        self.assertEqual(_sse_events(cuerpo), [])
+        self.assertIn(f'id: {eventos[-1][0]}', cuerpo)
+
+    def test_cursor_delivers_late_commits_once(self):
+        primera, segunda, tercera = (self._crear_consulta(hora) for hora in (8, 9, 10))
+        ids = list(ConsultationEvent.objects.order_by('id').values_list('id', flat=True))
+        # El evento de la segunda todavía no confirmó: el cursor lee la primera y la tercera
+        atrasado = ConsultationEvent.objects.get(id=ids[1])
+        atrasado.delete()
+        cursor = EventCursor(ids[0] - 1)
+        self.assertEqual([e['id'] for e in cursor.fetch()], [ids[0], ids[2]])
+        self.assertEqual(cursor.fetch(), [])
+        # Confirma con un id menor al último leído: la lectura siguiente lo trae una sola vez
+        atrasado.pk = ids[1]
+        atrasado.save(force_insert=True)
+        self.assertEqual([e['consultation_id'] for e in cursor.fetch()], [segunda.pk])
+        self.assertEqual(cursor.fetch(), [])
+        self.assertEqual(cursor.last_id, ids[2])
+        self.assertFalse(cursor.mark(ConsultationEvent.objects.filter(id=ids[1]).values('id', 'created_at').get()))
+
+    def test_cursor_settles_outside_window(self):
+        self._crear_consulta()
+        evento = ConsultationEvent.objects.get()
+        cursor = EventCursor.current()
+        self.assertEqual((cursor.last_id, cursor.settled_id), (evento.id, 0))
+        with self.settings(CONSULTATION_EVENTS_REORDER_SECONDS=0):
+            self.assertEqual(cursor.fetch(), [])
+        self.assertEqual(cursor.settled_id, evento.id)
+
+    def test_db_call_closes_connections_after_query(self):
+        with mock.patch('users.events.close_old_connections') as cerrar:
+            self.assertEqual(async_to_sync(db_call)(len, [1, 2]), 2)
+        self.assertEqual(cerrar.call_count, 2)
+
+    def test_requires_reception_role(self):
+        self.client.login(username='dr_sse_1', password='123')
+        self.assertEqual(self.client.get(reverse('reception:consultation_events')).status_code, 403)
+
+    def test_list_page_carries_event_cursor(self):
+        self._crear_consulta()
+        self.client.login(username='rec_sse_1', password='123')
+        response = self.client.get(reverse('reception:consultation_list'))
+        self.assertEqual(response.context['last_event_id'], ConsultationEvent.objects.get().id)
+        self.assertContains(response, 'data-queue-board')
+
+
+@override_settings(CONSULTATION_EVENTS_POLL_SECONDS=0.05, SSE_STREAM_SECONDS=1, SSE_KEEPALIVE_SECONDS=0.2)
+class ConsultationEventStreamTest(TransactionTestCase):
+    """Con ASGI el stream queda abierto y entrega las consultas creadas después de conectarse"""
+
+    async def test_stream_delivers_new_events(self):
+        doctor, patient, reception_user = await sync_to_async(_crear_datos_tablero)('2')
+        await self.async_client.aforce_login(reception_user)
+        response = await self.async_client.get(reverse('reception:consultation_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        partes = []
+        async for parte in response.streaming_content:
+            partes.append(parte.decode() if isinstance(parte, bytes) else parte)
+            if len(partes) == 1:
+                # Conectado: se crea una consulta y debe llegar por el stream
+                consulta = await sync_to_async(Consultation.objects.create)(
+                    description='Control', date=date(2025, 1, 6), time=time(9, 0), shift='MAÑANA', order=1,
+                    consultorio='a101', doctor=doctor, patient=patient
+                )
+            if _sse_events(''.join(partes)):
+                break
+        eventos = _sse_events(''.join(partes))
+        self.assertEqual([(d['id'], d['action']) for _, d in eventos], [(consulta.pk, 'created')])
+
+
+@override_settings(CONSULTATION_EVENTS_POLL_SECONDS=0, CONSULTATION_EVENTS_REORDER_SECONDS=0)
+class WaitingBoardTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, cls.patient, _ = _crear_datos_tablero('3')
+        hoy = timezone.localdate()
+        cls.consultas = [
+            Consultation.objects.create(
+                description='Control', date=hoy, time=time(hora, 0), shift=shift, order=order,
+                consultorio='c1', doctor=cls.doctor, patient=cls.patient
+            )
+            for hora, shift, order in [(8, 'MAÑANA', 1), (9, 'MAÑANA', 2), (10, 'MAÑANA', 3), (14, 'TARDE', 1)]
+        ]
+
+    def setUp(self):
+        self.board = WaitingBoard()
+
+    def _turno(self, snapshot, shift):
+        return next(t for t in snapshot['shifts'] if t['shift'] == shift)
+
+    def test_full_snapshot(self):
+        snapshot = self.board.snapshot('c1')
+        self.assertTrue(snapshot['full'])
+        self.assertEqual(
+            self._turno(snapshot, 'MAÑANA'), {
+                'shift': 'MAÑANA', 'shift_display': 'Mañana', 'current': None, 'next': [1, 2, 3], 'waiting': 3,
+            }
+        )
+        self.assertEqual(self._turno(snapshot, 'NOCHE')['current'], None)
+        self.assertEqual(self.board.snapshot('c9')['shifts'][0]['waiting'], 0)
+
+    def test_status_change_updates_only_changed_shift(self):
+        version = self.board.snapshot('c1')['version']
+        self.client.login(username='dr_sse_3', password='123')
+        self.client.post(
+            reverse('change_consultation_status', args=[self.consultas[0].pk]), {'nuevo_estado': 'EN CONSULTA'}
+        )
+        with CaptureQueriesContext(connection) as queries:
+            snapshot = self.board.snapshot('c1', since=version)
+        # Se leen los eventos nuevos, no la tabla de consultas
+        self.assertFalse(any('"users_consultation"' in q['sql'] for q in queries.captured_queries))
+        self.assertFalse(snapshot['full'])
+        self.assertEqual([t['shift'] for t in snapshot['shifts']], ['MAÑANA'])
+        self.assertEqual(self._turno(snapshot, 'MAÑANA')['current'], 1)
+        self.assertEqual(self._turno(snapshot, 'MAÑANA')['next'], [2, 3])
+        self.assertEqual(self.board.snapshot('c1', since=snapshot['version'])['shifts'], [])
+
+    def test_moved_and_deleted_consultations(self):
+        version = self.board.snapshot('c1')['version']
+        movida = self.consultas[3]
+        movida.consultorio = 'c2'
+        movida.save()
+        self.consultas[2].delete()
+        snapshot = self.board.snapshot('c1', since=version)
+        self.assertEqual(self._turno(snapshot, 'MAÑANA')['next'], [1, 2])
+        self.assertEqual(self._turno(snapshot, 'TARDE')['waiting'], 0)
+        self.assertEqual(self._turno(self.board.snapshot('c2'), 'TARDE')['next'], [1])
+
+    @override_settings(CONSULTATION_EVENTS_POLL_SECONDS=60)
+    def test_polls_within_interval_do_not_query(self):
+        version = self.board.snapshot('c1')['version']
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                self.board.snapshot('c1', since=version)
+
+    def test_late_event_reaches_clients(self):
+        with self.settings(CONSULTATION_EVENTS_REORDER_SECONDS=60):
+            self.board = WaitingBoard()
+            self.board.snapshot('c1')
+            self.client.login(username='dr_sse_3', password='123')
+            self.client.post(
+                reverse('change_consultation_status', args=[self.consultas[3].pk]), {'nuevo_estado': 'EN CONSULTA'}
+            )
+            # El evento de la tarde todavía no confirmó cuando el tablero lee el de la mañana
+            atrasado = ConsultationEvent.objects.latest('id')
+            atrasado_id = atrasado.id
+            atrasado.delete()
+            self.client.post(
+                reverse('change_consultation_status', args=[self.consultas[0].pk]), {'nuevo_estado': 'EN CONSULTA'}
+            )
+            version = self.board.snapshot('c1')['version']
+            # La versión no pasa de los eventos que todavía pueden llegar atrasados
+            self.assertLess(version, atrasado_id)
+            atrasado.pk = atrasado_id
+            atrasado.save(force_insert=True)
+            snapshot = self.board.snapshot('c1', since=version)
+        self.assertEqual(self._turno(snapshot, 'TARDE')['current'], 1)
+        self.assertEqual(self._turno(snapshot, 'MAÑANA')['current'], 1)
+
+    def test_public_endpoint(self):
+        with mock.patch('reception.views.waiting_board', self.board):
+            data = self.client.get(reverse('reception:waiting_board_data', args=['c1'])).json()
+            self.assertEqual(self._turno(data, 'TARDE')['next'], [1])
+            response = self.client.get(
+                reverse('reception:waiting_board_data', args=['c1']), {'version': data['version']}
+            )
+        self.assertEqual(response.json()['shifts'], [])
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        self.assertContains(self.client.get(reverse('reception:waiting_board', args=['c1'])), 'data-waiting-board')
+
+    def test_agenda_shows_triage_position(self):
+        self.client.login(username='rec_sse_3', password='123')
+        with mock.patch('reception.views.triage_queues', TriageQueues()):
+            response = self.client.get(reverse('reception:consultation_list'))
+        posiciones = {c.pk: c.triage_position for c in response.context['consultations']}
+        self.assertEqual(posiciones[self.consultas[0].pk], 1)
+        self.assertEqual(posiciones[self.consultas[2].pk], 3)
+        self.assertEqual(posiciones[self.consultas[3].pk], 1)
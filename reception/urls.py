@@ -15,6 +15,16 @@ urlpatterns = [
     path('pacientes/<int:pk>/editar/', views.patient_edit_view, name='patient_edit'),
     path('pacientes/<int:pk>/eliminar/', views.patient_delete_view, name='patient_delete'),
     path('paciente/<int:pk>/', views.patient_detail, name='patient_detail'),
+
+    # Datos para DataTables (server-side)
+    path('pacientes/datos/', views.patient_list_data_view, name='patient_list_data'),
+    path('pacientes/buscar/', views.patient_search_view, name='patient_search'),
+    path('consultas/historial/datos/', views.consultation_history_data_view, name='consultation_history_data'),
+    # Cambios de consultas en tiempo real (Server-Sent Events)
+    path('consultas/eventos/', views.consultation_events_view, name='consultation_events'),
+    # Tablero público de la sala de espera por consultorio
+    path('sala-espera/<str:consultorio>/', views.waiting_board_view, name='waiting_board'),
+    path('sala-espera/<str:consultorio>/datos/', views.waiting_board_data_view, name='waiting_board_data'),
     
     
 
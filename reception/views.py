@@ -3,47 +3,113 @@ from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from users.models import Consultation, Patient, Doctor, Specialty, DoctorSchedule
+from users.search import patient_search_q, search_patients
+from users.counters import reception_dashboard_counts, record_total
+from users.datatables import cached_total, datatables_params, datatables_response
+from users.events import latest_event_id
+from users.triage import triage_queues
+from users.wait_times import record_status_change, record_status_event
+from users.waiting_board import waiting_board
+from users.roles import role_required
+from users.db_router import use_replica
 from .forms import PatientForm, ConsultationForm
-from datetime import datetime, timedelta, date, time
-from django.http import JsonResponse
+from .pagination import keyset_page
+from .events import consultation_event_batch, consultation_event_stream
+from .services import BookingError, book_consultation, doctor_availability, weekday_name
+from datetime import datetime, date
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import formats, timezone
+from django.db import transaction
 
 # Dashboard principal
 @login_required
+@role_required('reception')
+@use_replica
 def reception_dashboard_view(request):
-    if not hasattr(request.user, 'receptions'):
-        messages.error(request, 'No tienes permisos para acceder a esta sección.')
-        return redirect('dashboard')
-    pacientes_count = Patient.objects.count()
-    doctores_count = Doctor.objects.count()
-    consultas_count = Consultation.objects.count()
-    consultas_hoy = Consultation.objects.filter(date__exact=date.today()).count()
+    # Conteos leídos de los contadores desnormalizados (users/counters.py)
+    conteos = reception_dashboard_counts(date.today())
 
     return render(request, 'reception/reception_dashboard.html', {
         'user': request.user,
-        'pacientes_count': pacientes_count,
-        'doctores_count': doctores_count,
-        'consultas_count': consultas_count,
-        'consultas_hoy': consultas_hoy,
+        'pacientes_count': conteos['pacientes_count'],
+        'doctores_count': conteos['doctores_count'],
+        'consultas_count': conteos['consultas_count'],
+        'consultas_hoy': conteos['consultas_hoy'],
     })
 
 # Listar consultas
 @login_required
+@role_required('reception')
 def consultation_list_view(request):
-    if not hasattr(request.user, 'receptions'):
-        messages.error(request, 'No tienes permisos para acceder a esta sección.')
-        return redirect('dashboard')
-    consultas = Consultation.objects.exclude(status="ATENDIDO").order_by('date', 'shift', 'order')
+    consultas = Consultation.objects.exclude(status="ATENDIDO").select_related(
+        'patient', 'doctor__user', 'doctor__specialty'
+    )
+    pagina = keyset_page(
+        consultas, ['date', 'shift', 'order', 'id'],
+        after=request.GET.get('after'), before=request.GET.get('before'),
+    )
+    # Posición en la cola de triage de su doctor (solo consultas en espera de hoy)
+    hoy = timezone.localdate()
+    posiciones = triage_queues.positions({
+        (c.doctor_id, c.shift) for c in pagina['object_list'] if c.date == hoy and c.status == 'EN ESPERA'
+    })
+    for consulta in pagina['object_list']:
+        consulta.triage_position = posiciones.get(consulta.pk)
     return render(request, 'reception/manage_medical_shifts.html', {
-        'consultations': consultas,
+        'consultations': pagina['object_list'],
+        'page': pagina,
         'user': request.user,
+        # Cursor del tablero en tiempo real: los cambios posteriores llegan por consultation_events
+        'last_event_id': latest_event_id(),
     })
 
+
+# Tablero público de la sala de espera (pantallas de TV): solo números de orden, sin datos de pacientes
+def waiting_board_view(request, consultorio):
+    return render(request, 'reception/waiting_board.html', {
+        'consultorio': consultorio,
+        'poll_ms': getattr(settings, 'WAITING_BOARD_POLL_MS', 5000),
+    })
+
+
+def waiting_board_data_view(request, consultorio):
+    """Estado del tablero; con ?version= solo los turnos que cambiaron desde esa versión"""
+    try:
+        since = int(request.GET['version'])
+    except (KeyError, ValueError):
+        since = None
+    response = JsonResponse(waiting_board.snapshot(consultorio, since))
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+# Cambios de consultas en tiempo real (Server-Sent Events) para el tablero de la agenda
+@login_required
+@role_required('reception', ajax=True)
+def consultation_events_view(request):
+    # El navegador envía Last-Event-ID al reconectarse; la primera vez se usa el cursor de la página
+    cursor = request.headers.get('Last-Event-ID') or request.GET.get('last_id')
+    try:
+        last_id = int(cursor) if cursor else None
+    except ValueError:
+        last_id = None
+    if isinstance(request, ASGIRequest):
+        stream = consultation_event_stream(last_id)
+    else:
+        stream = consultation_event_batch(last_id)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Sin buffer en nginx, para que cada evento salga apenas ocurre
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 # Registrar paciente
 @login_required
+@role_required('reception')
 def patient_create_view(request):
-    if not hasattr(request.user, 'receptions'):
-        messages.error(request, 'No tienes permisos para acceder a esta sección.')
-        return redirect('dashboard')
     if request.method == 'POST':
         form = PatientForm(request.POST)
         if form.is_valid():
@@ -59,6 +125,7 @@ def patient_create_view(request):
 
 # Registrar consulta
 @login_required
+@role_required('reception')
 def consultation_create_view(request):
     especialidades = Specialty.objects.all()
     especialidad_id = request.POST.get('especialidad') or request.GET.get('especialidad')
@@ -68,10 +135,6 @@ def consultation_create_view(request):
     if especialidad_id:
         doctores = Doctor.objects.filter(specialty_id=especialidad_id)
 
-    if not hasattr(request.user, 'receptions'):
-        messages.error(request, 'No tienes permisos para acceder a esta sección.')
-        return redirect('dashboard')
-
     ci_query = request.GET.get('ci_query', '')
     paciente_encontrado = None
     if ci_query:
@@ -93,35 +156,16 @@ def consultation_create_view(request):
                 consulta.shift = turno_auto
 
 
-            # Asignar consultorio automáticamente según el horario del doctor
-            day_name = consulta.date.strftime('%A').upper()
-            day_map = {
-                'MONDAY': 'LUNES', 'TUESDAY': 'MARTES', 'WEDNESDAY': 'MIERCOLES',
-                'THURSDAY': 'JUEVES', 'FRIDAY': 'VIERNES', 'SATURDAY': 'SABADO', 'SUNDAY': 'DOMINGO'
-            }
-            day = day_map.get(day_name, day_name)
-            horario = DoctorSchedule.objects.filter(
-                doctor=consulta.doctor,
-                day=day,
-                start_time__lte=consulta.time,
-                end_time__gte=consulta.time
-            ).first()
-            if not horario:
-                messages.error(request, "El doctor no está disponible en ese horario.")
-            else:
-                consulta.consultorio = horario.consultorio
-                mismo_turno = Consultation.objects.filter(
-                    date=consulta.date,
-                    shift=consulta.shift,
-                    doctor=consulta.doctor
-                ).count()
-                consulta.order = mismo_turno + 1
-                consulta.save()
+            # Consultorio, disponibilidad y orden se resuelven con la agenda del doctor bloqueada
+            try:
+                with transaction.atomic():
+                    book_consultation(consulta)
+                    record_status_event(consulta, 'created', request.user)
                 messages.success(request, 'Consulta agendada correctamente.')
                 return redirect('reception:consultation_list')
-            
-            if horario:
-             consultorio_asignado = horario.consultorio
+            except BookingError as e:
+                messages.error(request, str(e))
+            consultorio_asignado = consulta.consultorio or None
 
         elif not paciente_encontrado:
             pass
@@ -143,11 +187,8 @@ def consultation_create_view(request):
 
 # Editar consulta ya agendada
 @login_required
+@role_required('reception')
 def consultation_edit_view(request, pk):
-    if not hasattr(request.user, 'receptions'):
-        messages.error(request, 'No tienes permisos para acceder a esta sección.')
-        return redirect('dashboard')
-
     consulta = get_object_or_404(Consultation, pk=pk)
     especialidades = Specialty.objects.all()
 
@@ -169,13 +210,25 @@ def consultation_edit_view(request, pk):
     ci_query = consulta.patient.identification_number if consulta.patient else ''
     paciente_encontrado = consulta.patient if consulta.patient else None
 
+    # Cola original para detectar si la consulta se mueve a otra cola
+    cola_original = (consulta.doctor_id, consulta.date, consulta.shift)
+    estado_original = consulta.status
+
     if request.method == 'POST':
         form = ConsultationForm(request.POST, instance=consulta)
         form.fields['doctor'].queryset = doctores
         if form.is_valid():
-            form.save()
-            messages.success(request, 'Consulta actualizada correctamente.')
-            return redirect('reception:consultation_list')
+            consulta = form.save(commit=False)
+            try:
+                with transaction.atomic():
+                    book_consultation(consulta, cola_original=cola_original, asignar_consultorio=False)
+                    if consulta.date != cola_original[1]:
+                        record_status_event(consulta, 'rescheduled', request.user)
+                    record_status_change(consulta, estado_original, request.user)
+                messages.success(request, 'Consulta actualizada correctamente.')
+                return redirect('reception:consultation_list')
+            except BookingError as e:
+                messages.error(request, str(e))
     else:
         form = ConsultationForm(instance=consulta)
         form.fields['doctor'].queryset = doctores
@@ -191,13 +244,15 @@ def consultation_edit_view(request, pk):
 
 # Eliminar consulta
 @login_required
+@role_required('reception')
 def consultation_delete_view(request, pk):
-    if not hasattr(request.user, 'receptions'):
-        messages.error(request, 'No tienes permisos para acceder a esta sección.')
-        return redirect('dashboard')
     consulta = get_object_or_404(Consultation, pk=pk)
     if request.method == 'POST':
-        consulta.delete()
+        # La baja queda en el registro de estados, que sobrevive a la consulta
+        with transaction.atomic():
+            if consulta.status != 'CANCELADA':
+                record_status_event(consulta, 'cancelled', request.user)
+            consulta.delete()
         messages.success(request, 'Consulta eliminada correctamente.')
         return redirect('reception:consultation_list')
     return render(request, 'reception/consultation_confirm_delete.html', {
@@ -206,12 +261,9 @@ def consultation_delete_view(request, pk):
     })
 
 @login_required
+@role_required('reception')
 def reception_profile_view(request):
     """Vista del perfil"""
-    if not hasattr(request.user, 'receptions'):
-        messages.error(request, 'No tienes permisos para acceder a esta sección.')
-        return redirect('dashboard')
-    
     updated_profile_successfully = False
     updated_password_successfully = False
     
@@ -265,42 +317,82 @@ def reception_profile_view(request):
     return render(request, 'reception/profile.html', context)
 
 
+# Define los campos permitidos para ordenar el listado de pacientes
+allowed_sorts = {
+    'first_name': 'first_name',
+    'first_name_asc': '-first_name',
+    'last_name': 'last_name',
+    'last_name_asc': '-last_name',
+    'ci_asc': 'identification_number',
+    'ci_desc': '-identification_number',
+}
+
+
+# Columna de DataTables -> (orden ascendente, orden descendente) en allowed_sorts
+patient_column_sorts = {
+    'first_name': ('first_name', 'first_name_asc'),
+    'last_name': ('last_name', 'last_name_asc'),
+    'identification_number': ('ci_asc', 'ci_desc'),
+}
+
+# Columnas ordenables del historial de consultas
+consultation_column_sorts = {
+    'order': 'order',
+    'shift': 'shift',
+    'date': 'date',
+    'time': 'time',
+    'patient': 'patient__last_name',
+    'doctor': 'doctor__user__last_name',
+}
+
+
 @login_required
+@role_required('reception')
 def patient_list_view(request):
-    if not hasattr(request.user, 'receptions'):
-        messages.error(request, 'No tienes permisos para acceder a esta sección.')
-        return redirect('dashboard')
-    query = request.GET.get('ci', '')
-    sort = request.GET.get('sort', 'first_name')  # valor por defecto
-
-    # Define los campos permitidos para ordenar
-    allowed_sorts = {
-        'first_name': 'first_name',
-        'first_name_asc': '-first_name',
-        'last_name': 'last_name',
-        'last_name_asc': '-last_name',
-        'ci_asc': 'identification_number',
-        'ci_desc': '-identification_number',
-    }
-    sort_field = allowed_sorts.get(sort, 'first_name')
-
-    if query:
-        pacientes = Patient.objects.filter(identification_number__icontains=query).order_by(sort_field)
-    else:
-        pacientes = Patient.objects.all().order_by(sort_field)
+    # La tabla pide cada página a patient_list_data_view (DataTables del lado del servidor)
     return render(request, 'reception/patient_list.html', {
-        'patients': pacientes,
         'user': request.user,
-        'ci_query': query,
-        'sort': sort,
+        'ci_query': request.GET.get('ci', ''),
     })
 
 
 @login_required
+@role_required('reception', ajax=True)
+def patient_list_data_view(request):
+    params = datatables_params(request)
+    pacientes = Patient.objects.all()
+    # El total sale del contador de pacientes, sin COUNT(*) en cada página
+    total = record_total('patient')
+    if params['search']:
+        pacientes = pacientes.filter(patient_search_q(params['search']))
+        filtrado = pacientes.count()
+    else:
+        filtrado = total
+
+    sort = 'first_name'
+    if params['order_column'] in patient_column_sorts:
+        asc, desc = patient_column_sorts[params['order_column']]
+        sort = desc if params['order_dir'] == 'desc' else asc
+    pacientes = pacientes.order_by(allowed_sorts[sort], 'id')
+
+    return datatables_response(params, pacientes, total, filtrado, lambda patient: {
+        'id': patient.id,
+        'first_name': patient.first_name,
+        'last_name': patient.last_name,
+        'full_name': patient.full_name,
+        'identification_number': patient.identification_number,
+        'email': patient.email,
+        'phone': patient.phone,
+        'date_of_birth': formats.localize(patient.date_of_birth),
+        'detail_url': reverse('reception:patient_detail', args=[patient.id]),
+        'edit_url': reverse('reception:patient_edit', args=[patient.id]),
+        'delete_url': reverse('reception:patient_delete', args=[patient.id]),
+    })
+
+
+@login_required
+@role_required('reception')
 def patient_edit_view(request, pk):
-    if not hasattr(request.user, 'receptions'):
-        messages.error(request, 'No tienes permisos para acceder a esta sección.')
-        return redirect('dashboard')
     paciente = get_object_or_404(Patient, pk=pk)
     if request.method == 'POST':
         form = PatientForm(request.POST, instance=paciente)
@@ -318,10 +410,8 @@ def patient_edit_view(request, pk):
 
 # Eliminar paciente
 @login_required
+@role_required('reception')
 def patient_delete_view(request, pk):
-    if not hasattr(request.user, 'receptions'):
-        messages.error(request, 'No tienes permisos para acceder a esta sección.')
-        return redirect('dashboard')
     paciente = get_object_or_404(Patient, pk=pk)
     if request.method == 'POST':
         paciente.delete()
@@ -335,24 +425,50 @@ def patient_delete_view(request, pk):
 
 # Historial de consultas realizadas
 @login_required
+@role_required('reception')
 def consultation_history_view(request):
-    if not hasattr(request.user, 'receptions'):
-        messages.error(request, 'No tienes permisos para acceder a esta sección.')
-        return redirect('dashboard')
-    consultas = Consultation.objects.filter(status="ATENDIDO").order_by('-date', '-time')
+    # La tabla pide cada página a consultation_history_data_view
     return render(request, 'reception/consultation_history.html', {
-        'consultations': consultas,
         'user': request.user,
     })
 
 
+@login_required
+@role_required('reception', ajax=True)
+@use_replica
+def consultation_history_data_view(request):
+    params = datatables_params(request)
+    consultas = Consultation.objects.filter(status="ATENDIDO")
+    total = cached_total('consultation_history', consultas)
+    if params['search']:
+        consultas = consultas.filter(patient_search_q(params['search'], prefix='patient__'))
+        filtrado = consultas.count()
+    else:
+        filtrado = total
+
+    orden = ['-date', '-time', '-id']
+    campo = consultation_column_sorts.get(params['order_column'])
+    if campo:
+        orden = [f'-{campo}' if params['order_dir'] == 'desc' else campo, *orden]
+    consultas = consultas.select_related('patient', 'doctor__user').order_by(*orden)
+
+    return datatables_response(params, consultas, total, filtrado, lambda consulta: {
+        'id': consulta.id,
+        'order': consulta.order,
+        'shift': consulta.get_shift_display(),
+        'date': formats.localize(consulta.date),
+        'time': formats.localize(consulta.time),
+        'patient': consulta.patient.full_name,
+        'doctor': str(consulta.doctor) if consulta.doctor_id else '',
+        'status': consulta.get_status_display(),
+    })
+
+
 
 
 @login_required
 def doctor_schedule_view(request, doctor_id):
     doctor = get_object_or_404(Doctor, pk=doctor_id)
-    horarios = DoctorSchedule.objects.filter(doctor=doctor).order_by('day', 'start_time')
-    bloques_por_horario = []
 
     # Obtén la fecha seleccionada del parámetro GET
     fecha_str = request.GET.get('fecha')
@@ -367,71 +483,32 @@ def doctor_schedule_view(request, doctor_id):
     # Excluir la propia consulta al editar para no marcar su turno como ocupado
     consulta_id = request.GET.get('consulta_id')
 
-
-
-    # 1. Obtener el nombre del día en español (según tu modelo)
-    dias_map = {
-        0: 'LUNES', 1: 'MARTES', 2: 'MIERCOLES', 3: 'JUEVES',
-        4: 'VIERNES', 5: 'SABADO', 6: 'DOMINGO'
-    }
-    dia_semana = dias_map[fecha.weekday()]
-
-    # 2. Filtrar horarios solo para ese día
-    horarios = DoctorSchedule.objects.filter(doctor=doctor, day=dia_semana).order_by('start_time')
-    bloques_por_horario = []
-        
-    # Duración de cada consulta (en minutos)
-    duracion_consulta = 30
-
-    for horario in horarios:
-        # Convierte start_time y end_time a datetime para operar
-        inicio = datetime.combine(datetime.today(), horario.start_time)
-        fin = datetime.combine(datetime.today(), horario.end_time)
-        bloques = []
-        actual = inicio
-        while actual + timedelta(minutes=duracion_consulta) <= fin:
-            bloque_inicio = actual.time()
-            bloque_fin = (actual + timedelta(minutes=duracion_consulta)).time()
-            # Verifica si ya hay una consulta agendada en ese bloque
-            #consulta_existente = Consultation.objects.filter(
-            #    doctor=doctor,
-            #    date=fecha,   
-            #    time=bloque_inicio,
-            #    consultorio=horario.consultorio
-           # ).exists()
-           # if consulta_id:
-           #    consulta_qs = consulta_qs.exclude(pk=consulta_id)
-            consulta_qs = Consultation.objects.filter( 
-               doctor=doctor,
-               date=fecha,
-               time=bloque_inicio,
-               consultorio=horario.consultorio
-               )
-            if consulta_id:
-               consulta_qs = consulta_qs.exclude(pk=consulta_id)
-            consulta_existente = consulta_qs.exists()
-            bloques.append({
-                'dia': horario.day,
-                'inicio': bloque_inicio.strftime('%H:%M'),
-                'fin': bloque_fin.strftime('%H:%M'),
-                'consultorio': horario.consultorio,
-                'ocupado': consulta_existente
-            })
-            actual += timedelta(minutes=duracion_consulta)
-        bloques_por_horario.append({
-            'horario': horario,
-            'bloques': bloques
-        })     
-
-    doctor_no_atiende = not horarios.exists()
+    # Horarios del día con sus bloques de 30 minutos (ocupados en una sola consulta)
+    bloques_por_horario = doctor_availability(doctor, fecha, exclude_id=consulta_id)
 
     return render(request, 'reception/doctor_schedule_modal.html', {
         'doctor': doctor,
         'bloques_por_horario': bloques_por_horario,
-        'doctor_no_atiende': doctor_no_atiende,
-        'dia_semana': dia_semana,
+        'doctor_no_atiende': not bloques_por_horario,
+        'dia_semana': weekday_name(fecha),
     })
 
+
+# Sugerencias de pacientes por CI o nombre (typeahead)
+@login_required
+@role_required('reception', ajax=True)
+def patient_search_view(request):
+    resultados = search_patients(request.GET.get('q', ''))
+    return JsonResponse({'results': [
+        {
+            'id': paciente['id'],
+            'identification_number': paciente['identification_number'],
+            'full_name': f"{paciente['first_name']} {paciente['last_name']}",
+        }
+        for paciente in resultados
+    ]})
+
+
 @login_required
 def patient_detail(request,pk):
     patient = get_object_or_404(Patient, pk=pk)
@@ -0,0 +1,35 @@
+// Botón "Llamar siguiente" de la lista de pacientes del doctor: toma el siguiente paciente
+// de la cola en un solo request y abre su consulta.
+(function () {
+    const form = document.querySelector('[data-call-next]');
+    if (!form) {
+        return;
+    }
+    const message = form.querySelector('[data-call-next-message]');
+    const button = form.querySelector('button');
+
+    form.addEventListener('submit', event => {
+        event.preventDefault();
+        button.disabled = true;
+        fetch(form.action, {
+            method: 'POST',
+            headers: { 'X-CSRFToken': form.querySelector('[name=csrfmiddlewaretoken]').value },
+        })
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) {
+                    throw new Error(data.error);
+                }
+                if (data.consultation) {
+                    window.location.href = data.consultation.attend_url;
+                    return;
+                }
+                message.textContent = 'No hay pacientes en espera en este turno.';
+                button.disabled = false;
+            })
+            .catch(error => {
+                message.textContent = `Error al llamar al siguiente paciente: ${error.message}`;
+                button.disabled = false;
+            });
+    });
+})();
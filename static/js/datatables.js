@@ -0,0 +1,43 @@
+// Tablas con DataTables del lado del servidor: cada página, orden y búsqueda se pide a la URL de
+// data-source de la tabla, que responde draw, recordsTotal, recordsFiltered y data.
+// Las columnas salen de los <th>: data-data es el campo de la fila, data-orderable="false" quita el
+// orden y data-render nombra una función de `renderers` que arma la celda. El resto se muestra como texto.
+function serverDataTable(selector, renderers) {
+    const table = $(selector);
+    renderers = renderers || {};
+    const columns = table.find('thead th').map(function () {
+        const th = $(this);
+        const render = renderers[th.data('render')];
+        return {
+            data: th.data('data') || null,
+            orderable: th.data('orderable') !== false,
+            render: render || $.fn.dataTable.render.text(),
+        };
+    }).get();
+
+    return table.DataTable({
+        serverSide: true,
+        processing: true,
+        ajax: table.data('source'),
+        columns: columns,
+        order: [],
+        pageLength: 25,
+        search: { search: table.data('search') || '' },
+        language: {
+            processing: 'Cargando...',
+            search: 'Buscar:',
+            lengthMenu: 'Mostrar _MENU_ registros',
+            info: 'Mostrando _START_ a _END_ de _TOTAL_ registros',
+            infoEmpty: 'Sin registros',
+            infoFiltered: '(filtrado de _MAX_ registros)',
+            zeroRecords: 'No se encontraron registros',
+            emptyTable: table.data('empty') || 'No hay registros',
+            paginate: { first: 'Primero', last: 'Último', next: 'Siguiente', previous: 'Anterior' },
+        },
+    });
+}
+
+// Escapa un valor para armar HTML en una función de render
+function escapeHtml(value) {
+    return $('<div>').text(value == null ? '' : value).html();
+}
@@ -0,0 +1,158 @@
+// Tablero de la agenda en tiempo real: aplica los cambios de consultas que llegan por
+// Server-Sent Events (reception:consultation_events) sin recargar la página.
+(function () {
+    const table = document.querySelector('[data-queue-board]');
+    if (!table || !window.EventSource) {
+        return;
+    }
+    const tbody = table.querySelector('tbody');
+    const columns = ['order', 'shift_display', 'date_display', 'time_display', 'patient', 'doctor', 'consultorio', 'status_display'];
+    const columnCount = columns.length + 2;
+    const hasNext = table.dataset.hasNext === '1';
+    const hasPrevious = table.dataset.hasPrevious === '1';
+    // Eventos ya aplicados: al reconectarse el servidor repasa los últimos segundos y puede repetirlos
+    const applied = new Set();
+    const appliedLimit = 1000;
+
+    // Misma clave de orden que la paginación: fecha, turno, orden, id
+    function rowKey(data) {
+        return [data.date, data.shift, String(data.order).padStart(10, '0'), String(data.id).padStart(10, '0')].join('|');
+    }
+
+    function rows() {
+        return Array.from(tbody.querySelectorAll('tr[data-id]'));
+    }
+
+    // La consulta pertenece a esta página si cae entre la primera y la última fila mostradas
+    function fitsPage(key) {
+        const current = rows();
+        if (!current.length) {
+            return !hasNext && !hasPrevious;
+        }
+        if (hasPrevious && key < current[0].dataset.key) {
+            return false;
+        }
+        if (hasNext && key > current[current.length - 1].dataset.key) {
+            return false;
+        }
+        return true;
+    }
+
+    function highlight(row) {
+        row.classList.add('table-info');
+        setTimeout(() => row.classList.remove('table-info'), 2000);
+    }
+
+    function actionLink(href, label, css) {
+        const link = document.createElement('a');
+        link.href = href;
+        link.className = `btn ${css} btn-sm me-2`;
+        link.textContent = label;
+        return link;
+    }
+
+    function buildRow(data) {
+        const row = document.createElement('tr');
+        row.dataset.id = data.id;
+        columns.forEach(field => {
+            const cell = document.createElement('td');
+            cell.dataset.field = field;
+            row.appendChild(cell);
+        });
+        const priority = document.createElement('td');
+        const priorityLabel = document.createElement('span');
+        priorityLabel.dataset.field = 'priority_display';
+        priority.appendChild(priorityLabel);
+        row.appendChild(priority);
+        const actions = document.createElement('td');
+        actions.appendChild(actionLink(data.edit_url, 'Editar', 'btn-outline-warning'));
+        actions.appendChild(actionLink(data.delete_url, 'Eliminar', 'btn-outline-danger'));
+        row.appendChild(actions);
+        return row;
+    }
+
+    function fill(row, data) {
+        row.dataset.key = rowKey(data);
+        columns.concat('priority_display').forEach(field => {
+            row.querySelector(`[data-field="${field}"]`).textContent = data[field] ?? '';
+        });
+        // La posición en la cola de triage se calcula al cargar la página; al cambiar la fila deja de ser válida
+        const position = row.querySelector('[data-triage-position]');
+        if (position) {
+            position.remove();
+        }
+    }
+
+    function place(row) {
+        const next = rows().find(other => other !== row && other.dataset.key > row.dataset.key);
+        tbody.insertBefore(row, next || null);
+        const empty = tbody.querySelector('tr[data-empty]');
+        if (empty) {
+            empty.remove();
+        }
+    }
+
+    function remove(row) {
+        row.remove();
+        if (!rows().length && !tbody.querySelector('tr[data-empty]')) {
+            const empty = document.createElement('tr');
+            empty.dataset.empty = '';
+            const cell = document.createElement('td');
+            cell.colSpan = columnCount;
+            cell.textContent = 'No hay consultas agendadas.';
+            empty.appendChild(cell);
+            tbody.appendChild(empty);
+        }
+    }
+
+    function alreadyApplied(eventId) {
+        if (applied.has(eventId)) {
+            return true;
+        }
+        applied.add(eventId);
+        if (applied.size > appliedLimit) {
+            applied.delete(applied.values().next().value);
+        }
+        return false;
+    }
+
+    function apply(event) {
+        if (alreadyApplied(event.event_id)) {
+            return;
+        }
+        let row = tbody.querySelector(`tr[data-id="${event.id}"]`);
+        // La agenda no muestra las consultas atendidas
+        if (event.action === 'deleted' || event.status === 'ATENDIDO') {
+            if (row) {
+                remove(row);
+            }
+            return;
+        }
+        const key = rowKey(event);
+        if (!row) {
+            if (!fitsPage(key)) {
+                return;
+            }
+            row = buildRow(event);
+        } else if (!fitsPage(key)) {
+            remove(row);
+            return;
+        }
+        fill(row, event);
+        place(row);
+        highlight(row);
+    }
+
+    // El cursor inicial es el último evento al renderizar la página; al reconectarse
+    // el navegador manda Last-Event-ID y el servidor sigue desde ahí
+    const url = new URL(table.dataset.eventsUrl, window.location.href);
+    url.searchParams.set('last_id', table.dataset.lastEventId || '0');
+    const source = new EventSource(url);
+    source.addEventListener('consultation', message => {
+        try {
+            apply(JSON.parse(message.data));
+        } catch (error) {
+            console.error('Evento de consulta inválido', error);
+        }
+    });
+})();
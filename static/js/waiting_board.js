@@ -0,0 +1,70 @@
+// Tablero de la sala de espera: consulta el estado cada pocos segundos enviando la última
+// versión recibida; el servidor responde solo los turnos que cambiaron.
+(function () {
+    const board = document.querySelector('[data-waiting-board]');
+    if (!board) {
+        return;
+    }
+    const container = board.querySelector('[data-shifts]');
+    const offline = board.querySelector('[data-offline]');
+    const pollMs = parseInt(board.dataset.pollMs, 10) || 5000;
+    let version = null;
+
+    function shiftCard(shift) {
+        let card = container.querySelector(`[data-shift="${shift.shift}"]`);
+        if (!card) {
+            card = document.createElement('div');
+            card.className = 'col-md-4';
+            card.dataset.shift = shift.shift;
+            card.innerHTML = `
+                <div class="card bg-secondary text-white text-center h-100">
+                    <div class="card-header fs-3" data-field="shift_display"></div>
+                    <div class="card-body">
+                        <div class="fs-5">Llamado</div>
+                        <div class="display-1 fw-bold" data-field="current"></div>
+                        <div class="fs-5 mt-3">Siguientes</div>
+                        <div class="fs-2" data-field="next"></div>
+                    </div>
+                    <div class="card-footer" data-field="waiting"></div>
+                </div>`;
+            container.appendChild(card);
+        }
+        return card;
+    }
+
+    function render(shift) {
+        const card = shiftCard(shift);
+        card.querySelector('[data-field="shift_display"]').textContent = shift.shift_display;
+        card.querySelector('[data-field="current"]').textContent = shift.current ?? '-';
+        card.querySelector('[data-field="next"]').textContent = shift.next.length ? shift.next.join('  ') : '-';
+        card.querySelector('[data-field="waiting"]').textContent = `${shift.waiting} en espera`;
+        // Solo se muestran los turnos con pacientes llamados o en espera
+        card.classList.toggle('d-none', shift.current === null && shift.waiting === 0);
+    }
+
+    function poll() {
+        const url = new URL(board.dataset.url, window.location.href);
+        if (version !== null) {
+            url.searchParams.set('version', version);
+        }
+        fetch(url, { headers: { 'Accept': 'application/json' } })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                return response.json();
+            })
+            .then(data => {
+                if (data.full) {
+                    container.replaceChildren();
+                }
+                data.shifts.forEach(render);
+                version = data.version;
+                offline.classList.add('d-none');
+            })
+            .catch(() => offline.classList.remove('d-none'))
+            .finally(() => setTimeout(poll, pollMs));
+    }
+
+    poll();
+})();
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import Users, Specialty, Doctor, Administrator, Receptions, Reset_token, Patient, DoctorSchedule
+from .models import Users, Specialty, Doctor, Administrator, Receptions, Reset_token, Patient, DoctorSchedule, QueueSequence, ConsultationDailyCount, RecordCount, WaitingQueueCount
 
 # Información adicional al registrar usuario
 
@@ -80,3 +80,7 @@ admin.site.register(Doctor)
 admin.site.register(Receptions)
 admin.site.register(Administrator)
 admin.site.register(Reset_token)
+admin.site.register(QueueSequence)
+admin.site.register(ConsultationDailyCount)
+admin.site.register(RecordCount)
+admin.site.register(WaitingQueueCount)
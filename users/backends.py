@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import F
+from .roles import ROLE_PROFILES, role_from_profiles
+
+# Columnas de Users que se cargan en cada request: las que usan la autenticación y los permisos
+# (password para verificar el hash de la sesión) y las que muestran las barras laterales y los
+# dashboards. Email, dirección y fechas quedan diferidos: solo los usan las páginas de perfil.
+LEAN_USER_FIELDS = (
+    'id', 'password', 'username', 'first_name', 'last_name', 'gender',
+    'is_active', 'is_staff', 'is_superuser', 'is_doctor', 'profile_avatar',
+)
+
+
+class LeanModelBackend(ModelBackend):
+    """
+    ModelBackend que carga request.user solo con LEAN_USER_FIELDS.
+    Si una vista usa un campo diferido se cargan todos los diferidos en una sola consulta
+    (ver Users.refresh_from_db). En la misma consulta se resuelve el rol (LEFT JOIN a los
+    perfiles), así RoleMiddleware lo tiene siempre al día sin otra consulta.
+    """
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        perfiles = {f'_perfil_{campo}': F(campo) for campo, _ in ROLE_PROFILES}
+        try:
+            user = UserModel._default_manager.only(*LEAN_USER_FIELDS).annotate(**perfiles).get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        user._load_deferred_together = True
+        user.loaded_role = role_from_profiles(*(getattr(user, nombre) for nombre in perfiles))
+        return user if self.user_can_authenticate(user) else None
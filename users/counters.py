@@ -0,0 +1,140 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models import Count, F, Sum
+from .models import Consultation, ConsultationDailyCount, Doctor, Patient, RecordCount, WaitingQueueCount
+
+# Tablas con conteo total en RecordCount. Las consultas no están: cada alta y baja actualizaría la
+# misma fila y serializaría todas las reservas; su total sale de consultation_total()
+COUNTED_MODELS = {
+    'patient': Patient,
+    'doctor': Doctor,
+}
+
+
+def _add_to_counter(model, delta, **clave):
+    """
+    Suma `delta` a la fila `clave` de un contador. Si la fila existe (lo habitual) es un solo UPDATE
+    atómico; solo la primera vez de cada clave se crea la fila.
+    """
+    if model.objects.filter(**clave).update(total=F('total') + delta):
+        return
+    contador, creado = model.objects.get_or_create(**clave, defaults={'total': delta})
+    if not creado:
+        model.objects.filter(pk=contador.pk).update(total=F('total') + delta)
+
+
+def add_to_record_count(name, delta):
+    """Suma `delta` al total de la tabla `name`"""
+    _add_to_counter(RecordCount, delta, name=name)
+
+
+def record_total(name):
+    """Total de registros de la tabla `name` según RecordCount"""
+    return RecordCount.objects.filter(name=name).values_list('total', flat=True).first() or 0
+
+
+def add_to_daily_count(fecha, specialty_id, status, delta):
+    """Suma `delta` al conteo de consultas del día, especialidad y estado"""
+    _add_to_counter(ConsultationDailyCount, delta, date=fecha, specialty_id=specialty_id, status=status)
+
+
+def add_to_waiting_count(fecha, doctor_id, shift, consultorio, delta):
+    """Suma `delta` a las consultas en espera de la cola (fecha, doctor, turno, consultorio)"""
+    _add_to_counter(WaitingQueueCount, delta, date=fecha, doctor_id=doctor_id, shift=shift, consultorio=consultorio)
+
+
+def waiting_counter_key(fecha, doctor_id, shift, consultorio, status):
+    """Cola en la que cuenta una consulta en espera, o None si no está en espera o no tiene doctor"""
+    if status != 'EN ESPERA' or not doctor_id:
+        return None
+    return (fecha, doctor_id, shift, consultorio)
+
+
+def consultation_counter_key(consulta):
+    """(fecha, especialidad, estado) con el que se cuenta una consulta"""
+    specialty_id = None
+    if consulta.doctor_id:
+        specialty_id = Doctor.objects.filter(pk=consulta.doctor_id).values_list('specialty_id', flat=True).first()
+    return (consulta.date, specialty_id, consulta.status)
+
+
+def rebuild_counters():
+    """Recalcula todos los contadores desde cero a partir de las tablas reales"""
+    with transaction.atomic():
+        ConsultationDailyCount.objects.all().delete()
+        ConsultationDailyCount.objects.bulk_create([
+            ConsultationDailyCount(
+                date=fila['date'], specialty_id=fila['doctor__specialty'],
+                status=fila['status'], total=fila['total']
+            )
+            for fila in Consultation.objects.order_by()
+            .values('date', 'doctor__specialty', 'status')
+            .annotate(total=Count('id'))
+        ], batch_size=1000)
+
+        WaitingQueueCount.objects.all().delete()
+        WaitingQueueCount.objects.bulk_create([
+            WaitingQueueCount(
+                date=fila['date'], doctor_id=fila['doctor'], shift=fila['shift'],
+                consultorio=fila['consultorio'], total=fila['total']
+            )
+            for fila in Consultation.objects.filter(status='EN ESPERA', doctor__isnull=False).order_by()
+            .values('date', 'doctor', 'shift', 'consultorio')
+            .annotate(total=Count('id'))
+        ], batch_size=1000)
+
+        RecordCount.objects.all().delete()
+        RecordCount.objects.bulk_create([
+            RecordCount(name=name, total=model.objects.count())
+            for name, model in COUNTED_MODELS.items()
+        ])
+
+
+def consultation_total():
+    """
+    Total aproximado de consultas para el dashboard, sin contador en el camino de escritura.
+    En PostgreSQL es la estimación de pg_class.reltuples (se actualiza con VACUUM/ANALYZE); en otras
+    bases, o si la tabla aún no se analizó, un COUNT(*) guardado CONSULTATION_TOTAL_SECONDS segundos.
+    """
+    connection = connections[router.db_for_read(Consultation)]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [Consultation._meta.db_table]
+            )
+            fila = cursor.fetchone()
+        if fila and fila[0] >= 0:
+            return fila[0]
+    timeout = getattr(settings, 'CONSULTATION_TOTAL_SECONDS', 300)
+    if not timeout:
+        return Consultation.objects.count()
+    return cache.get_or_set('consultation_total', Consultation.objects.count, timeout)
+
+
+def reception_dashboard_counts(fecha):
+    """Conteos del dashboard de recepción leídos de los contadores"""
+    totales = dict(RecordCount.objects.values_list('name', 'total'))
+    consultas_hoy = ConsultationDailyCount.objects.filter(date=fecha).aggregate(total=Sum('total'))['total']
+    return {
+        'pacientes_count': totales.get('patient', 0),
+        'doctores_count': totales.get('doctor', 0),
+        'consultas_count': consultation_total(),
+        'consultas_hoy': consultas_hoy or 0,
+    }
+
+
+def waiting_gauges(fecha):
+    """
+    Consultas en espera del día leídas de WaitingQueueCount:
+    (por doctor y turno, por consultorio), cada una como lista de dicts.
+    """
+    filas = WaitingQueueCount.objects.filter(date=fecha, total__gt=0)
+    por_doctor = list(
+        filas.values('doctor', 'shift').annotate(total=Sum('total'))
+        .order_by('doctor', 'shift')
+    )
+    por_consultorio = list(
+        filas.values('consultorio').annotate(total=Sum('total')).order_by('consultorio')
+    )
+    return por_doctor, por_consultorio
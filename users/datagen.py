@@ -0,0 +1,257 @@
+"""
+Generador de datos sintéticos para pruebas de carga (ver el comando generate_hospital_data).
+Todo se genera de forma perezosa y se inserta con bulk_create por lotes, así que la memoria
+no crece con el volumen. Con la misma semilla se obtienen siempre los mismos datos.
+"""
+import random
+from array import array
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from .models import Consultation, Doctor, DoctorSchedule, Patient, Prescription, Specialty, Users
+
+# Prefijos de los registros generados (no chocan con datos reales)
+GENERATED_USER_PREFIX = 'gen_doc_'
+GENERATED_CI_PREFIX = '90'
+
+BATCH_SIZE = 5000
+
+# Horarios de cada doctor generado: lunes a viernes, mañana y tarde
+SCHEDULE_DAYS = ['LUNES', 'MARTES', 'MIERCOLES', 'JUEVES', 'VIERNES']
+SCHEDULE_BLOCKS = [
+    ('MAÑANA', time(8, 0), time(12, 0)),
+    ('TARDE', time(14, 0), time(18, 0)),
+]
+SLOT_MINUTES = 30
+
+# Días hacia adelante con consultas pendientes (agenda futura)
+FUTURE_DAYS = 14
+# Probabilidad de que un bloque de 30 minutos tenga consulta
+OCCUPANCY = 0.8
+
+SPECIALTIES = [
+    'Cardiología', 'Pediatría', 'Clínica Médica', 'Traumatología', 'Dermatología',
+    'Ginecología', 'Neurología', 'Oftalmología', 'Otorrinolaringología', 'Urología',
+]
+FIRST_NAMES = [
+    'Ana', 'Luis', 'María', 'José', 'Carmen', 'Juan', 'Rosa', 'Carlos', 'Lucía', 'Pedro',
+    'Sofía', 'Miguel', 'Laura', 'Jorge', 'Elena', 'Diego', 'Paula', 'Andrés', 'Marta', 'Raúl',
+]
+LAST_NAMES = [
+    'González', 'Benítez', 'Martínez', 'López', 'Giménez', 'Fernández', 'Rodríguez', 'Duarte',
+    'Báez', 'Ramírez', 'Vera', 'Acosta', 'Villalba', 'Ortiz', 'Cabrera', 'Núñez', 'Rojas', 'Sosa',
+]
+CITIES = [
+    ('Asunción', 'Capital'), ('San Lorenzo', 'Central'), ('Luque', 'Central'),
+    ('Encarnación', 'Itapúa'), ('Ciudad del Este', 'Alto Paraná'), ('Concepción', 'Concepción'),
+]
+DESCRIPTIONS = ['Control', 'Dolor de cabeza', 'Fiebre', 'Chequeo anual', 'Dolor abdominal', 'Tos persistente']
+MEDICATIONS = ['Paracetamol 500mg', 'Ibuprofeno 400mg', 'Amoxicilina 500mg', 'Omeprazol 20mg', 'Loratadina 10mg']
+
+
+def chunks(iterable, size):
+    """Divide un iterable en listas de `size` elementos sin materializarlo completo"""
+    iterator = iter(iterable)
+    while True:
+        lote = list(islice(iterator, size))
+        if not lote:
+            return
+        yield lote
+
+
+def bulk_insert(model, objetos, batch_size=BATCH_SIZE, progress=None):
+    """Inserta los objetos por lotes, cada lote en su transacción. Devuelve la cantidad insertada"""
+    total = 0
+    for lote in chunks(objetos, batch_size):
+        with transaction.atomic():
+            model.objects.bulk_create(lote, batch_size=batch_size)
+        total += len(lote)
+        if progress:
+            progress(model, total)
+    return total
+
+
+def generated_data_exists():
+    return (
+        Users.objects.filter(username__startswith=GENERATED_USER_PREFIX).exists()
+        or Patient.objects.filter(identification_number__startswith=GENERATED_CI_PREFIX).exists()
+    )
+
+
+def ensure_specialties():
+    """Crea las especialidades que falten y devuelve sus ids"""
+    existentes = set(Specialty.objects.filter(name__in=SPECIALTIES).values_list('name', flat=True))
+    Specialty.objects.bulk_create([
+        Specialty(name=nombre, description=f'Servicio de {nombre}')
+        for nombre in SPECIALTIES if nombre not in existentes
+    ])
+    return list(Specialty.objects.filter(name__in=SPECIALTIES).order_by('name').values_list('pk', flat=True))
+
+
+def generate_doctors(rng, cantidad, specialty_ids, batch_size=BATCH_SIZE, progress=None):
+    """Usuarios médicos con su Doctor y sus horarios semanales. Devuelve la lista de (doctor_id, specialty_id)"""
+    # Hashear una sola vez: con el hasher por defecto cada hash tarda cientos de milisegundos
+    password = make_password('password123')
+    bulk_insert(Users, (
+        Users(
+            username=f'{GENERATED_USER_PREFIX}{n:05d}',
+            email=f'{GENERATED_USER_PREFIX}{n:05d}@example.com',
+            password=password,
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=rng.choice(LAST_NAMES),
+            is_doctor=True,
+        )
+        for n in range(cantidad)
+    ), batch_size, progress)
+    user_ids = list(
+        Users.objects.filter(username__startswith=GENERATED_USER_PREFIX).order_by('username').values_list('pk', flat=True)
+    )
+    doctores = [(user_id, rng.choice(specialty_ids)) for user_id in user_ids]
+    bulk_insert(Doctor, (
+        Doctor(user_id=user_id, specialty_id=specialty_id, bio='Médico generado para pruebas de carga')
+        for user_id, specialty_id in doctores
+    ), batch_size, progress)
+    bulk_insert(DoctorSchedule, (
+        DoctorSchedule(
+            doctor_id=user_id, day=dia, start_time=inicio, end_time=fin,
+            consultorio=f'g{n}{turno[0].lower()}',
+        )
+        for n, (user_id, _) in enumerate(doctores)
+        for dia in SCHEDULE_DAYS
+        for turno, inicio, fin in SCHEDULE_BLOCKS
+    ), batch_size, progress)
+    return doctores
+
+
+def generate_patients(rng, cantidad, batch_size=BATCH_SIZE, progress=None):
+    """Pacientes con número de identificación secuencial bajo GENERATED_CI_PREFIX"""
+    hoy = date.today()
+
+    def pacientes():
+        for n in range(cantidad):
+            ciudad, region = rng.choice(CITIES)
+            yield Patient(
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=f'{rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}',
+                phone=f'09{rng.randrange(10**8):08d}',
+                identification_type='CI',
+                identification_number=f'{GENERATED_CI_PREFIX}{n:09d}',
+                gender=rng.choice(('Male', 'Female', 'Other')),
+                date_of_birth=hoy - timedelta(days=rng.randrange(365, 365 * 90)),
+                address_line=f'Calle {rng.randrange(1, 2000)}',
+                city=ciudad,
+                region=region,
+                postal_code=f'{rng.randrange(1000, 9999)}',
+                emergency_contact_name=rng.choice(FIRST_NAMES),
+                emergency_contact_relationship=rng.choice(('Madre', 'Padre', 'Pareja', 'Hermano/a')),
+                emergency_contact_phone=f'09{rng.randrange(10**8):08d}',
+            )
+
+    return bulk_insert(Patient, pacientes(), batch_size, progress)
+
+
+def _slots():
+    """Bloques (turno, hora, orden, sufijo de consultorio) de un día de trabajo"""
+    bloques = []
+    for turno, inicio, fin in SCHEDULE_BLOCKS:
+        actual = datetime.combine(date.today(), inicio)
+        limite = datetime.combine(date.today(), fin)
+        orden = 1
+        while actual < limite:
+            bloques.append((turno, actual.time(), orden, turno[0].lower()))
+            actual += timedelta(minutes=SLOT_MINUTES)
+            orden += 1
+    return bloques
+
+
+def _consultations(rng, cantidad, doctores, patient_ids):
+    """
+    Recorre los días hábiles hacia atrás desde hoy + FUTURE_DAYS y ocupa bloques de cada doctor
+    hasta llegar a `cantidad`. Respeta las restricciones de orden y horario únicos por doctor.
+    """
+    hoy = date.today()
+    fecha = hoy + timedelta(days=FUTURE_DAYS)
+    slots = _slots()
+    generadas = 0
+    while generadas < cantidad:
+        if fecha.weekday() < len(SCHEDULE_DAYS):
+            for n, (doctor_id, specialty_id) in enumerate(doctores):
+                for turno, hora, orden, sufijo in slots:
+                    if rng.random() > OCCUPANCY:
+                        continue
+                    if fecha >= hoy:
+                        status = 'EN ESPERA'
+                    else:
+                        status = 'CANCELADA' if rng.random() < 0.1 else 'ATENDIDO'
+                    yield Consultation(
+                        description=rng.choice(DESCRIPTIONS),
+                        date=fecha, time=hora, shift=turno, order=orden,
+                        priority=rng.choice(Consultation.priority_choices)[0],
+                        consultorio=f'g{n}{sufijo}',
+                        servicio_id=specialty_id,
+                        status=status,
+                        doctor_id=doctor_id,
+                        patient_id=patient_ids[rng.randrange(len(patient_ids))],
+                    )
+                    generadas += 1
+                    if generadas >= cantidad:
+                        return
+        fecha -= timedelta(days=1)
+
+
+def generate_consultations(rng, cantidad, doctores, prescription_ratio=0.3,
+                           batch_size=BATCH_SIZE, progress=None):
+    """
+    Consultas repartidas entre los doctores generados y, para una fracción de las atendidas,
+    una receta. Devuelve (consultas, recetas).
+    """
+    if not doctores or cantidad <= 0:
+        return 0, 0
+    patient_ids = array('q', Patient.objects.order_by().values_list('pk', flat=True).iterator(chunk_size=batch_size))
+    if not patient_ids:
+        return 0, 0
+
+    # PostgreSQL y SQLite >= 3.35 devuelven los ids en bulk_create, necesarios para las recetas
+    con_recetas = prescription_ratio > 0 and connection.features.can_return_rows_from_bulk_insert
+    consultas = recetas = 0
+    for lote in chunks(_consultations(rng, cantidad, doctores, patient_ids), batch_size):
+        with transaction.atomic():
+            Consultation.objects.bulk_create(lote, batch_size=batch_size)
+            if con_recetas:
+                nuevas = Prescription.objects.bulk_create([
+                    Prescription(
+                        medication=rng.choice(MEDICATIONS),
+                        description='Tomar cada 8 horas',
+                        doctor_id=consulta.doctor_id,
+                        consultation_id=consulta.pk,
+                    )
+                    for consulta in lote
+                    if consulta.status == 'ATENDIDO' and rng.random() < prescription_ratio
+                ], batch_size=batch_size)
+                recetas += len(nuevas)
+        consultas += len(lote)
+        if progress:
+            progress(Consultation, consultas)
+    return consultas, recetas
+
+
+def generate_hospital_data(patients, doctors, consultations, prescription_ratio=0.3,
+                           seed=42, batch_size=BATCH_SIZE, progress=None):
+    """
+    Genera el conjunto completo: especialidades, doctores con horarios, pacientes,
+    consultas y recetas. Devuelve un dict con las cantidades creadas.
+    """
+    rng = random.Random(seed)
+    specialty_ids = ensure_specialties()
+    doctores = generate_doctors(rng, doctors, specialty_ids, batch_size, progress)
+    pacientes = generate_patients(rng, patients, batch_size, progress)
+    consultas, recetas = generate_consultations(
+        rng, consultations, doctores, prescription_ratio, batch_size, progress
+    )
+    return {
+        'doctors': len(doctores),
+        'patients': pacientes,
+        'consultations': consultas,
+        'prescriptions': recetas,
+    }
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+# Máximo de filas que una tabla puede pedir por página
+MAX_LENGTH = 100
+
+
+def _int_param(request, nombre, defecto):
+    try:
+        return int(request.GET.get(nombre, defecto))
+    except (TypeError, ValueError):
+        return defecto
+
+
+def datatables_params(request):
+    """
+    Lee los parámetros del protocolo server-side de DataTables:
+    draw, start, length, search[value] y la primera columna de order[].
+    """
+    length = _int_param(request, 'length', 10)
+    if length < 1 or length > MAX_LENGTH:
+        length = MAX_LENGTH
+    columna = _int_param(request, 'order[0][column]', -1)
+    return {
+        'draw': _int_param(request, 'draw', 0),
+        'start': max(_int_param(request, 'start', 0), 0),
+        'length': length,
+        'search': request.GET.get('search[value]', '').strip(),
+        'order_column': request.GET.get(f'columns[{columna}][data]', '') if columna >= 0 else '',
+        'order_dir': 'desc' if request.GET.get('order[0][dir]') == 'desc' else 'asc',
+    }
+
+
+def cached_total(key, queryset):
+    """
+    Total sin filtrar de una tabla (recordsTotal). El COUNT(*) de una tabla grande cuesta lo mismo
+    en cada página, así que se guarda DATATABLES_TOTAL_SECONDS segundos: es el "de N registros"
+    de la tabla y puede atrasarse unos segundos respecto de las filas.
+    """
+    timeout = getattr(settings, 'DATATABLES_TOTAL_SECONDS', 60)
+    if not timeout:
+        return queryset.count()
+    return cache.get_or_set(f'datatables_total:{key}', queryset.count, timeout)
+
+
+def datatables_response(params, queryset, total, filtrado, serializar):
+    """Respuesta JSON de DataTables con solo la página pedida"""
+    pagina = queryset[params['start']:params['start'] + params['length']]
+    return JsonResponse({
+        'draw': params['draw'],
+        'recordsTotal': total,
+        'recordsFiltered': filtrado,
+        'data': [serializar(obj) for obj in pagina],
+    })
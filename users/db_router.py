@@ -0,0 +1,93 @@
+"""
+Lecturas en la réplica.
+Las vistas de solo lectura marcadas con @use_replica (dashboards, historiales) leen de
+REPLICA_DATABASE; el resto del tráfico y todas las escrituras van a la base principal.
+ReplicaPinMiddleware (users/middleware.py) detecta los requests que escribieron y deja al
+usuario en la principal durante REPLICA_PIN_SECONDS, para que vea sus propios cambios
+aunque la réplica tenga retraso. Sin el alias de réplica configurado todo queda en la principal.
+"""
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Cookie que fija al usuario a la base principal después de escribir
+PIN_COOKIE = 'db_pin'
+
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+_writes = contextvars.ContextVar('request_writes', default=None)
+
+
+def replica_alias():
+    """Alias de la réplica, o None si no está configurada"""
+    alias = getattr(settings, 'REPLICA_DATABASE', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def read_from(alias):
+    """Envía a `alias` las lecturas hechas dentro del bloque (None no cambia nada)"""
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+@contextmanager
+def track_writes():
+    """Registra si dentro del bloque se escribió en la base; devuelve un set con los modelos escritos"""
+    escritos = set()
+    token = _writes.set(escritos)
+    try:
+        yield escritos
+    finally:
+        _writes.reset(token)
+
+
+def use_replica(view_func):
+    """
+    Las lecturas de la vista van a la réplica. Solo GET/HEAD y solo si el usuario no escribió
+    hace poco (cookie PIN_COOKIE). Se usa debajo de @login_required y @role_required.
+    """
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        alias = replica_alias()
+        if alias is None or request.method not in ('GET', 'HEAD') or request.COOKIES.get(PIN_COOKIE):
+            return view_func(request, *args, **kwargs)
+        with read_from(alias):
+            response = view_func(request, *args, **kwargs)
+            # Un TemplateResponse se renderiza después de la vista: se hace aquí, dentro de la réplica
+            if getattr(response, 'is_rendered', True) is False:
+                response.render()
+        return response
+    return _wrapped_view
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        # Dentro de una transacción en la principal la réplica no ve lo escrito en ella
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        escritos = _writes.get()
+        if escritos is not None:
+            escritos.add(model._meta.label)
+        # Siempre la principal, aunque la instancia se haya leído de la réplica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        bases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe el esquema por replicación
+        if db == replica_alias():
+            return False
+        return None
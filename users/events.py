@@ -0,0 +1,305 @@
+"""
+Notificador de cambios de consultas para el tablero de recepción en tiempo real.
+Cada alta, cambio o baja de una consulta guarda un ConsultationEvent en la misma transacción
+(ver users/signals.py); el id del evento es el cursor que usan los clientes SSE para
+retomar después de una reconexión (Last-Event-ID). Como el id se asigna al insertar y no al
+confirmar, los eventos se leen con EventCursor, que además repasa los últimos segundos.
+En cada proceso ASGI un único EventBroker espera eventos nuevos y los reparte a los clientes
+conectados: con PostgreSQL despierta con LISTEN/NOTIFY, con otras bases consulta la tabla
+cada CONSULTATION_EVENTS_POLL_SECONDS.
+"""
+import asyncio
+import logging
+import threading
+from datetime import timedelta
+from time import monotonic
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import formats, timezone
+from .db_router import read_from
+from .models import ConsultationEvent
+
+logger = logging.getLogger('hospital.events')
+
+# Canal de NOTIFY de PostgreSQL
+NOTIFY_CHANNEL = 'consultation_events'
+# Eventos leídos por consulta a la tabla
+FETCH_LIMIT = 500
+# Eventos pendientes por cliente; un cliente más lento se desconecta y se reconecta desde su último id
+QUEUE_SIZE = 1000
+
+
+def consultation_event_data(consulta):
+    """Datos de la fila del tablero, con los mismos formatos que el template"""
+    return {
+        'id': consulta.pk,
+        'order': consulta.order,
+        'shift': consulta.shift,
+        'shift_display': consulta.get_shift_display(),
+        'date': consulta.date.isoformat(),
+        'date_display': formats.localize(consulta.date),
+        'time': consulta.time.strftime('%H:%M'),
+        'time_display': formats.localize(consulta.time),
+        'patient': consulta.patient.full_name,
+        'doctor': str(consulta.doctor) if consulta.doctor_id else '',
+        'consultorio': consulta.consultorio,
+        'status': consulta.status,
+        'status_display': consulta.get_status_display(),
+        'priority': consulta.priority,
+        'priority_display': consulta.get_priority_display(),
+        'doctor_id': consulta.doctor_id,
+        'edit_url': reverse('reception:consultation_edit', args=[consulta.pk]),
+        'delete_url': reverse('reception:consultation_delete', args=[consulta.pk]),
+    }
+
+
+def record_consultation_event(consulta, action, using=DEFAULT_DB_ALIAS):
+    """Guarda el evento y, en PostgreSQL, avisa a los procesos en escucha (NOTIFY llega al confirmar)"""
+    data = {'id': consulta.pk} if action == 'deleted' else consultation_event_data(consulta)
+    evento = ConsultationEvent.objects.using(using).create(consultation_id=consulta.pk, action=action, data=data)
+    conexion = connections[using]
+    if conexion.vendor == 'postgresql':
+        with conexion.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [NOTIFY_CHANNEL, str(evento.pk)])
+    return evento
+
+
+def latest_event_id():
+    return ConsultationEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+class EventCursor:
+    """
+    Posición de lectura de ConsultationEvent sin huecos. Los ids se asignan al insertar y no al
+    confirmar: dos reservas de doctores distintos pueden confirmar en otro orden, y un evento con id
+    menor aparece después de otros ya leídos. Por eso cada lectura trae, además de los ids mayores
+    al último leído, los eventos de los últimos CONSULTATION_EVENTS_REORDER_SECONDS que el cursor
+    todavía no entregó. Los eventos de una misma consulta sí confirman en orden de id (el UPDATE
+    bloquea la fila), así que aplicarlos en ese orden deja siempre el último estado.
+    `settled_id`: ningún evento que llegue tarde puede tener un id menor o igual a este.
+    """
+
+    def __init__(self, last_id=0, settled_id=0):
+        self.last_id = last_id
+        self.settled_id = settled_id
+        # id -> created_at de los eventos entregados que siguen dentro de la ventana
+        self._seen = {}
+
+    @classmethod
+    def current(cls):
+        """Cursor en el último evento, con los de la ventana ya vistos (para quien carga el estado actual)"""
+        desde = _reorder_since()
+        recientes = dict(ConsultationEvent.objects.filter(created_at__gte=desde).values_list('id', 'created_at'))
+        anterior = (
+            ConsultationEvent.objects.filter(created_at__lt=desde)
+            .order_by('-id').values_list('id', flat=True).first() or 0
+        )
+        cursor = cls(max([anterior, *recientes]), settled_id=anterior)
+        cursor._seen = recientes
+        return cursor
+
+    def fetch(self, limit=FETCH_LIMIT):
+        """
+        Eventos que el cursor no entregó, en orden de id: como mucho `limit` posteriores al último
+        leído más los que confirmaron tarde. Una lista vacía indica que está al día.
+        """
+        desde = _reorder_since()
+        eventos = list(
+            ConsultationEvent.objects.filter(Q(id__gt=self.last_id) | Q(created_at__gte=desde))
+            .exclude(id__in=list(self._seen)).order_by('id')
+            .values('id', 'consultation_id', 'action', 'data', 'created_at')[:limit]
+        )
+        for evento in eventos:
+            self._record(evento)
+        self._forget(desde)
+        return eventos
+
+    def mark(self, evento):
+        """Registra un evento recibido por otra vía (EventBroker); False si el cursor ya lo había entregado"""
+        if evento['id'] in self._seen or evento['id'] <= self.settled_id:
+            return False
+        self._record(evento)
+        return True
+
+    def _record(self, evento):
+        self._seen[evento['id']] = evento['created_at']
+        self.last_id = max(self.last_id, evento['id'])
+
+    def _forget(self, desde):
+        # Un evento que llegue tarde se insertó después de `desde`: su id es mayor que los de antes
+        for pk, creado in list(self._seen.items()):
+            if creado < desde:
+                del self._seen[pk]
+                self.settled_id = max(self.settled_id, pk)
+
+
+def _reorder_since():
+    return timezone.now() - timedelta(seconds=getattr(settings, 'CONSULTATION_EVENTS_REORDER_SECONDS', 10))
+
+
+def prune_events(hours):
+    """Borra los eventos de más de `hours` horas; devuelve cuántos"""
+    limite = timezone.now() - timedelta(hours=hours)
+    return ConsultationEvent.objects.filter(created_at__lt=limite).delete()[0]
+
+
+class DailySnapshot:
+    """
+    Estado en memoria de las consultas del día, compartido por los requests del proceso.
+    Se reconstruye desde la tabla de consultas al cambiar el día y cada `rebuild_setting` segundos
+    (cubre cambios hechos sin señales, como update()); entre medio aplica los ConsultationEvent
+    nuevos, leídos como mucho cada CONSULTATION_EVENTS_POLL_SECONDS.
+    Las subclases implementan _load(hoy) y _apply(evento) y llaman a _refresh() con _lock tomado.
+    """
+    # Setting con los segundos entre reconstrucciones completas
+    rebuild_setting = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._date = None
+        self._built_at = self._checked_at = 0.0
+        # Cursor de eventos aplicados y último id al momento de la última reconstrucción
+        self._events = EventCursor()
+        self._base_version = 0
+
+    def _refresh(self):
+        # Siempre de la principal: la réplica puede no tener todavía los últimos eventos
+        with read_from(None):
+            hoy = timezone.localdate()
+            ahora = monotonic()
+            if hoy != self._date or ahora - self._built_at >= getattr(settings, self.rebuild_setting, 600):
+                self._rebuild(hoy, ahora)
+                return
+            if ahora - self._checked_at < _poll_seconds():
+                return
+            self._checked_at = ahora
+            while eventos := self._events.fetch():
+                for evento in eventos:
+                    self._apply(evento)
+
+    def _rebuild(self, hoy, ahora):
+        # El cursor se lee antes: los eventos que lleguen durante la carga se vuelven a aplicar sin efecto
+        self._events = EventCursor.current()
+        self._date = hoy
+        self._load(hoy)
+        self._base_version = self._events.last_id
+        self._built_at = self._checked_at = ahora
+
+    def _is_today(self, data):
+        return data.get('date') == self._date.isoformat()
+
+    def _load(self, hoy):
+        raise NotImplementedError
+
+    def _apply(self, evento):
+        raise NotImplementedError
+
+
+def db_call(func, *args):
+    """
+    Consulta desde un hilo del pool. Como al principio y al final de un request, se cierran las
+    conexiones vencidas antes y después: con ASGI CONN_MAX_AGE es 0 (ver settings.py) y la conexión
+    del hilo no queda abierta (o vuelve al pool de psycopg).
+    """
+    def llamar():
+        close_old_connections()
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    return sync_to_async(llamar, thread_sensitive=False)()
+
+
+class EventBroker:
+    """Reparte los eventos nuevos a las colas de los clientes conectados al proceso"""
+
+    def __init__(self):
+        self._reset(None)
+
+    def _reset(self, loop):
+        self._loop = loop
+        self._subscribers = set()
+        self._task = None
+        self._lock = asyncio.Lock()
+        self._cursor = None
+
+    async def subscribe(self):
+        """
+        Cola con los eventos leídos después de la suscripción (None: el cliente debe reconectarse).
+        Los anteriores se leen con un EventCursor propio; los repetidos se descartan con mark().
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Nuevo event loop (otro servidor o una prueba): el estado anterior ya no sirve
+            self._reset(loop)
+        cola = asyncio.Queue(maxsize=QUEUE_SIZE)
+        async with self._lock:
+            if self._task is None:
+                self._cursor = await db_call(EventCursor.current)
+                self._task = loop.create_task(self._run())
+            self._subscribers.add(cola)
+        return cola
+
+    def unsubscribe(self, cola):
+        self._subscribers.discard(cola)
+
+    async def _run(self):
+        escucha = await self._listen()
+        try:
+            while self._subscribers:
+                await self._wait(escucha)
+                while eventos := await db_call(self._cursor.fetch):
+                    self._publish(eventos)
+        finally:
+            # Sin await antes: una suscripción nueva arranca otra tarea
+            self._task = None
+            if escucha is not None:
+                await escucha.close()
+
+    def _publish(self, eventos):
+        for cola in list(self._subscribers):
+            for evento in eventos:
+                try:
+                    cola.put_nowait(evento)
+                except asyncio.QueueFull:
+                    # Cliente que no da abasto: se lo desconecta y se reconecta desde su Last-Event-ID
+                    self._subscribers.discard(cola)
+                    while not cola.empty():
+                        cola.get_nowait()
+                    cola.put_nowait(None)
+                    break
+
+    async def _listen(self):
+        """Conexión en LISTEN para PostgreSQL con psycopg 3, o None para consultar la tabla periódicamente"""
+        if connections[DEFAULT_DB_ALIAS].vendor != 'postgresql':
+            return None
+        db = connections[DEFAULT_DB_ALIAS].settings_dict
+        try:
+            import psycopg
+            escucha = await psycopg.AsyncConnection.connect(
+                dbname=db['NAME'], user=db['USER'], password=db['PASSWORD'],
+                host=db['HOST'], port=db['PORT'], autocommit=True,
+            )
+            await escucha.execute(f'LISTEN {NOTIFY_CHANNEL}')
+            return escucha
+        except Exception:
+            logger.warning("LISTEN no disponible; los eventos se consultan cada %s s", _poll_seconds(), exc_info=True)
+            return None
+
+    async def _wait(self, escucha):
+        if escucha is None:
+            await asyncio.sleep(_poll_seconds())
+            return
+        # Un aviso alcanza: los eventos se leen de la tabla por id. El timeout cubre avisos perdidos.
+        async for _ in escucha.notifies(timeout=_poll_seconds() * 10, stop_after=1):
+            pass
+
+
+def _poll_seconds():
+    return getattr(settings, 'CONSULTATION_EVENTS_POLL_SECONDS', 1.0)
+
+
+broker = EventBroker()
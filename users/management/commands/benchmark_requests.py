@@ -0,0 +1,192 @@
+import importlib.util
+import itertools
+import statistics
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from time import perf_counter
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+
+# Configuraciones de conexión que se pueden comparar
+MODES = {
+    'none': 'una conexión por request (CONN_MAX_AGE=0)',
+    'persistent': 'conexiones persistentes (CONN_MAX_AGE)',
+    'pool': 'pool de conexiones de psycopg 3',
+}
+
+
+def _start_response(status, headers, exc_info=None):
+    return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide requests por segundo pasando por el handler WSGI completo (con las señales de inicio "
+        "y fin de request que abren y cierran conexiones) con cada configuración de conexión a la base. "
+        "Ejemplo: manage.py benchmark_requests --username recepcion --path /recepcion/dashboard/ --requests 2000 --threads 8"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', action='append', help="Ruta a pedir (se puede repetir); por defecto LOGIN_REDIRECT_URL")
+        parser.add_argument('--username', help="Usuario con el que se autentican los requests")
+        parser.add_argument('--requests', type=int, default=500, help="Requests medidos por configuración")
+        parser.add_argument('--threads', type=int, default=4, help="Hilos concurrentes, como los de un worker gthread")
+        parser.add_argument('--modes', default='none,persistent,pool',
+                            help="Configuraciones a comparar, separadas por coma: none, persistent, pool")
+        parser.add_argument('--conn-max-age', type=int, default=60, help="CONN_MAX_AGE del modo persistent")
+        parser.add_argument('--host', default='localhost', help="Header Host de los requests")
+
+    def handle(self, *args, **options):
+        if options['requests'] <= 0 or options['threads'] <= 0:
+            raise CommandError("La cantidad de requests y de hilos debe ser mayor a cero.")
+        modos = [m.strip() for m in options['modes'].split(',') if m.strip()]
+        invalidos = [m for m in modos if m not in MODES]
+        if invalidos:
+            raise CommandError(f"Modos desconocidos: {', '.join(invalidos)}. Opciones: {', '.join(MODES)}.")
+        conexion = connections[DEFAULT_DB_ALIAS]
+        if 'pool' in modos and not self.pool_supported(conexion):
+            self.stderr.write("El modo pool requiere PostgreSQL con psycopg 3 y psycopg_pool; se omite.")
+            modos.remove('pool')
+
+        environs = self.build_environs(options['path'] or [settings.LOGIN_REDIRECT_URL],
+                                       options['host'], self.session_cookie(options['username']))
+        handler = WSGIHandler()
+        # Todas las conexiones de la base comparten este diccionario de configuración
+        db = conexion.settings_dict
+        original = {'CONN_MAX_AGE': db['CONN_MAX_AGE'], 'pool': db['OPTIONS'].get('pool')}
+        resultados = []
+        try:
+            for modo in modos:
+                self.configure(conexion, modo, options['conn_max_age'], original['pool'])
+                resultados.append((modo, self.run(handler, environs, options['requests'], options['threads'])))
+        finally:
+            self.configure(conexion, None, original['CONN_MAX_AGE'], original['pool'])
+        self.report(resultados, options)
+
+    def pool_supported(self, conexion):
+        if conexion.vendor != 'postgresql' or not hasattr(conexion, 'close_pool'):
+            return False
+        return importlib.util.find_spec('psycopg_pool') is not None
+
+    def session_cookie(self, username):
+        if not username:
+            return None
+        user = get_user_model().objects.filter(username=username).first()
+        if user is None:
+            raise CommandError(f"No existe el usuario {username}.")
+        client = Client()
+        client.force_login(user)
+        return f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+    def build_environs(self, paths, host, cookie):
+        environs = []
+        for path in paths:
+            ruta, _, query = path.partition('?')
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': ruta, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+                'SERVER_NAME': host, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_HOST': host, 'REMOTE_ADDR': '127.0.0.1',
+                'wsgi.url_scheme': 'http', 'wsgi.errors': sys.stderr,
+                'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+            }
+            if cookie:
+                environ['HTTP_COOKIE'] = cookie
+            environs.append(environ)
+        return environs
+
+    def configure(self, conexion, modo, conn_max_age, pool):
+        """Aplica la configuración de conexión del modo; None restaura la original"""
+        connections.close_all()
+        if hasattr(conexion, 'close_pool'):
+            conexion.close_pool()
+        db = conexion.settings_dict
+        db['OPTIONS'].pop('pool', None)
+        if modo == 'none':
+            db['CONN_MAX_AGE'] = 0
+        elif modo == 'persistent':
+            db['CONN_MAX_AGE'] = conn_max_age
+        elif modo == 'pool':
+            db['CONN_MAX_AGE'] = 0
+            db['OPTIONS']['pool'] = pool or True
+        else:
+            db['CONN_MAX_AGE'] = conn_max_age
+            if pool:
+                db['OPTIONS']['pool'] = pool
+
+    def request(self, handler, environ):
+        inicio = perf_counter()
+        response = handler(dict(environ, **{'wsgi.input': BytesIO()}), _start_response)
+        for _ in response:
+            pass
+        # Como un servidor WSGI: close() dispara request_finished, que cierra o devuelve la conexión
+        response.close()
+        return perf_counter() - inicio, response.status_code
+
+    def run(self, handler, environs, total, hilos):
+        abiertas = itertools.count()
+        lock = threading.Lock()
+
+        def contar_conexion(sender, connection, **kwargs):
+            with lock:
+                next(abiertas)
+
+        # Calentamiento: URLconf, templates y pool se inicializan fuera de la medición
+        for environ in environs:
+            self.request(handler, environ)
+        connections.close_all()
+
+        turnos = itertools.count()
+
+        def worker():
+            latencias, errores = [], 0
+            try:
+                while (n := next(turnos)) < total:
+                    duracion, status = self.request(handler, environs[n % len(environs)])
+                    latencias.append(duracion)
+                    errores += status >= 400
+            finally:
+                connections.close_all()
+            return latencias, errores
+
+        connection_created.connect(contar_conexion)
+        try:
+            inicio = perf_counter()
+            with ThreadPoolExecutor(max_workers=hilos) as pool:
+                partes = [f.result() for f in [pool.submit(worker) for _ in range(hilos)]]
+            segundos = perf_counter() - inicio
+        finally:
+            connection_created.disconnect(contar_conexion)
+
+        latencias = sorted(itertools.chain.from_iterable(p[0] for p in partes))
+        return {
+            'rps': total / segundos,
+            'p50': statistics.median(latencias) * 1000,
+            'p95': latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))] * 1000,
+            'connections': next(abiertas),
+            'errors': sum(p[1] for p in partes),
+        }
+
+    def report(self, resultados, options):
+        self.stdout.write(
+            f"{options['requests']} requests por modo, {options['threads']} hilos, "
+            f"base {connections[DEFAULT_DB_ALIAS].vendor}"
+        )
+        self.stdout.write(f"{'modo':<12}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'conexiones':>12}{'errores':>9}")
+        base = resultados[0][1]['rps'] if resultados else None
+        for modo, r in resultados:
+            mejora = f"  x{r['rps'] / base:.2f}" if base else ''
+            self.stdout.write(
+                f"{modo:<12}{r['rps']:>10.1f}{r['p50']:>10.2f}{r['p95']:>10.2f}"
+                f"{r['connections']:>12}{r['errors']:>9}{mejora}"
+            )
+        for modo, _ in resultados:
+            self.stdout.write(f"  {modo}: {MODES[modo]}")
+        if any(modo == 'pool' for modo, _ in resultados):
+            self.stdout.write("Con pool, 'conexiones' cuenta las tomadas del pool, no las abiertas contra el servidor.")
@@ -0,0 +1,54 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from administrator.services import invalidate_dashboard_stats
+from users.counters import rebuild_counters
+from users.datagen import BATCH_SIZE, generate_hospital_data, generated_data_exists
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera datos sintéticos (doctores con horarios, pacientes, consultas y recetas) "
+        "con bulk_create por lotes para pruebas de carga. Ejemplo: "
+        "manage.py generate_hospital_data --patients 1000000 --doctors 500 --consultations 5000000"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=1000, help="Cantidad de pacientes")
+        parser.add_argument('--doctors', type=int, default=20, help="Cantidad de doctores (con horarios de lunes a viernes)")
+        parser.add_argument('--consultations', type=int, default=5000, help="Cantidad de consultas")
+        parser.add_argument('--prescription-ratio', type=float, default=0.3,
+                            help="Fracción de consultas atendidas que reciben una receta")
+        parser.add_argument('--seed', type=int, default=42, help="Semilla para obtener siempre los mismos datos")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Filas por INSERT")
+
+    def handle(self, *args, **options):
+        if generated_data_exists():
+            raise CommandError(
+                "La base ya tiene datos generados. Usar una base vacía o ejecutar manage.py flush antes."
+            )
+        if min(options['patients'], options['doctors'], options['consultations'], options['batch_size']) < 0 \
+                or options['batch_size'] == 0:
+            raise CommandError("Las cantidades no pueden ser negativas y el lote debe ser mayor a cero.")
+
+        inicio = time.monotonic()
+        totales = generate_hospital_data(
+            patients=options['patients'],
+            doctors=options['doctors'],
+            consultations=options['consultations'],
+            prescription_ratio=options['prescription_ratio'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            progress=self.progress if options['verbosity'] > 1 else None,
+        )
+        # bulk_create no dispara señales: contadores y estadísticas se recalculan al final
+        rebuild_counters()
+        invalidate_dashboard_stats()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generados {totales['doctors']} doctores, {totales['patients']} pacientes, "
+            f"{totales['consultations']} consultas y {totales['prescriptions']} recetas "
+            f"en {time.monotonic() - inicio:.1f} s."
+        ))
+
+    def progress(self, model, total):
+        self.stdout.write(f"  {model._meta.verbose_name_plural}: {total}")
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from users.events import prune_events
+
+
+class Command(BaseCommand):
+    help = "Borra los eventos del tablero de consultas más viejos que CONSULTATION_EVENTS_RETENTION_HOURS"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, help="Horas de eventos que se conservan")
+
+    def handle(self, *args, **options):
+        horas = options['hours']
+        if horas is None:
+            horas = getattr(settings, 'CONSULTATION_EVENTS_RETENTION_HOURS', 24)
+        if horas < 0:
+            raise CommandError("Las horas deben ser cero o más.")
+        borrados = prune_events(horas)
+        self.stdout.write(self.style.SUCCESS(f"Eventos borrados: {borrados}."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from users.counters import rebuild_counters
+from users.models import ConsultationDailyCount, RecordCount
+
+
+class Command(BaseCommand):
+    help = "Recalcula desde cero los contadores de pacientes, doctores y consultas por día"
+
+    def handle(self, *args, **options):
+        rebuild_counters()
+        totales = dict(RecordCount.objects.values_list('name', 'total'))
+        self.stdout.write(self.style.SUCCESS(
+            f"Contadores reconstruidos: {ConsultationDailyCount.objects.count()} filas diarias, "
+            f"{totales.get('patient', 0)} pacientes, {totales.get('doctor', 0)} doctores."
+        ))
@@ -0,0 +1,28 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from users.wait_times import rollup_wait_times
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcula los percentiles de espera (p50, p90, p99) por día, turno, especialidad y médico "
+        "en WaitTimeRollup. Por defecto recalcula ayer y hoy; pensado para correr periódicamente (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Día a calcular (AAAA-MM-DD); por defecto hoy")
+        parser.add_argument('--days', type=int, default=2, help="Cantidad de días hasta --date inclusive")
+
+    def handle(self, *args, **options):
+        try:
+            hasta = date.fromisoformat(options['date']) if options['date'] else timezone.localdate()
+        except ValueError:
+            raise CommandError("La fecha debe tener el formato AAAA-MM-DD.")
+        if options['days'] <= 0:
+            raise CommandError("La cantidad de días debe ser mayor a cero.")
+        for n in range(options['days'] - 1, -1, -1):
+            fecha = hasta - timedelta(days=n)
+            filas = rollup_wait_times(fecha)
+            self.stdout.write(f"{fecha}: {filas} resúmenes")
+        self.stdout.write(self.style.SUCCESS("Tiempos de espera actualizados."))
@@ -0,0 +1,234 @@
+"""
+Métricas en formato de texto de Prometheus para /metrics.
+Detrás de gunicorn cada worker atiende una parte de los requests y el scrape llega a uno solo,
+así que los contadores de requests y reservas no pueden vivir solo en memoria: cada proceso los
+acumula y cada METRICS_FLUSH_SECONDS los suma con incr atómicos a la caché compartida (Redis con
+REDIS_URL), de donde el scrape lee el total de todos los workers. Sin REDIS_URL la caché es la de
+cada proceso y el total solo es correcto con un único worker.
+Los gauges de colas en espera se leen de WaitingQueueCount, que mantienen las señales, sin
+contar Consultation en cada scrape.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import date
+from django.conf import settings
+from django.core.cache import cache
+from .counters import waiting_gauges
+
+logger = logging.getLogger('hospital.performance')
+
+# Límites (en segundos) de los buckets del histograma de latencia
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Claves en la caché: cada serie tiene su valor (entero, la suma de latencia en microsegundos) y
+# un número de registro; "metrics:series" es la cantidad de series registradas
+SERIES_COUNT_KEY = 'metrics:series'
+
+# Incrementos del proceso que todavía no se sumaron a la caché
+_lock = threading.Lock()
+_requests = {}    # (vista, método, status) -> cantidad
+_latency = {}     # vista -> [conteo por bucket..., suma, cantidad]
+_bookings = {}    # resultado -> cantidad
+_unsent = {}      # (métrica, etiquetas en JSON) -> delta de un flush que falló
+_next_flush = 0.0
+# Series que este proceso ya sabe registradas en la caché
+_registered = set()
+
+
+def observe_request(vista, metodo, status, segundos):
+    """Registra un request atendido y su duración"""
+    with _lock:
+        clave = (vista, metodo, str(status))
+        _requests[clave] = _requests.get(clave, 0) + 1
+        fila = _latency.get(vista)
+        if fila is None:
+            fila = _latency[vista] = [0] * len(LATENCY_BUCKETS) + [0.0, 0]
+        for i, limite in enumerate(LATENCY_BUCKETS):
+            if segundos <= limite:
+                fila[i] += 1
+                break
+        fila[-2] += segundos
+        fila[-1] += 1
+        vencido = time.monotonic() >= _next_flush
+    if vencido:
+        flush_metrics()
+
+
+def count_booking(resultado):
+    """Registra el resultado de un intento de reserva ('ok' o 'conflict')"""
+    with _lock:
+        _bookings[resultado] = _bookings.get(resultado, 0) + 1
+
+
+def _pending_series(requests, latency, bookings):
+    """Incrementos pendientes como {(métrica, etiquetas en JSON): delta entero}"""
+    series = {('requests', json.dumps(clave)): total for clave, total in requests.items()}
+    for vista, fila in latency.items():
+        for i, valor in enumerate(fila):
+            if i == len(fila) - 2:
+                valor = round(valor * 1_000_000)
+            if valor:
+                series[('latency', json.dumps([vista, i]))] = valor
+    for resultado, total in bookings.items():
+        series[('bookings', json.dumps([resultado]))] = total
+    return series
+
+
+def _digest(metrica, serie):
+    return hashlib.sha1(f'{metrica}:{serie}'.encode()).hexdigest()
+
+
+def _incr(clave, delta):
+    try:
+        return cache.incr(clave, delta)
+    except ValueError:
+        # La clave todavía no existe (add no pisa la de otro worker que la creó al mismo tiempo)
+        cache.add(clave, 0, None)
+        return cache.incr(clave, delta)
+
+
+def _register(metrica, serie, digest):
+    """Anota la serie en la lista compartida si ningún worker lo hizo antes"""
+    if cache.add(f'metrics:known:{digest}', 1, None):
+        numero = _incr(SERIES_COUNT_KEY, 1)
+        cache.set(f'metrics:series:{numero}', (metrica, serie), None)
+    _registered.add(digest)
+
+
+def _add_to_series(metrica, serie, delta):
+    digest = _digest(metrica, serie)
+    clave = f'metrics:value:{digest}'
+    if digest in _registered:
+        try:
+            cache.incr(clave, delta)
+            return
+        except ValueError:
+            # La caché se vació o perdió la clave: la serie se vuelve a registrar
+            pass
+    _register(metrica, serie, digest)
+    _incr(clave, delta)
+
+
+def flush_metrics():
+    """Suma a la caché compartida los incrementos pendientes del proceso"""
+    global _requests, _latency, _bookings, _unsent, _next_flush
+    with _lock:
+        series = _pending_series(_requests, _latency, _bookings)
+        for clave, delta in _unsent.items():
+            series[clave] = series.get(clave, 0) + delta
+        _requests, _latency, _bookings, _unsent = {}, {}, {}, {}
+        _next_flush = time.monotonic() + getattr(settings, 'METRICS_FLUSH_SECONDS', 10)
+    pendientes = list(series.items())
+    try:
+        while pendientes:
+            (metrica, serie), delta = pendientes[0]
+            _add_to_series(metrica, serie, delta)
+            pendientes.pop(0)
+    except Exception:
+        # Lo que no se sumó se reintenta en el próximo flush: mejor un total atrasado que un request fallido
+        logger.warning("No se pudieron guardar las métricas de /metrics", exc_info=True)
+        with _lock:
+            for clave, delta in pendientes:
+                _unsent[clave] = _unsent.get(clave, 0) + delta
+
+
+def _shared_series():
+    """Series registradas en la caché: [(métrica, etiquetas en JSON, clave del valor)]"""
+    total = cache.get(SERIES_COUNT_KEY) or 0
+    registradas = cache.get_many([f'metrics:series:{n}' for n in range(1, total + 1)])
+    return [
+        (metrica, serie, f'metrics:value:{_digest(metrica, serie)}')
+        for metrica, serie in registradas.values()
+    ]
+
+
+def reset_metrics():
+    """Vacía los contadores, los del proceso y los compartidos (para pruebas)"""
+    global _next_flush
+    with _lock:
+        _requests.clear()
+        _latency.clear()
+        _bookings.clear()
+        _unsent.clear()
+        _next_flush = 0.0
+        _registered.clear()
+    series = _shared_series()
+    total = cache.get(SERIES_COUNT_KEY) or 0
+    cache.delete_many(
+        [valor for _, _, valor in series]
+        + [f'metrics:known:{_digest(metrica, serie)}' for metrica, serie, _ in series]
+        + [f'metrics:series:{n}' for n in range(1, total + 1)]
+        + [SERIES_COUNT_KEY]
+    )
+
+
+def _shared_metrics():
+    """Contadores de todos los workers: (requests, latency, bookings) como en la memoria del proceso"""
+    series = _shared_series()
+    valores = cache.get_many([valor for _, _, valor in series])
+    requests, latency, bookings = {}, {}, {}
+    for metrica, serie, valor in series:
+        total = valores.get(valor, 0)
+        clave = json.loads(serie)
+        if metrica == 'requests':
+            requests[tuple(clave)] = total
+        elif metrica == 'latency':
+            vista, i = clave
+            fila = latency.setdefault(vista, [0] * len(LATENCY_BUCKETS) + [0.0, 0])
+            fila[i] = total / 1_000_000 if i == len(fila) - 2 else total
+        elif metrica == 'bookings':
+            bookings[clave[0]] = total
+    return requests, latency, bookings
+
+
+def _escape(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def _header(lineas, nombre, tipo, ayuda):
+    lineas.append(f'# HELP {nombre} {ayuda}')
+    lineas.append(f'# TYPE {nombre} {tipo}')
+
+
+def render_metrics(fecha=None):
+    """Texto de exposición de Prometheus (versión 0.0.4)"""
+    # Lo pendiente de este proceso se guarda antes de leer el total compartido
+    flush_metrics()
+    requests, latency, bookings = _shared_metrics()
+
+    lineas = []
+    _header(lineas, 'hospital_http_requests_total', 'counter', 'Requests atendidos por vista, método y status.')
+    for (vista, metodo, status), total in sorted(requests.items()):
+        lineas.append(f'hospital_http_requests_total{_labels(view=vista, method=metodo, status=status)} {total}')
+
+    _header(lineas, 'hospital_http_request_duration_seconds', 'histogram', 'Latencia de los requests por vista.')
+    for vista, fila in sorted(latency.items()):
+        acumulado = 0
+        for limite, cantidad in zip(LATENCY_BUCKETS, fila):
+            acumulado += cantidad
+            lineas.append(f'hospital_http_request_duration_seconds_bucket{_labels(view=vista, le=limite)} {acumulado}')
+        lineas.append(f'hospital_http_request_duration_seconds_bucket{_labels(view=vista, le="+Inf")} {fila[-1]}')
+        lineas.append(f'hospital_http_request_duration_seconds_sum{_labels(view=vista)} {fila[-2]:.6f}')
+        lineas.append(f'hospital_http_request_duration_seconds_count{_labels(view=vista)} {fila[-1]}')
+
+    _header(lineas, 'hospital_bookings_total', 'counter', 'Intentos de reserva de consultas por resultado.')
+    for resultado in ('ok', 'conflict'):
+        lineas.append(f'hospital_bookings_total{_labels(result=resultado)} {bookings.get(resultado, 0)}')
+
+    por_doctor, por_consultorio = waiting_gauges(fecha or date.today())
+    _header(lineas, 'hospital_waiting_consultations', 'gauge', 'Consultas en espera del día por doctor y turno.')
+    for fila in por_doctor:
+        labels = _labels(doctor_id=fila['doctor'], shift=fila['shift'])
+        lineas.append(f'hospital_waiting_consultations{labels} {fila["total"]}')
+    _header(lineas, 'hospital_waiting_consultations_by_room', 'gauge', 'Consultas en espera del día por consultorio.')
+    for fila in por_consultorio:
+        lineas.append(f'hospital_waiting_consultations_by_room{_labels(consultorio=fila["consultorio"])} {fila["total"]}')
+
+    return '\n'.join(lineas) + '\n'
@@ -0,0 +1,192 @@
+import logging
+import os
+import random
+from time import perf_counter
+from django.conf import settings
+from django.http import HttpResponse
+from .db_router import PIN_COOKIE, replica_alias, track_writes
+from .metrics import observe_request
+from .profiling import StackSampler, profile_path, pstats_report, run_cprofile
+from .roles import ROLE_ADMIN, get_user_role
+from .timing import collect_metrics, current_metrics, install_template_timer
+
+logger = logging.getLogger('hospital.performance')
+
+
+class RoleMiddleware:
+    """Resuelve el rol del usuario una vez por request y lo deja en request.role"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.role = get_user_role(request.user)
+        return self.get_response(request)
+
+
+class ReplicaPinMiddleware:
+    """
+    Si el request escribió en la base, deja una cookie que mantiene las lecturas del usuario
+    en la principal durante REPLICA_PIN_SECONDS (ver use_replica en users/db_router.py).
+    Va antes de SessionMiddleware para contar también las escrituras de la sesión (login).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+    def __call__(self, request):
+        if replica_alias() is None:
+            return self.get_response(request)
+        with track_writes() as escritos:
+            response = self.get_response(request)
+        if escritos:
+            response.set_cookie(PIN_COOKIE, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax')
+        return response
+
+
+# Métodos con label propio en /metrics; el resto se agrupa como OTHER para acotar las series
+METRIC_METHODS = {'GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS'}
+
+
+class MetricsMiddleware:
+    """Cuenta todos los requests por vista y status y su latencia para /metrics (users/metrics.py)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        inicio = perf_counter()
+        response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        observe_request(
+            match.view_name if match else 'unmatched',
+            request.method if request.method in METRIC_METHODS else 'OTHER',
+            response.status_code, perf_counter() - inicio,
+        )
+        return response
+
+
+class ServerTimingMiddleware:
+    """
+    Mide una muestra de los requests (SERVER_TIMING_SAMPLE_RATE, o los que traen el header
+    "X-Server-Timing: 1") con SQL, templates, vista y total. El header Server-Timing solo se
+    devuelve a administradores y staff: a los demás no se les muestran tiempos ni cantidad de
+    consultas. Los requests que superan SLOW_REQUEST_MS o SLOW_REQUEST_QUERIES se registran en el
+    logger "hospital.performance"; los no muestreados solo con su duración total.
+    Debe ir primero en MIDDLEWARE para incluir el SQL de sesión y autenticación.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'SERVER_TIMING_SAMPLE_RATE', 0.01)
+        self.slow_ms = getattr(settings, 'SLOW_REQUEST_MS', 500)
+        self.slow_queries = getattr(settings, 'SLOW_REQUEST_QUERIES', 50)
+        self.top_sql = getattr(settings, 'SLOW_REQUEST_TOP_SQL', 5)
+        install_template_timer()
+
+    def __call__(self, request):
+        inicio = perf_counter()
+        if not self.sampled(request):
+            response = self.get_response(request)
+            total_ms = (perf_counter() - inicio) * 1000
+            if total_ms >= self.slow_ms:
+                self.log_slow_request(request, response, None, total_ms)
+            return response
+
+        with collect_metrics(self.top_sql) as metrics:
+            response = self.get_response(request)
+        fin = perf_counter()
+
+        total_ms = (fin - inicio) * 1000
+        view_ms = (fin - metrics.view_started) * 1000 if metrics.view_started else 0.0
+        if self.show_header(request):
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+                f'tpl;dur={metrics.template_time * 1000:.1f}',
+                f'view;dur={view_ms:.1f}',
+                f'total;dur={total_ms:.1f}',
+            ])
+        if total_ms >= self.slow_ms or metrics.queries >= self.slow_queries:
+            self.log_slow_request(request, response, metrics, total_ms)
+        return response
+
+    def sampled(self, request):
+        if request.headers.get('X-Server-Timing') == '1':
+            return True
+        return self.sample_rate >= 1 or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def show_header(self, request):
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return False
+        return user.is_staff or user.is_superuser or getattr(request, 'role', None) == ROLE_ADMIN
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = current_metrics()
+        if metrics is not None:
+            metrics.view_started = perf_counter()
+        return None
+
+    def log_slow_request(self, request, response, metrics, total_ms):
+        match = getattr(request, 'resolver_match', None)
+        vista = match.view_name if match else '-'
+        if metrics is None:
+            logger.warning(
+                "Request lento %s %s vista=%s status=%s total=%.1fms (sin muestrear)",
+                request.method, request.path, vista, response.status_code, total_ms,
+            )
+            return
+        lineas = [
+            f'  {duracion * 1000:.1f} ms  {sql}' for duracion, sql in metrics.slowest_queries()
+        ]
+        logger.warning(
+            "Request lento %s %s vista=%s status=%s total=%.1fms sql=%.1fms/%d consultas tpl=%.1fms\n%s",
+            request.method, request.path, vista, response.status_code, total_ms,
+            metrics.db_time * 1000, metrics.queries, metrics.template_time * 1000,
+            '\n'.join(lineas),
+        )
+
+
+class ProfilingMiddleware:
+    """
+    Perfila un request a pedido de un administrador con ?_profile=1 o el header "X-Profile: 1"
+    (cProfile) o con el valor "sample" (muestreo de pila, menos overhead). El perfil se guarda
+    en PROFILE_DIR (.prof para pstats/snakeviz, .collapsed para flamegraph) y la respuesta
+    se reemplaza por el reporte. Va después de RoleMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'PROFILING_ENABLED', True)
+        self.directory = getattr(settings, 'PROFILE_DIR', 'profiles')
+        self.interval = getattr(settings, 'PROFILE_SAMPLE_INTERVAL', 0.005)
+
+    def __call__(self, request):
+        modo = request.GET.get('_profile') or request.headers.get('X-Profile')
+        if not modo or not self.enabled or not self.allowed(request):
+            return self.get_response(request)
+
+        if modo == 'sample':
+            with StackSampler(interval=self.interval) as sampler:
+                response = self.get_response(request)
+            ruta = profile_path(self.directory, request.path, 'collapsed')
+            reporte = sampler.collapsed()
+            with open(ruta, 'w', encoding='utf-8') as f:
+                f.write(reporte)
+        else:
+            response, profiler = run_cprofile(self.get_response, request)
+            ruta = profile_path(self.directory, request.path, 'prof')
+            profiler.dump_stats(ruta)
+            reporte = pstats_report(profiler)
+
+        cabecera = f"# {request.method} {request.get_full_path()} -> {response.status_code}\n# Guardado en {ruta}\n\n"
+        perfil = HttpResponse(cabecera + reporte, content_type='text/plain; charset=utf-8')
+        perfil['X-Profile-File'] = os.path.basename(ruta)
+        return perfil
+
+    def allowed(self, request):
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return False
+        return user.is_superuser or getattr(request, 'role', None) == ROLE_ADMIN
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:04
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def renumber_duplicate_orders(apps, schema_editor):
+    """Renumera las colas que tienen órdenes repetidos antes de crear la restricción única"""
+    Consultation = apps.get_model('users', 'Consultation')
+    duplicados = (
+        Consultation.objects.values('doctor', 'date', 'shift', 'order')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1, doctor__isnull=False)
+        .values_list('doctor', 'date', 'shift')
+        .distinct()
+    )
+    for doctor_id, fecha, turno in set(duplicados):
+        consultas = Consultation.objects.filter(
+            doctor_id=doctor_id, date=fecha, shift=turno
+        ).order_by('order', 'time', 'id')
+        for numero, consulta in enumerate(consultas, start=1):
+            if consulta.order != numero:
+                consulta.order = numero
+                consulta.save(update_fields=['order'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_alter_consultation_options'),
+    ]
+
+    operations = [
+        migrations.RunPython(renumber_duplicate_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_renumber_duplicate_queue_orders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueueSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('shift', models.CharField(choices=[('MAÑANA', 'Mañana'), ('TARDE', 'Tarde'), ('NOCHE', 'Noche')], max_length=10, verbose_name='Turno')),
+                ('last_order', models.PositiveIntegerField(default=0, verbose_name='Último orden')),
+            ],
+            options={
+                'verbose_name': 'Secuencia de Cola',
+                'verbose_name_plural': 'Secuencias de Cola',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='consultation',
+            constraint=models.UniqueConstraint(fields=('doctor', 'date', 'shift', 'order'), name='unique_consultation_queue_order'),
+        ),
+        migrations.AddField(
+            model_name='queuesequence',
+            name='doctor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='queue_sequences', to='users.doctor'),
+        ),
+        migrations.AddConstraint(
+            model_name='queuesequence',
+            constraint=models.UniqueConstraint(fields=('doctor', 'date', 'shift'), name='unique_queue_sequence'),
+        ),
+    ]
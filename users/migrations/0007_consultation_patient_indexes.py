@@ -0,0 +1,78 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:05
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_double_bookings(apps, schema_editor):
+    """
+    La restricción única no se puede crear si hay dos consultas activas del mismo doctor en el mismo
+    horario. No se cancela ninguna automáticamente: la migración se detiene con la lista de ids para
+    que el personal resuelva cada caso (y avise a los pacientes) antes de volver a migrar.
+    """
+    Consultation = apps.get_model('users', 'Consultation')
+    duplicados = (
+        Consultation.objects.exclude(status='CANCELADA')
+        .filter(doctor__isnull=False)
+        .values('doctor', 'date', 'time')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+        .values_list('doctor', 'date', 'time')
+    )
+    conflictos = []
+    for doctor_id, fecha, hora in sorted(set(duplicados)):
+        ids = list(
+            Consultation.objects.exclude(status='CANCELADA')
+            .filter(doctor_id=doctor_id, date=fecha, time=hora)
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+        conflictos.append(f"doctor {doctor_id} el {fecha} a las {hora}: consultas {', '.join(map(str, ids))}")
+    if conflictos:
+        raise RuntimeError(
+            "Hay consultas activas en el mismo horario del mismo doctor. Cancele o reagende todas menos "
+            "una en cada grupo y vuelva a ejecutar migrate:\n" + "\n".join(conflictos)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_queue_sequence'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_double_bookings, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['date', 'shift', 'order'], name='consultation_date_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['status', 'date', 'time'], name='consultation_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['doctor', 'status', 'date'], name='consultation_doctor_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctorschedule',
+            index=models.Index(fields=['doctor', 'day', 'start_time'], name='schedule_doctor_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctorschedule',
+            index=models.Index(fields=['day', 'consultorio', 'start_time'], name='schedule_day_room_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['first_name', 'last_name'], name='patient_first_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['last_name', 'first_name'], name='patient_last_name_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='consultation',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'CANCELADA'), _negated=True), fields=('doctor', 'date', 'time'), name='unique_consultation_doctor_slot', violation_error_message='El horario seleccionado ya está ocupado.'),
+        ),
+    ]
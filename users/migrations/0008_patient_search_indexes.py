@@ -0,0 +1,42 @@
+from django.db import migrations
+
+
+# Índices de búsqueda de pacientes, solo en PostgreSQL (en SQLite se usan las búsquedas sin índice)
+# El prefijo de CI (LIKE 'x%') ya usa el índice "_like" varchar_pattern_ops que Django crea
+# para campos CharField únicos; aquí solo se agregan los índices trigram de nombre y apellido.
+CREATE_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    # icontains se traduce a UPPER(campo::text) LIKE UPPER('%x%'), el índice debe usar la misma expresión
+    "CREATE INDEX IF NOT EXISTS patient_first_name_trgm_idx ON users_patient USING gin ((UPPER(first_name::text)) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS patient_last_name_trgm_idx ON users_patient USING gin ((UPPER(last_name::text)) gin_trgm_ops)",
+]
+
+DROP_SQL = [
+    "DROP INDEX IF EXISTS patient_last_name_trgm_idx",
+    "DROP INDEX IF EXISTS patient_first_name_trgm_idx",
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_consultation_patient_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
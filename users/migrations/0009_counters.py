@@ -0,0 +1,63 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counters(apps, schema_editor):
+    """Carga inicial de los contadores (equivale a manage.py rebuild_counters)"""
+    Consultation = apps.get_model('users', 'Consultation')
+    ConsultationDailyCount = apps.get_model('users', 'ConsultationDailyCount')
+    RecordCount = apps.get_model('users', 'RecordCount')
+    ConsultationDailyCount.objects.bulk_create([
+        ConsultationDailyCount(
+            date=fila['date'], specialty_id=fila['doctor__specialty'],
+            status=fila['status'], total=fila['total']
+        )
+        for fila in Consultation.objects.order_by()
+        .values('date', 'doctor__specialty', 'status')
+        .annotate(total=Count('id'))
+    ], batch_size=1000)
+    RecordCount.objects.bulk_create([
+        RecordCount(name=name, total=apps.get_model('users', model).objects.count())
+        for name, model in (('patient', 'Patient'), ('doctor', 'Doctor'), ('consultation', 'Consultation'))
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_patient_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=30, unique=True, verbose_name='Nombre')),
+                ('total', models.IntegerField(default=0, verbose_name='Total')),
+            ],
+            options={
+                'verbose_name': 'Conteo de Registros',
+                'verbose_name_plural': 'Conteos de Registros',
+            },
+        ),
+        migrations.CreateModel(
+            name='ConsultationDailyCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('status', models.CharField(choices=[('EN ESPERA', 'En espera'), ('ATENDIDO', 'Atendido'), ('CANCELADA', 'Cancelada')], max_length=15, verbose_name='Estado')),
+                ('total', models.IntegerField(default=0, verbose_name='Total')),
+                ('specialty', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='users.specialty', verbose_name='Especialidad')),
+            ],
+            options={
+                'verbose_name': 'Conteo Diario de Consultas',
+                'verbose_name_plural': 'Conteos Diarios de Consultas',
+                'constraints': [models.UniqueConstraint(fields=('date', 'specialty', 'status'), name='unique_consultation_daily_count')],
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
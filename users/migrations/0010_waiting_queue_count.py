@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_waiting_counts(apps, schema_editor):
+    """Carga inicial de las colas en espera (equivale a manage.py rebuild_counters)"""
+    Consultation = apps.get_model('users', 'Consultation')
+    WaitingQueueCount = apps.get_model('users', 'WaitingQueueCount')
+    WaitingQueueCount.objects.bulk_create([
+        WaitingQueueCount(
+            date=fila['date'], doctor_id=fila['doctor'], shift=fila['shift'],
+            consultorio=fila['consultorio'], total=fila['total']
+        )
+        for fila in Consultation.objects.filter(status='EN ESPERA', doctor__isnull=False).order_by()
+        .values('date', 'doctor', 'shift', 'consultorio')
+        .annotate(total=Count('id'))
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitingQueueCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('shift', models.CharField(choices=[('MAÑANA', 'Mañana'), ('TARDE', 'Tarde'), ('NOCHE', 'Noche')], max_length=10, verbose_name='Turno')),
+                ('consultorio', models.CharField(default='', max_length=10, verbose_name='Consultorio')),
+                ('total', models.IntegerField(default=0, verbose_name='Total')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waiting_counts', to='users.doctor', verbose_name='Médico')),
+            ],
+            options={
+                'verbose_name': 'Conteo de Cola en Espera',
+                'verbose_name_plural': 'Conteos de Colas en Espera',
+                'constraints': [models.UniqueConstraint(fields=('date', 'doctor', 'shift', 'consultorio'), name='unique_waiting_queue_count')],
+            },
+        ),
+        migrations.RunPython(populate_waiting_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_waiting_queue_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsultationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('consultation_id', models.BigIntegerField(verbose_name='Consulta')),
+                ('action', models.CharField(choices=[('created', 'Creada'), ('updated', 'Actualizada'), ('deleted', 'Eliminada')], max_length=10, verbose_name='Acción')),
+                ('data', models.JSONField(verbose_name='Datos')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Fecha')),
+            ],
+            options={
+                'verbose_name': 'Evento de Consulta',
+                'verbose_name_plural': 'Eventos de Consultas',
+            },
+        ),
+    ]
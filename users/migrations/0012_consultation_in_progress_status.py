@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_consultation_event'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='consultation',
+            name='status',
+            field=models.CharField(choices=[('EN ESPERA', 'En espera'), ('EN CONSULTA', 'En consulta'), ('ATENDIDO', 'Atendido'), ('CANCELADA', 'Cancelada')], default='EN ESPERA', max_length=15, verbose_name='Estado'),
+        ),
+        migrations.AlterField(
+            model_name='consultationdailycount',
+            name='status',
+            field=models.CharField(choices=[('EN ESPERA', 'En espera'), ('EN CONSULTA', 'En consulta'), ('ATENDIDO', 'Atendido'), ('CANCELADA', 'Cancelada')], max_length=15, verbose_name='Estado'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_consultation_in_progress_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsultationStatusEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('consultation_id', models.BigIntegerField(verbose_name='Consulta')),
+                ('event', models.CharField(choices=[('created', 'Agendada'), ('called', 'Llamada'), ('attended', 'Atendida'), ('cancelled', 'Cancelada'), ('requeued', 'Vuelta a espera')], max_length=10, verbose_name='Evento')),
+                ('occurred_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Momento')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('scheduled_time', models.TimeField(verbose_name='Hora agendada')),
+                ('shift', models.CharField(choices=[('MAÑANA', 'Mañana'), ('TARDE', 'Tarde'), ('NOCHE', 'Noche')], max_length=10, verbose_name='Turno')),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+                ('doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='users.doctor', verbose_name='Médico')),
+                ('specialty', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='users.specialty', verbose_name='Especialidad')),
+            ],
+            options={
+                'verbose_name': 'Evento de Estado de Consulta',
+                'verbose_name_plural': 'Eventos de Estado de Consultas',
+                'indexes': [models.Index(fields=['date', 'occurred_at'], name='status_event_date_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WaitTimeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('level', models.CharField(choices=[('day', 'Día'), ('shift', 'Turno'), ('specialty', 'Especialidad y turno'), ('doctor', 'Médico y turno')], max_length=10, verbose_name='Agrupación')),
+                ('shift', models.CharField(blank=True, default='', max_length=10, verbose_name='Turno')),
+                ('count', models.IntegerField(verbose_name='Pacientes')),
+                ('p50', models.FloatField(verbose_name='p50 (min)')),
+                ('p90', models.FloatField(verbose_name='p90 (min)')),
+                ('p99', models.FloatField(verbose_name='p99 (min)')),
+                ('mean', models.FloatField(verbose_name='Promedio (min)')),
+                ('max', models.FloatField(verbose_name='Máximo (min)')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='Calculado')),
+                ('doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='users.doctor', verbose_name='Médico')),
+                ('specialty', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='users.specialty', verbose_name='Especialidad')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Tiempos de Espera',
+                'verbose_name_plural': 'Resúmenes de Tiempos de Espera',
+                'indexes': [models.Index(fields=['level', 'date'], name='wait_rollup_level_date_idx')],
+            },
+        ),
+    ]
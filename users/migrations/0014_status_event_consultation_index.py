@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_consultation_status_events'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consultationstatusevent',
+            index=models.Index(fields=['consultation_id', 'event'], name='status_event_consultation_idx'),
+        ),
+    ]
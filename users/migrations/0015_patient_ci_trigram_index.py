@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+# Índice trigram del número de identificación, solo en PostgreSQL: la búsqueda por dígitos usa
+# icontains (UPPER(identification_number::text) LIKE UPPER('%x%')), que el índice "_like" del
+# campo único no puede servir porque el patrón no está anclado al inicio
+CREATE_SQL = (
+    "CREATE INDEX IF NOT EXISTS patient_identification_number_trgm_idx "
+    "ON users_patient USING gin ((UPPER(identification_number::text)) gin_trgm_ops)"
+)
+
+DROP_SQL = "DROP INDEX IF EXISTS patient_identification_number_trgm_idx"
+
+
+def create_ci_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_SQL)
+
+
+def drop_ci_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_status_event_consultation_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_ci_index, drop_ci_index),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+# El total de consultas ya no se lleva en RecordCount (ver consultation_total en users/counters.py):
+# la fila quedaría congelada en el valor de este momento
+def drop_consultation_count(apps, schema_editor):
+    RecordCount = apps.get_model('users', 'RecordCount')
+    RecordCount.objects.filter(name='consultation').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0015_patient_ci_trigram_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_consultation_count, migrations.RunPython.noop),
+    ]
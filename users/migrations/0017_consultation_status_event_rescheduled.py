@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0016_drop_consultation_record_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='consultationstatusevent',
+            name='event',
+            field=models.CharField(choices=[('created', 'Agendada'), ('called', 'Llamada'), ('attended', 'Atendida'), ('cancelled', 'Cancelada'), ('requeued', 'Vuelta a espera'), ('rescheduled', 'Reagendada')], max_length=12, verbose_name='Evento'),
+        ),
+    ]
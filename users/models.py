@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
+from django.utils import timezone
 
 class Specialty(models.Model):
     """Modelo para especialidades médicas"""
@@ -71,6 +72,14 @@ class Users(AbstractUser):
     def __str__(self):
         return self.username
 
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # Usuario cargado por LeanModelBackend: el primer campo diferido que se usa trae a todos
+        if fields is not None and getattr(self, '_load_deferred_together', False):
+            diferidos = self.get_deferred_fields()
+            if diferidos and set(fields) <= diferidos:
+                fields = list(diferidos)
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
 
 
 
@@ -232,6 +241,11 @@ class Patient(models.Model):
         verbose_name = "Paciente"
         verbose_name_plural = "Pacientes"
         ordering = ['-created_at']
+        indexes = [
+            # Ordenamiento por nombre y apellido del listado de pacientes
+            models.Index(fields=['first_name', 'last_name'], name='patient_first_name_idx'),
+            models.Index(fields=['last_name', 'first_name'], name='patient_last_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} - {self.identification_number}"
@@ -313,6 +327,8 @@ class Consultation(models.Model):
     # Opciones de estado
     status_choices = (
         ("EN ESPERA", "En espera"),
+        # Llamada por el doctor (ver doctors/services.py: call_next_consultation)
+        ("EN CONSULTA", "En consulta"),
         ("ATENDIDO", "Atendido"),
         ("CANCELADA", "Cancelada"),
     )
@@ -339,12 +355,211 @@ class Consultation(models.Model):
         verbose_name = "Consulta"
         verbose_name_plural = "Consultas"
         ordering = ['time']
+        constraints = [
+            # Un número de orden por doctor, fecha y turno
+            models.UniqueConstraint(
+                fields=['doctor', 'date', 'shift', 'order'],
+                name='unique_consultation_queue_order'
+            ),
+            # Un solo paciente por doctor, fecha y hora (las canceladas liberan el horario)
+            models.UniqueConstraint(
+                fields=['doctor', 'date', 'time'],
+                condition=~models.Q(status='CANCELADA'),
+                name='unique_consultation_doctor_slot',
+                violation_error_message="El horario seleccionado ya está ocupado."
+            ),
+        ]
+        indexes = [
+            # Agenda de recepción ordenada por fecha, turno y orden
+            models.Index(fields=['date', 'shift', 'order'], name='consultation_date_queue_idx'),
+            # Historial y conteos por estado y fecha
+            models.Index(fields=['status', 'date', 'time'], name='consultation_status_date_idx'),
+            # Pacientes en espera e historial de cada doctor
+            models.Index(fields=['doctor', 'status', 'date'], name='consultation_doctor_status_idx'),
+        ]
 
     def __str__(self):
         return f"Consulta de {self.patient.full_name} con {self.doctor} el {self.date} a las {self.time}"
 
 
 
+# Contador de la cola de atención por doctor, fecha y turno
+class QueueSequence(models.Model):
+    """Último número de orden asignado en la cola de un doctor para una fecha y turno"""
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='queue_sequences')
+    date = models.DateField(verbose_name="Fecha")
+    shift = models.CharField(max_length=10, choices=Consultation.shift_choices, verbose_name="Turno")
+    last_order = models.PositiveIntegerField(default=0, verbose_name="Último orden")
+
+    class Meta:
+        verbose_name = "Secuencia de Cola"
+        verbose_name_plural = "Secuencias de Cola"
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'date', 'shift'], name='unique_queue_sequence'),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor} - {self.date} {self.shift}: {self.last_order}"
+
+
+# Contadores desnormalizados para dashboards y reportes
+class ConsultationDailyCount(models.Model):
+    """Cantidad de consultas por día, especialidad del doctor y estado"""
+    date = models.DateField(verbose_name="Fecha")
+    specialty = models.ForeignKey(Specialty, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Especialidad")
+    status = models.CharField(max_length=15, choices=Consultation.status_choices, verbose_name="Estado")
+    total = models.IntegerField(default=0, verbose_name="Total")
+
+    class Meta:
+        verbose_name = "Conteo Diario de Consultas"
+        verbose_name_plural = "Conteos Diarios de Consultas"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'specialty', 'status'], name='unique_consultation_daily_count'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.specialty} {self.status}: {self.total}"
+
+
+class WaitingQueueCount(models.Model):
+    """Consultas en espera por fecha, doctor, turno y consultorio (gauges de /metrics)"""
+    date = models.DateField(verbose_name="Fecha")
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='waiting_counts', verbose_name="Médico")
+    shift = models.CharField(max_length=10, choices=Consultation.shift_choices, verbose_name="Turno")
+    consultorio = models.CharField(max_length=10, default="", verbose_name="Consultorio")
+    total = models.IntegerField(default=0, verbose_name="Total")
+
+    class Meta:
+        verbose_name = "Conteo de Cola en Espera"
+        verbose_name_plural = "Conteos de Colas en Espera"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'doctor', 'shift', 'consultorio'], name='unique_waiting_queue_count'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.doctor} {self.shift} {self.consultorio}: {self.total}"
+
+
+class RecordCount(models.Model):
+    """Cantidad total de registros de una tabla (pacientes, doctores)"""
+    name = models.CharField(max_length=30, unique=True, verbose_name="Nombre")
+    total = models.IntegerField(default=0, verbose_name="Total")
+
+    class Meta:
+        verbose_name = "Conteo de Registros"
+        verbose_name_plural = "Conteos de Registros"
+
+    def __str__(self):
+        return f"{self.name}: {self.total}"
+
+
+class ConsultationEvent(models.Model):
+    """Alta, cambio o baja de una consulta, para el tablero de recepción en tiempo real (users/events.py)"""
+    action_choices = (
+        ("created", "Creada"),
+        ("updated", "Actualizada"),
+        ("deleted", "Eliminada"),
+    )
+    # Sin ForeignKey: el evento de baja sobrevive a la consulta
+    consultation_id = models.BigIntegerField(verbose_name="Consulta")
+    action = models.CharField(max_length=10, choices=action_choices, verbose_name="Acción")
+    data = models.JSONField(verbose_name="Datos")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Fecha")
+
+    class Meta:
+        verbose_name = "Evento de Consulta"
+        verbose_name_plural = "Eventos de Consultas"
+
+    def __str__(self):
+        return f"{self.id} {self.action} consulta {self.consultation_id}"
+
+
+class ConsultationStatusEvent(models.Model):
+    """
+    Registro de solo inserción de los cambios de estado de una consulta, con momento y usuario,
+    para medir tiempos de espera (users/wait_times.py). Guarda la cola de la consulta en ese momento.
+    """
+    event_choices = (
+        ("created", "Agendada"),
+        ("called", "Llamada"),
+        ("attended", "Atendida"),
+        ("cancelled", "Cancelada"),
+        ("requeued", "Vuelta a espera"),
+        ("rescheduled", "Reagendada"),
+    )
+    # Sin ForeignKey: el registro sobrevive a la consulta
+    consultation_id = models.BigIntegerField(verbose_name="Consulta")
+    event = models.CharField(max_length=12, choices=event_choices, verbose_name="Evento")
+    occurred_at = models.DateTimeField(default=timezone.now, verbose_name="Momento")
+    actor = models.ForeignKey(
+        Users, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="Usuario"
+    )
+    date = models.DateField(verbose_name="Fecha")
+    scheduled_time = models.TimeField(verbose_name="Hora agendada")
+    shift = models.CharField(max_length=10, choices=Consultation.shift_choices, verbose_name="Turno")
+    doctor = models.ForeignKey(
+        Doctor, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="Médico"
+    )
+    specialty = models.ForeignKey(
+        Specialty, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="Especialidad"
+    )
+
+    class Meta:
+        verbose_name = "Evento de Estado de Consulta"
+        verbose_name_plural = "Eventos de Estado de Consultas"
+        indexes = [
+            # El cálculo de percentiles lee los eventos de un día de consultas
+            models.Index(fields=['date', 'occurred_at'], name='status_event_date_idx'),
+            # La cola de triage busca el alta de cada consulta en espera (users/triage.py)
+            models.Index(fields=['consultation_id', 'event'], name='status_event_consultation_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Los eventos de estado no se modifican")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.occurred_at} {self.event} consulta {self.consultation_id}"
+
+
+class WaitTimeRollup(models.Model):
+    """
+    Percentiles de espera de un día (minutos hasta que el doctor llama al paciente), calculados por
+    el comando rollup_wait_times. Los reportes leen esta tabla y nunca los eventos.
+    """
+    level_choices = (
+        ("day", "Día"),
+        ("shift", "Turno"),
+        ("specialty", "Especialidad y turno"),
+        ("doctor", "Médico y turno"),
+    )
+    date = models.DateField(verbose_name="Fecha")
+    level = models.CharField(max_length=10, choices=level_choices, verbose_name="Agrupación")
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Médico")
+    specialty = models.ForeignKey(Specialty, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Especialidad")
+    shift = models.CharField(max_length=10, blank=True, default="", verbose_name="Turno")
+    count = models.IntegerField(verbose_name="Pacientes")
+    p50 = models.FloatField(verbose_name="p50 (min)")
+    p90 = models.FloatField(verbose_name="p90 (min)")
+    p99 = models.FloatField(verbose_name="p99 (min)")
+    mean = models.FloatField(verbose_name="Promedio (min)")
+    max = models.FloatField(verbose_name="Máximo (min)")
+    computed_at = models.DateTimeField(auto_now=True, verbose_name="Calculado")
+
+    class Meta:
+        verbose_name = "Resumen de Tiempos de Espera"
+        verbose_name_plural = "Resúmenes de Tiempos de Espera"
+        indexes = [
+            models.Index(fields=['level', 'date'], name='wait_rollup_level_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.level}: p50 {self.p50:.1f} min"
+
+
 # TABLA RECETAS
 class Prescription(models.Model):
     """Modelo para recetas médicas"""
@@ -396,6 +611,12 @@ class DoctorSchedule(models.Model):
         verbose_name = "Horario de Doctor"
         verbose_name_plural = "Horarios de Doctores"
         ordering = ['doctor', 'day', 'start_time']
+        indexes = [
+            # Horarios del doctor por día
+            models.Index(fields=['doctor', 'day', 'start_time'], name='schedule_doctor_day_idx'),
+            # Validación de solapamiento de consultorios
+            models.Index(fields=['day', 'consultorio', 'start_time'], name='schedule_day_room_idx'),
+        ]
 
     def __str__(self):
         return f"{self.doctor} - {self.day} {self.start_time} a {self.end_time} ({self.consultorio})"
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""
+Perfilado de un request a pedido (ver ProfilingMiddleware en users/middleware.py).
+- cProfile: estadísticas exactas por función, se guardan como volcado de pstats.
+- Muestreo: un hilo toma la pila del request cada pocos milisegundos; el resultado se guarda
+  en formato "collapsed stacks" (una línea "a;b;c cantidad" por pila) listo para flamegraph.pl
+  o speedscope, con mucho menos overhead que cProfile.
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+
+# Funciones mostradas en el reporte de texto de cProfile
+REPORT_LIMIT = 40
+
+
+class StackSampler:
+    """Muestrea la pila de un hilo a intervalos fijos mientras está activo (usar con `with`)"""
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            pila = []
+            while frame is not None:
+                codigo = frame.f_code
+                pila.append(f'{os.path.basename(codigo.co_filename)}:{codigo.co_name}')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(pila))] += 1
+
+    def collapsed(self):
+        """Texto en formato collapsed stacks"""
+        return ''.join(f'{pila} {cantidad}\n' for pila, cantidad in self.stacks.most_common())
+
+
+def run_cprofile(func, *args, **kwargs):
+    """Ejecuta func bajo cProfile. Devuelve (resultado, profiler)"""
+    profiler = cProfile.Profile()
+    resultado = profiler.runcall(func, *args, **kwargs)
+    return resultado, profiler
+
+
+def pstats_report(profiler, sort='cumulative', limit=REPORT_LIMIT):
+    salida = io.StringIO()
+    pstats.Stats(profiler, stream=salida).strip_dirs().sort_stats(sort).print_stats(limit)
+    return salida.getvalue()
+
+
+def profile_path(directorio, nombre, extension):
+    """Ruta para guardar un perfil: <directorio>/<fecha-hora>_<ruta del request>.<extensión>"""
+    os.makedirs(directorio, exist_ok=True)
+    limpio = ''.join(c if c.isalnum() or c in '-_' else '_' for c in nombre)
+    return os.path.join(directorio, f"{datetime.now():%Y%m%d-%H%M%S-%f}_{limpio}.{extension}")
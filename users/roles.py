@@ -0,0 +1,91 @@
+from functools import wraps
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.shortcuts import redirect
+
+# Roles del sistema, en el orden de prioridad del dashboard general
+ROLE_DOCTOR = 'doctor'
+ROLE_RECEPTION = 'reception'
+ROLE_ADMIN = 'admin'
+
+# Perfil que da cada rol, en el mismo orden de prioridad
+ROLE_PROFILES = (
+    ('doctor', ROLE_DOCTOR),
+    ('receptions', ROLE_RECEPTION),
+    ('administrator', ROLE_ADMIN),
+)
+
+
+def _cache_key(user_id):
+    return f'user_role:{user_id}'
+
+
+def role_from_profiles(*perfiles):
+    """Rol según los ids de perfil (o None) en el orden de ROLE_PROFILES"""
+    for perfil, (_, role) in zip(perfiles, ROLE_PROFILES):
+        if perfil is not None:
+            return role
+    return None
+
+
+def resolve_role(user_id):
+    """Obtiene el rol del usuario con una sola consulta (LEFT JOIN a los tres perfiles)"""
+    from .models import Users
+    perfiles = Users.objects.filter(pk=user_id).values_list(*(campo for campo, _ in ROLE_PROFILES)).first()
+    if not perfiles:
+        return None
+    return role_from_profiles(*perfiles)
+
+
+def get_user_role(user):
+    """
+    Rol del usuario. LeanModelBackend lo trae junto con request.user (users/backends.py); si no,
+    se resuelve con una consulta. Solo se guarda en la caché si ROLE_CACHE_TIMEOUT > 0, que por
+    defecto es solo con REDIS_URL: con una caché por proceso, un rol quitado en un worker seguiría
+    vigente en los demás.
+    """
+    if not user.is_authenticated:
+        return None
+    if hasattr(user, 'loaded_role'):
+        return user.loaded_role
+    timeout = getattr(settings, 'ROLE_CACHE_TIMEOUT', 0)
+    if not timeout:
+        return resolve_role(user.pk)
+    role = cache.get(_cache_key(user.pk))
+    if role is None:
+        role = resolve_role(user.pk) or ''
+        cache.set(_cache_key(user.pk), role, timeout)
+    return role or None
+
+
+def invalidate_user_role(user_id):
+    """Borra el rol guardado; se llama cuando cambian los perfiles del usuario"""
+    cache.delete(_cache_key(user_id))
+
+
+def request_role(request):
+    """Rol del request (resuelto por RoleMiddleware, o calculado si el middleware no está activo)"""
+    if not hasattr(request, 'role'):
+        request.role = get_user_role(request.user)
+    return request.role
+
+
+def role_required(*roles, perm=None, message='No tienes permisos para acceder a esta sección.', ajax=False):
+    """
+    Restringe una vista a uno o más roles (y opcionalmente a un permiso).
+    Sin permiso redirige al dashboard con un mensaje, o responde 403 en JSON si `ajax=True`.
+    Se usa debajo de @login_required.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request_role(request) not in roles or (perm and not request.user.has_perm(perm)):
+                if ajax:
+                    return JsonResponse({'success': False, 'error': 'Sin permisos'}, status=403)
+                messages.error(request, message)
+                return redirect('dashboard')
+            return view_func(request, *args, **kwargs)
+        return _wrapped_view
+    return decorator
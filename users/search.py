@@ -0,0 +1,38 @@
+from django.db.models import Q
+from .models import Patient
+
+# Cantidad máxima de sugerencias del buscador de pacientes
+TYPEAHEAD_LIMIT = 10
+
+
+def patient_search_q(query, prefix=''):
+    """
+    Filtro de búsqueda de pacientes.
+    - Solo dígitos: cualquier parte del número de identificación (índice trigram en PostgreSQL).
+    - Texto: cada palabra debe aparecer en el nombre o el apellido (índices trigram en PostgreSQL).
+    `prefix` permite aplicarlo desde otra tabla, por ejemplo 'patient__' para consultas.
+    """
+    query = query.strip()
+    if not query:
+        return Q()
+    if query.isdigit():
+        return Q(**{f'{prefix}identification_number__icontains': query})
+    filtro = Q()
+    for palabra in query.split():
+        filtro &= (
+            Q(**{f'{prefix}first_name__icontains': palabra})
+            | Q(**{f'{prefix}last_name__icontains': palabra})
+        )
+    return filtro
+
+
+def search_patients(query, limit=TYPEAHEAD_LIMIT):
+    """Sugerencias de pacientes para el buscador (solo los campos necesarios)"""
+    if not query.strip():
+        return []
+    orden = ('identification_number',) if query.strip().isdigit() else ('last_name', 'first_name')
+    return list(
+        Patient.objects.filter(patient_search_q(query))
+        .order_by(*orden)
+        .values('id', 'identification_number', 'first_name', 'last_name')[:limit]
+    )
@@ -0,0 +1,98 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Users, Doctor, Receptions, Administrator, Patient, Consultation
+from .roles import invalidate_user_role
+from .events import record_consultation_event
+from .counters import (
+    add_to_daily_count, add_to_record_count, add_to_waiting_count, consultation_counter_key, waiting_counter_key,
+)
+
+
+# Cualquier alta o baja de perfil cambia el rol del usuario
+@receiver([post_save, post_delete], sender=Doctor)
+@receiver([post_save, post_delete], sender=Receptions)
+@receiver([post_save, post_delete], sender=Administrator)
+def invalidate_role_on_profile_change(sender, instance, **kwargs):
+    invalidate_user_role(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Users)
+def invalidate_role_on_user_change(sender, instance, **kwargs):
+    invalidate_user_role(instance.pk)
+
+
+# Contadores desnormalizados (ver users/counters.py y el comando rebuild_counters).
+# Los cambios hechos con QuerySet.update() o bulk_create() no pasan por aquí.
+@receiver(post_save, sender=Patient)
+@receiver(post_save, sender=Doctor)
+def count_record_created(sender, created, **kwargs):
+    if created:
+        add_to_record_count(sender._meta.model_name, 1)
+
+
+@receiver(post_delete, sender=Patient)
+@receiver(post_delete, sender=Doctor)
+def count_record_deleted(sender, **kwargs):
+    add_to_record_count(sender._meta.model_name, -1)
+
+
+@receiver(pre_save, sender=Consultation)
+def remember_consultation_counter_key(sender, instance, **kwargs):
+    # Claves de los contadores antes de guardar, para mover los conteos si cambian
+    instance._old_counter_key = None
+    instance._old_waiting_key = None
+    if instance.pk:
+        anterior = Consultation.objects.filter(pk=instance.pk).values_list(
+            'date', 'doctor', 'doctor__specialty', 'status', 'shift', 'consultorio'
+        ).first()
+        if anterior:
+            fecha, doctor_id, specialty_id, status, shift, consultorio = anterior
+            instance._old_counter_key = (fecha, specialty_id, status)
+            instance._old_counter_doctor = doctor_id
+            instance._old_waiting_key = waiting_counter_key(fecha, doctor_id, shift, consultorio, status)
+
+
+def _waiting_key(consulta):
+    return waiting_counter_key(consulta.date, consulta.doctor_id, consulta.shift, consulta.consultorio, consulta.status)
+
+
+@receiver(post_save, sender=Consultation)
+def count_consultation_saved(sender, instance, **kwargs):
+    anterior = getattr(instance, '_old_counter_key', None)
+    if anterior and instance.doctor_id == instance._old_counter_doctor:
+        # Mismo doctor: la especialidad no cambia y no hace falta consultarla
+        nuevo = (instance.date, anterior[1], instance.status)
+    else:
+        nuevo = consultation_counter_key(instance)
+    if anterior is None:
+        add_to_daily_count(*nuevo, 1)
+    elif anterior != nuevo:
+        add_to_daily_count(*anterior, -1)
+        add_to_daily_count(*nuevo, 1)
+
+    espera_anterior = getattr(instance, '_old_waiting_key', None)
+    espera_nueva = _waiting_key(instance)
+    if espera_anterior != espera_nueva:
+        if espera_anterior:
+            add_to_waiting_count(*espera_anterior, -1)
+        if espera_nueva:
+            add_to_waiting_count(*espera_nueva, 1)
+
+
+@receiver(post_delete, sender=Consultation)
+def count_consultation_deleted(sender, instance, **kwargs):
+    add_to_daily_count(*consultation_counter_key(instance), -1)
+    espera = _waiting_key(instance)
+    if espera:
+        add_to_waiting_count(*espera, -1)
+
+
+# Eventos del tablero de recepción en tiempo real (users/events.py), en la misma transacción del cambio
+@receiver(post_save, sender=Consultation)
+def publish_consultation_saved(sender, instance, created, using, **kwargs):
+    record_consultation_event(instance, 'created' if created else 'updated', using=using)
+
+
+@receiver(post_delete, sender=Consultation)
+def publish_consultation_deleted(sender, instance, using, **kwargs):
+    record_consultation_event(instance, 'deleted', using=using)
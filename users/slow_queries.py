@@ -0,0 +1,206 @@
+"""
+Registro de consultas SQL lentas.
+Un execute_wrapper instalado en cada conexión nueva mide cada consulta; las que superan
+SLOW_QUERY_MS se escriben como una línea JSON en el logger "hospital.slow_queries" (archivo
+rotativo configurado en LOGGING) con la línea del proyecto y del template que la dispararon
+y, en PostgreSQL, su plan EXPLAIN. summarize_slow_queries() agrupa el log para el panel de administración.
+"""
+import glob
+import json
+import logging
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+from time import perf_counter
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger('hospital.slow_queries')
+
+# Largo máximo del SQL guardado por consulta
+SQL_MAX_LENGTH = 2000
+
+_state = threading.local()
+
+
+def _project_root():
+    return os.path.join(str(settings.BASE_DIR), '')
+
+
+def query_origin():
+    """
+    (línea del proyecto, línea del template) que ejecutó la consulta, recorriendo la pila.
+    El template sale del nodo que se estaba renderizando, útil para FK cargadas de forma perezosa.
+    """
+    raiz = _project_root()
+    este_archivo = os.path.abspath(__file__)
+    origen = template = None
+    frame = sys._getframe(1)
+    while frame is not None and (origen is None or template is None):
+        archivo = os.path.abspath(frame.f_code.co_filename)
+        if template is None and frame.f_code.co_name == 'render_annotated':
+            nodo = frame.f_locals.get('self')
+            token = getattr(nodo, 'token', None)
+            origin = getattr(nodo, 'origin', None)
+            if token is not None and origin is not None:
+                template = f'{origin.template_name}:{token.lineno}'
+        if (origen is None and archivo.startswith(raiz) and archivo != este_archivo
+                and f'{os.sep}site-packages{os.sep}' not in archivo):
+            origen = f'{os.path.relpath(archivo, raiz)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return origen, template
+
+
+def _explain(connection, sql, params):
+    """Plan de PostgreSQL de un SELECT, dentro de un savepoint para no afectar la transacción"""
+    if connection.vendor != 'postgresql' or not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    _state.explaining = True
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN {sql}', params)
+                return '\n'.join(fila[0] for fila in cursor.fetchall())
+    except DatabaseError:
+        return None
+    finally:
+        _state.explaining = False
+
+
+def slow_query_wrapper(execute, sql, params, many, context):
+    if getattr(_state, 'explaining', False):
+        return execute(sql, params, many, context)
+    inicio = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duracion_ms = (perf_counter() - inicio) * 1000
+        limite = getattr(settings, 'SLOW_QUERY_MS', 200)
+        if limite and duracion_ms >= limite:
+            log_slow_query(context['connection'], sql, params, many, duracion_ms)
+
+
+def log_slow_query(connection, sql, params, many, duracion_ms):
+    origen, template = query_origin()
+    registro = {
+        'ts': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'ms': round(duracion_ms, 2),
+        'db': connection.alias,
+        'sql': sql[:SQL_MAX_LENGTH],
+        'origin': origen,
+        'template': template,
+        'many': many,
+        'explain': None,
+    }
+    # Los parámetros pueden tener datos de pacientes: solo se guardan si se pide explícitamente
+    if getattr(settings, 'SLOW_QUERY_LOG_PARAMS', False):
+        registro['params'] = repr(params)[:SQL_MAX_LENGTH]
+    if not many and getattr(settings, 'SLOW_QUERY_EXPLAIN', True):
+        registro['explain'] = _explain(connection, sql, params)
+    logger.warning(json.dumps(registro, ensure_ascii=False))
+
+
+@receiver(connection_created)
+def install_slow_query_wrapper(sender, connection, **kwargs):
+    # Al principio de la lista: connection.execute_wrapper() quita siempre el último agregado,
+    # y la conexión puede abrirse dentro de uno de esos bloques (ver users/timing.py)
+    if slow_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, slow_query_wrapper)
+
+
+def _log_files(path=None):
+    """Archivos del log de consultas lentas, incluidos los rotados (.1, .2, ...)"""
+    path = path or getattr(settings, 'SLOW_QUERY_LOG', None)
+    return sorted(glob.glob(f'{glob.escape(path)}*')) if path else []
+
+
+def _read_file(archivo):
+    try:
+        with open(archivo, encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    yield json.loads(linea)
+                except ValueError:
+                    continue
+    except OSError:
+        return
+
+
+def read_slow_queries(path=None):
+    """Registros del log de consultas lentas, incluidos los archivos rotados"""
+    for archivo in _log_files(path):
+        yield from _read_file(archivo)
+
+
+def _group(registros):
+    """Grupos por (SQL, origen, template) con conteo, tiempo total y máximo, última vez y EXPLAIN"""
+    grupos = {}
+    for registro in registros:
+        clave = (registro.get('sql'), registro.get('origin'), registro.get('template'))
+        grupo = grupos.get(clave)
+        if grupo is None:
+            grupo = grupos[clave] = {
+                'sql': clave[0], 'origin': clave[1], 'template': clave[2],
+                'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_seen': None, 'explain': None,
+            }
+        grupo['count'] += 1
+        grupo['total_ms'] += registro.get('ms', 0)
+        grupo['max_ms'] = max(grupo['max_ms'], registro.get('ms', 0))
+        grupo['last_seen'] = max(filter(None, [grupo['last_seen'], registro.get('ts')]), default=None)
+        grupo['explain'] = registro.get('explain') or grupo['explain']
+    return grupos
+
+
+def _merge(destino, grupos):
+    for clave, grupo in grupos.items():
+        actual = destino.get(clave)
+        if actual is None:
+            destino[clave] = dict(grupo)
+            continue
+        actual['count'] += grupo['count']
+        actual['total_ms'] += grupo['total_ms']
+        actual['max_ms'] = max(actual['max_ms'], grupo['max_ms'])
+        actual['last_seen'] = max(filter(None, [actual['last_seen'], grupo['last_seen']]), default=None)
+        actual['explain'] = grupo['explain'] or actual['explain']
+
+
+# Grupos de cada archivo del log ya leído, por (inodo, mtime, tamaño): un archivo rotado no cambia
+# (aunque se renombre de .1 a .2), así que solo se vuelve a leer el archivo activo cuando crece
+_file_groups = {}
+_file_groups_lock = threading.Lock()
+
+
+def _logged_groups():
+    grupos = {}
+    with _file_groups_lock:
+        vistos = set()
+        for archivo in _log_files():
+            try:
+                info = os.stat(archivo)
+            except OSError:
+                continue
+            firma = (info.st_dev, info.st_ino, info.st_mtime_ns, info.st_size)
+            vistos.add(firma)
+            if firma not in _file_groups:
+                _file_groups[firma] = _group(_read_file(archivo))
+            _merge(grupos, _file_groups[firma])
+        # Los archivos que cambiaron o se borraron ya no se usan
+        for firma in set(_file_groups) - vistos:
+            del _file_groups[firma]
+    return grupos
+
+
+def summarize_slow_queries(registros=None, limit=50):
+    """
+    Agrupa las consultas lentas por SQL y origen (el SQL se guarda sin parámetros, con %s)
+    y devuelve las que más tiempo total consumieron. Sin `registros` lee el log, releyendo
+    solo los archivos que cambiaron desde la última vez.
+    """
+    grupos = _logged_groups() if registros is None else _group(registros)
+    resumen = sorted(grupos.values(), key=lambda g: g['total_ms'], reverse=True)[:limit]
+    for grupo in resumen:
+        grupo['avg_ms'] = grupo['total_ms'] / grupo['count']
+    return resumen
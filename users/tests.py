@@ -5,4 +5,817 @@ class UserModelTest(TestCase):
     def test_create_user(self):
         user = User.objects.create_user(username='testuser', password='12345')
         self.assertEqual(user.username, 'testuser')
-        self.assertTrue(user.check_password('12345'))
\ No newline at end of file
+        self.assertTrue(user.check_password('12345'))
+
+from datetime import date
+from users.models import Patient
+from users.search import patient_search_q, search_patients
+
+
+class PatientSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for ci, nombre, apellido in (('1234567', 'María', 'González'), ('1234999', 'Mario', 'Benítez'), ('9912345', 'José', 'Martínez')):
+            Patient.objects.create(
+                first_name=nombre, last_name=apellido, phone='12345678',
+                identification_type='CI', identification_number=ci,
+                gender='Other', date_of_birth=date(1990, 1, 1),
+                address_line='Calle 1', city='City', region='Region', postal_code='1111',
+                emergency_contact_name='E', emergency_contact_relationship='Madre',
+                emergency_contact_phone='98765432'
+            )
+
+    def test_digits_search_by_ci_substring(self):
+        resultados = search_patients('1234')
+        self.assertEqual([p['identification_number'] for p in resultados], ['1234567', '1234999', '9912345'])
+
+    def test_digits_search_matches_middle_of_ci(self):
+        self.assertEqual([p['identification_number'] for p in search_patients('345')], ['1234567', '9912345'])
+        self.assertEqual([p['identification_number'] for p in search_patients('49')], ['1234999'])
+
+    def test_text_search_matches_every_word(self):
+        self.assertEqual([p['last_name'] for p in search_patients('mar')], ['Benítez', 'González', 'Martínez'])
+        self.assertEqual([p['first_name'] for p in search_patients('mar gonz')], ['María'])
+
+    def test_empty_query(self):
+        self.assertEqual(search_patients('  '), [])
+        self.assertEqual(Patient.objects.filter(patient_search_q('')).count(), 3)
+
+
+from django.core.cache import cache
+from django.urls import reverse
+from users.models import Users, Receptions, Administrator, Specialty, Doctor
+from django.test import override_settings
+from users.backends import LeanModelBackend
+from users.roles import get_user_role, resolve_role
+
+
+class RoleResolutionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Users.objects.create_user(username='rol_user', password='pass12345', email='rol@test.com')
+        cls.admin_user = Users.objects.create_user(username='rol_admin', password='pass12345', email='rol_admin@test.com')
+        Administrator.objects.create(user=cls.admin_user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_resolve_role_single_query(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(resolve_role(self.user.pk))
+        Receptions.objects.create(user=self.user)
+        self.assertEqual(resolve_role(self.user.pk), 'reception')
+
+    @override_settings(ROLE_CACHE_TIMEOUT=300)
+    def test_role_is_cached_until_profile_changes(self):
+        self.assertIsNone(get_user_role(self.user))
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_user_role(self.user))
+        # El alta de un perfil invalida la caché
+        Receptions.objects.create(user=self.user)
+        self.assertEqual(get_user_role(self.user), 'reception')
+        Receptions.objects.filter(user=self.user).delete()
+        self.assertIsNone(get_user_role(self.user))
+
+    def test_role_is_not_cached_without_shared_cache(self):
+        with self.settings(ROLE_CACHE_TIMEOUT=0):
+            self.assertIsNone(get_user_role(self.user))
+            self.assertIsNone(cache.get(f'user_role:{self.user.pk}'))
+
+    def test_role_loaded_with_request_user(self):
+        usuario = LeanModelBackend().get_user(self.admin_user.pk)
+        self.assertEqual(usuario.loaded_role, 'admin')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_role(usuario), 'admin')
+        # Un rol quitado se nota en el siguiente request aunque otro proceso lo tenga en caché
+        cache.set(f'user_role:{self.admin_user.pk}', 'admin')
+        Administrator.objects.filter(user=self.admin_user).delete()
+        self.assertIsNone(get_user_role(LeanModelBackend().get_user(self.admin_user.pk)))
+
+    @override_settings(ROLE_CACHE_TIMEOUT=300)
+    def test_assign_role_view_invalidates_cache(self):
+        self.assertIsNone(get_user_role(self.user))
+        self.client.login(username='rol_admin', password='pass12345')
+        self.client.post(reverse('admin_assign_role', args=[self.user.pk]), {'role': 'reception'})
+        self.assertEqual(get_user_role(self.user), 'reception')
+
+    def test_dashboard_redirects_by_role(self):
+        self.client.login(username='rol_admin', password='pass12345')
+        self.assertRedirects(self.client.get(reverse('dashboard')), reverse('admin_dashboard'))
+
+    def test_role_required_denies_other_roles(self):
+        self.client.login(username='rol_admin', password='pass12345')
+        response = self.client.get(reverse('reception:patient_list'))
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        response = self.client.get(reverse('reception:patient_search'), {'q': '1'})
+        self.assertEqual(response.status_code, 403)
+
+
+from datetime import time
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from users.models import Consultation, ConsultationDailyCount, RecordCount
+from users.counters import reception_dashboard_counts
+
+
+@override_settings(CONSULTATION_TOTAL_SECONDS=0)
+class CountersTest(TestCase):
+    def setUp(self):
+        self.specialty = Specialty.objects.create(name='Cardiología', description='Corazón')
+        self.other_specialty = Specialty.objects.create(name='Pediatría', description='Niños')
+        doctor_user = Users.objects.create_user(username='cnt_doc', password='x', email='cnt_doc@test.com', is_doctor=True)
+        self.doctor = Doctor.objects.create(user=doctor_user, specialty=self.specialty, bio='Bio')
+        other_user = Users.objects.create_user(username='cnt_doc2', password='x', email='cnt_doc2@test.com', is_doctor=True)
+        self.other_doctor = Doctor.objects.create(user=other_user, specialty=self.other_specialty, bio='Bio')
+        self.patient = Patient.objects.create(
+            first_name='Cuenta', last_name='Paciente', phone='12345678',
+            identification_type='CI', identification_number='6660001',
+            gender='Other', date_of_birth=date(1990, 1, 1),
+            address_line='Calle 1', city='City', region='Region', postal_code='1111',
+            emergency_contact_name='E', emergency_contact_relationship='Madre',
+            emergency_contact_phone='98765432'
+        )
+        self.fecha = date(2025, 1, 6)
+
+    def _consulta(self, hora, order):
+        return Consultation.objects.create(
+            description='Control', date=self.fecha, time=time(hora, 0), shift='MAÑANA', order=order,
+            consultorio='a1', doctor=self.doctor, patient=self.patient
+        )
+
+    def _snapshot(self):
+        diarios = set(
+            ConsultationDailyCount.objects.exclude(total=0).values_list('date', 'specialty', 'status', 'total')
+        )
+        return diarios, dict(RecordCount.objects.values_list('name', 'total'))
+
+    def test_counters_follow_changes(self):
+        primera = self._consulta(8, 1)
+        segunda = self._consulta(9, 2)
+        self.assertEqual(reception_dashboard_counts(self.fecha), {
+            'pacientes_count': 1, 'doctores_count': 2, 'consultas_count': 2, 'consultas_hoy': 2,
+        })
+        primera.status = 'ATENDIDO'
+        primera.save()
+        segunda.doctor = self.other_doctor
+        segunda.save()
+        self.assertEqual(
+            ConsultationDailyCount.objects.get(date=self.fecha, specialty=self.specialty, status='ATENDIDO').total, 1
+        )
+        self.assertEqual(
+            ConsultationDailyCount.objects.get(date=self.fecha, specialty=self.other_specialty, status='EN ESPERA').total, 1
+        )
+        segunda.delete()
+        self.assertEqual(reception_dashboard_counts(self.fecha)['consultas_count'], 1)
+
+    def test_consultation_writes_skip_global_counter(self):
+        """Una alta con su fila diaria ya creada solo hace un UPDATE por contador y no toca RecordCount"""
+        self._consulta(8, 1)
+        with CaptureQueriesContext(connection) as queries:
+            self._consulta(9, 2)
+        sql = [q['sql'] for q in queries]
+        self.assertFalse([q for q in sql if 'users_recordcount' in q])
+        diarios = [q for q in sql if 'users_consultationdailycount' in q]
+        self.assertEqual(len(diarios), 1)
+        self.assertTrue(diarios[0].startswith('UPDATE'))
+
+    @override_settings(CONSULTATION_TOTAL_SECONDS=60)
+    def test_consultation_total_is_cached(self):
+        cache.delete('consultation_total')
+        self._consulta(8, 1)
+        self.assertEqual(reception_dashboard_counts(self.fecha)['consultas_count'], 1)
+        self._consulta(9, 2)
+        self.assertEqual(reception_dashboard_counts(self.fecha)['consultas_count'], 1)
+        cache.delete('consultation_total')
+        self.assertEqual(reception_dashboard_counts(self.fecha)['consultas_count'], 2)
+
+    def test_rebuild_matches_incremental_counters(self):
+        self._consulta(8, 1)
+        self._consulta(9, 2).delete()
+        incremental = self._snapshot()
+        out = StringIO()
+        call_command('rebuild_counters', stdout=out)
+        self.assertIn('Contadores reconstruidos', out.getvalue())
+        self.assertEqual(self._snapshot(), incremental)
+
+    def test_patient_delete_cascades_counters(self):
+        self._consulta(8, 1)
+        self.patient.delete()
+        self.assertEqual(reception_dashboard_counts(self.fecha), {
+            'pacientes_count': 0, 'doctores_count': 2, 'consultas_count': 0, 'consultas_hoy': 0,
+        })
+
+
+from django.core.management.base import CommandError
+from users.models import DoctorSchedule, Prescription
+
+
+class GenerateHospitalDataTest(TestCase):
+    def _generar(self, **opciones):
+        call_command('generate_hospital_data', patients=30, doctors=3, consultations=600,
+                     batch_size=50, stdout=StringIO(), **opciones)
+
+    def test_generates_requested_volumes(self):
+        self._generar()
+        self.assertEqual(Patient.objects.count(), 30)
+        self.assertEqual(Doctor.objects.count(), 3)
+        self.assertEqual(DoctorSchedule.objects.count(), 3 * 5 * 2)
+        self.assertEqual(Consultation.objects.count(), 600)
+        self.assertTrue(Prescription.objects.exists())
+        # bulk_create no pasa por las señales, el comando reconstruye los contadores
+        self.assertEqual(dict(RecordCount.objects.values_list('name', 'total')),
+                         {'patient': 30, 'doctor': 3})
+
+    def test_same_seed_same_data_and_no_rerun(self):
+        self._generar(seed=7)
+        primera = list(Consultation.objects.order_by('date', 'time', 'doctor__user__username')
+                       .values_list('date', 'time', 'status', 'patient__identification_number'))
+        with self.assertRaises(CommandError):
+            self._generar(seed=7)
+        Patient.objects.all().delete()
+        Users.objects.all().delete()
+        self._generar(seed=7)
+        segunda = list(Consultation.objects.order_by('date', 'time', 'doctor__user__username')
+                       .values_list('date', 'time', 'status', 'patient__identification_number'))
+        self.assertEqual(primera, segunda)
+
+
+from django.test import override_settings
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+class ServerTimingMiddlewareTest(TestCase):
+    def setUp(self):
+        self.user = Users.objects.create_user(username='timing_rec', email='timing@test.com', password='x')
+        Receptions.objects.create(user=self.user)
+        self.admin = Users.objects.create_user(username='timing_admin', email='timing_admin@test.com', password='x')
+        Administrator.objects.create(user=self.admin)
+
+    def test_header_reports_queries_and_phases(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin_dashboard'))
+        header = response['Server-Timing']
+        for metrica in ('db;dur=', 'tpl;dur=', 'view;dur=', 'total;dur='):
+            self.assertIn(metrica, header)
+        self.assertRegex(header, r'desc="[1-9]\d* queries"')
+
+    def test_header_only_for_staff(self):
+        self.client.force_login(self.user)
+        self.assertNotIn('Server-Timing', self.client.get(reverse('reception_dashboard')))
+        self.client.logout()
+        self.assertNotIn('Server-Timing', self.client.get(reverse('login')))
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_request_has_no_header(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin_dashboard'))
+        self.assertNotIn('Server-Timing', response)
+        response = self.client.get(reverse('admin_dashboard'), headers={'X-Server-Timing': '1'})
+        self.assertIn('Server-Timing', response)
+
+    @override_settings(SLOW_REQUEST_MS=0, SLOW_REQUEST_TOP_SQL=2)
+    def test_slow_request_logged_with_view_and_sql(self):
+        self.client.force_login(self.user)
+        with self.assertLogs('hospital.performance', 'WARNING') as logs:
+            self.client.get(reverse('reception_dashboard'))
+        self.assertIn('vista=reception_dashboard', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0, SLOW_REQUEST_MS=0)
+    def test_unsampled_slow_request_still_logged(self):
+        self.client.force_login(self.user)
+        with self.assertLogs('hospital.performance', 'WARNING') as logs:
+            self.client.get(reverse('reception_dashboard'))
+        self.assertIn('vista=reception_dashboard', logs.output[0])
+        self.assertIn('sin muestrear', logs.output[0])
+
+
+from users.metrics import flush_metrics, observe_request, reset_metrics
+from users.models import WaitingQueueCount
+from reception.services import BookingError, book_consultation
+
+
+@override_settings(METRICS_TOKEN='secreto')
+class MetricsEndpointTest(TestCase):
+    def setUp(self):
+        reset_metrics()
+        specialty = Specialty.objects.create(name='Clínica', description='General')
+        doctor_user = Users.objects.create_user(username='met_doc', password='x', email='met_doc@test.com', is_doctor=True)
+        self.doctor = Doctor.objects.create(user=doctor_user, specialty=specialty, bio='Bio')
+        self.patient = Patient.objects.create(
+            first_name='Métrica', last_name='Paciente', phone='12345678',
+            identification_type='CI', identification_number='7770001',
+            gender='Other', date_of_birth=date(1990, 1, 1),
+            address_line='Calle 1', city='City', region='Region', postal_code='1111',
+            emergency_contact_name='E', emergency_contact_relationship='Madre',
+            emergency_contact_phone='98765432'
+        )
+
+    def _consulta(self, hora, consultorio='a1'):
+        return Consultation(
+            description='Control', date=date.today(), time=time(hora, 0), shift='MAÑANA',
+            consultorio=consultorio, doctor=self.doctor, patient=self.patient
+        )
+
+    def _metricas(self, **extra):
+        extra.setdefault('HTTP_AUTHORIZATION', 'Bearer secreto')
+        response = self.client.get('/metrics', **extra)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_request_counts_and_latency_histogram(self):
+        self.client.get(reverse('login'))
+        texto = self._metricas()
+        self.assertIn('hospital_http_requests_total{view="login",method="GET",status="200"} 1', texto)
+        self.assertIn('hospital_http_request_duration_seconds_count{view="login"} 1', texto)
+        self.assertIn('hospital_http_request_duration_seconds_bucket{view="login",le="+Inf"} 1', texto)
+
+    def test_waiting_gauges_follow_counters(self):
+        book_consultation(self._consulta(8), asignar_consultorio=False)
+        segunda = book_consultation(self._consulta(9, consultorio='b2'), asignar_consultorio=False)
+        with self.assertRaises(BookingError):
+            book_consultation(self._consulta(9), asignar_consultorio=False)
+        texto = self._metricas()
+        self.assertIn('hospital_bookings_total{result="ok"} 2', texto)
+        self.assertIn('hospital_bookings_total{result="conflict"} 1', texto)
+        self.assertIn(f'hospital_waiting_consultations{{doctor_id="{self.doctor.pk}",shift="MAÑANA"}} 2', texto)
+        self.assertNotIn('met_doc', texto)
+        self.assertIn('hospital_waiting_consultations_by_room{consultorio="b2"} 1', texto)
+
+        segunda.status = 'ATENDIDO'
+        segunda.save()
+        texto = self._metricas()
+        self.assertNotIn('consultorio="b2"', texto)
+        # Los gauges salen de la tabla de contadores, sin contar Consultation
+        with self.assertNumQueries(2):
+            self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secreto')
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(list(WaitingQueueCount.objects.values_list('consultorio', 'total')), [('a1', 1)])
+
+    def test_scrape_sums_every_worker(self):
+        """El scrape lee el total de la caché compartida, más lo pendiente del worker que responde"""
+        # Otro worker ya sumó dos requests a login
+        observe_request('login', 'GET', 200, 0.01)
+        observe_request('login', 'GET', 200, 0.01)
+        with self.settings(METRICS_FLUSH_SECONDS=3600):
+            flush_metrics()
+            # Este worker atiende uno más y todavía no lo guardó
+            self.client.get(reverse('login'))
+            texto = self._metricas()
+        self.assertIn('hospital_http_requests_total{view="login",method="GET",status="200"} 3', texto)
+        self.assertIn('hospital_http_request_duration_seconds_count{view="login"} 3', texto)
+
+    def test_counts_survive_cleared_cache(self):
+        observe_request('login', 'GET', 200, 0.01)
+        flush_metrics()
+        cache.clear()
+        observe_request('login', 'GET', 200, 0.01)
+        self.assertIn('hospital_http_requests_total{view="login",method="GET",status="200"} 1', self._metricas())
+
+    def test_token_required_when_configured(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer otro').status_code, 403)
+        self._metricas(HTTP_AUTHORIZATION='Bearer secreto')
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_closed_without_token_except_for_admins(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.force_login(self.doctor.user)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        admin = Users.objects.create_user(username='met_admin', password='x', email='met_admin@test.com')
+        Administrator.objects.create(user=admin)
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+
+import os
+import shutil
+import tempfile
+
+
+class ProfilingMiddlewareTest(TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir)
+        self.admin = Users.objects.create_user(username='prof_admin', email='prof_admin@test.com', password='x')
+        Administrator.objects.create(user=self.admin)
+
+    def test_admin_gets_cprofile_report_and_dump(self):
+        self.client.force_login(self.admin)
+        with self.settings(PROFILE_DIR=self.profile_dir):
+            response = self.client.get(reverse('admin_dashboard'), {'_profile': '1'})
+        texto = response.content.decode()
+        self.assertIn('function calls', texto)
+        self.assertIn('admin_dashboard_view', texto)
+        self.assertTrue(os.path.exists(os.path.join(self.profile_dir, response['X-Profile-File'])))
+
+    def test_sample_mode_writes_collapsed_stacks(self):
+        self.client.force_login(self.admin)
+        with self.settings(PROFILE_DIR=self.profile_dir, PROFILE_SAMPLE_INTERVAL=0.0005):
+            response = self.client.get(reverse('admin_dashboard'), HTTP_X_PROFILE='sample')
+        self.assertTrue(response['X-Profile-File'].endswith('.collapsed'))
+        for linea in response.content.decode().splitlines()[3:]:
+            self.assertRegex(linea, r'^\S.*;.* \d+$')
+
+    def test_ignored_for_non_admin(self):
+        reception = Users.objects.create_user(username='prof_rec', email='prof_rec@test.com', password='x')
+        Receptions.objects.create(user=reception)
+        self.client.force_login(reception)
+        with self.settings(PROFILE_DIR=self.profile_dir):
+            response = self.client.get(reverse('reception_dashboard'), {'_profile': '1'})
+        self.assertNotIn('X-Profile-File', response)
+        self.assertEqual(os.listdir(self.profile_dir), [])
+
+
+import json
+from unittest import mock
+from users import slow_queries
+from users.slow_queries import summarize_slow_queries
+
+
+class SlowQueryLogTest(TestCase):
+    def setUp(self):
+        self.admin = Users.objects.create_user(username='slow_admin', email='slow_admin@test.com', password='x')
+        Administrator.objects.create(user=self.admin)
+        Users.objects.create_user(username='slow_user', email='slow_user@test.com', password='x')
+        self.client.force_login(self.admin)
+
+    @override_settings(SLOW_QUERY_MS=0.0001)
+    def test_queries_attributed_to_view_and_template(self):
+        with self.assertLogs('hospital.slow_queries', 'WARNING') as logs:
+            self.client.get(reverse('admin_users_list'))
+        registros = [json.loads(r.getMessage()) for r in logs.records]
+        self.assertTrue(all(r['sql'] and r['ms'] >= 0 for r in registros))
+        self.assertNotIn('params', registros[0])
+        origenes = {r['origin'] for r in registros}
+        self.assertTrue(any(o and o.startswith(os.path.join('administrator', 'views.py')) for o in origenes))
+        # Las relaciones inversas que recorre el template se atribuyen a su línea
+        templates = {r['template'] for r in registros if r['template']}
+        self.assertTrue(any(t.startswith('admin_backup/users_list.html:') for t in templates))
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_disabled_with_zero_threshold(self):
+        with self.assertNoLogs('hospital.slow_queries', 'WARNING'):
+            self.client.get(reverse('admin_users_list'))
+
+    def test_summary_groups_by_sql_and_origin(self):
+        registros = [
+            {'ts': '2026-01-01T10:00:00+00:00', 'ms': 300, 'sql': 'SELECT a', 'origin': 'x.py:1 in f', 'template': None},
+            {'ts': '2026-01-02T10:00:00+00:00', 'ms': 500, 'sql': 'SELECT a', 'origin': 'x.py:1 in f', 'template': None},
+            {'ts': '2026-01-01T11:00:00+00:00', 'ms': 700, 'sql': 'SELECT b', 'origin': 'y.py:2 in g', 'template': None},
+        ]
+        resumen = summarize_slow_queries(registros)
+        self.assertEqual([g['sql'] for g in resumen], ['SELECT a', 'SELECT b'])
+        self.assertEqual(resumen[0]['count'], 2)
+        self.assertEqual(resumen[0]['max_ms'], 500)
+        self.assertEqual(resumen[0]['avg_ms'], 400)
+        self.assertEqual(resumen[0]['last_seen'], '2026-01-02T10:00:00+00:00')
+
+    def test_summary_rereads_only_changed_files(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        log = os.path.join(directorio, 'slow.log')
+        linea = json.dumps({'ts': '2026-01-01T10:00:00+00:00', 'ms': 300, 'sql': 'SELECT a', 'origin': 'x.py:1 in f'})
+        for archivo in (log, f'{log}.1', f'{log}.2'):
+            with open(archivo, 'w', encoding='utf-8') as f:
+                f.write(linea + '\n')
+        with override_settings(SLOW_QUERY_LOG=log), \
+                mock.patch('users.slow_queries._read_file', wraps=slow_queries._read_file) as leidos:
+            self.assertEqual(summarize_slow_queries()[0]['count'], 3)
+            self.assertEqual(leidos.call_count, 3)
+            self.assertEqual(summarize_slow_queries()[0]['count'], 3)
+            self.assertEqual(leidos.call_count, 3)
+            with open(log, 'a', encoding='utf-8') as f:
+                f.write(linea + '\n')
+            resumen = summarize_slow_queries()
+            self.assertEqual((resumen[0]['count'], resumen[0]['total_ms']), (4, 1200))
+            # Solo se volvió a leer el archivo activo
+            self.assertEqual(leidos.call_args.args, (log,))
+            self.assertEqual(leidos.call_count, 4)
+
+
+from unittest import skipUnless
+from django.conf import settings
+from django.db import connections
+from django.test import TransactionTestCase
+from users.db_router import PIN_COOKIE, ReplicaRouter, read_from, replica_alias, track_writes
+
+
+class ReplicaRouterTest(TestCase):
+    def test_reads_follow_context_and_writes_go_to_primary(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Patient))
+        with read_from('replica'):
+            # TestCase corre dentro de una transacción en la principal: la réplica no vería sus datos
+            self.assertIsNone(router.db_for_read(Patient))
+        with track_writes() as escritos:
+            self.assertEqual(router.db_for_write(Patient), 'default')
+        self.assertEqual(escritos, {'users.Patient'})
+
+    @skipUnless(replica_alias() is None, "Solo sin réplica configurada")
+    def test_without_replica_everything_uses_primary(self):
+        user = Users.objects.create_user(username='rep_none', email='rep_none@test.com', password='x')
+        Receptions.objects.create(user=user)
+        self.client.force_login(user)
+        patient = Patient.objects.create(
+            first_name='Sin', last_name='Réplica', phone='12345678',
+            identification_type='CI', identification_number='6660002',
+            gender='Other', date_of_birth=date(1990, 1, 1),
+            address_line='Calle 1', city='City', region='Region', postal_code='1111',
+            emergency_contact_name='E', emergency_contact_relationship='Madre',
+            emergency_contact_phone='98765432'
+        )
+        response = self.client.post(reverse('reception:patient_delete', args=[patient.pk]))
+        self.assertFalse(Patient.objects.filter(pk=patient.pk).exists())
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+@skipUnless('replica' in settings.DATABASES, "Requiere el alias 'replica' en DATABASES (DB_REPLICA_HOST)")
+class ReplicaReadsTest(TransactionTestCase):
+    # La réplica de pruebas es otra conexión a la misma base (TEST MIRROR): los datos deben estar confirmados
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = Users.objects.create_user(username='rep_rec', email='rep_rec@test.com', password='x')
+        Receptions.objects.create(user=self.user)
+        self.client.force_login(self.user)
+        self.patient = Patient.objects.create(
+            first_name='Réplica', last_name='Paciente', phone='12345678',
+            identification_type='CI', identification_number='6660001',
+            gender='Other', date_of_birth=date(1990, 1, 1),
+            address_line='Calle 1', city='City', region='Region', postal_code='1111',
+            emergency_contact_name='E', emergency_contact_relationship='Madre',
+            emergency_contact_phone='98765432'
+        )
+
+    def _replica_queries(self, url):
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(replica.captured_queries)
+
+    def test_history_reads_from_replica(self):
+        self.assertGreater(self._replica_queries(reverse('reception:consultation_history_data')), 0)
+        # Las vistas sin @use_replica siguen en la principal
+        self.assertEqual(self._replica_queries(reverse('reception:patient_list_data')), 0)
+
+    def test_write_pins_user_to_primary(self):
+        response = self.client.post(reverse('reception:patient_delete', args=[self.patient.pk]))
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], settings.REPLICA_PIN_SECONDS)
+        self.assertEqual(self._replica_queries(reverse('reception:consultation_history_data')), 0)
+        # Un GET sin escrituras no renueva la cookie
+        response = self.client.get(reverse('reception:consultation_history_data'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+from django.contrib.auth import SESSION_KEY
+
+
+class LeanUserSessionTest(TestCase):
+    def setUp(self):
+        self.user = Users.objects.create_user(
+            username='lean_rec', email='lean_rec@test.com', password='x', address_line='Calle 1', city='Asunción'
+        )
+        Receptions.objects.create(user=self.user)
+
+    def test_request_user_loads_only_lean_columns(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('reception_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        consulta_user = next(q['sql'] for q in ctx.captured_queries if 'FROM "users_users"' in q['sql'])
+        self.assertIn('"profile_avatar"', consulta_user)
+        self.assertNotIn('"address_line"', consulta_user)
+
+    def test_deferred_fields_load_together(self):
+        user = LeanModelBackend().get_user(self.user.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.address_line, 'Calle 1')
+            self.assertEqual(user.city, 'Asunción')
+            self.assertEqual(user.email, 'lean_rec@test.com')
+        # Guardar un usuario con campos diferidos no pisa el resto de columnas
+        user = LeanModelBackend().get_user(self.user.pk)
+        user.first_name = 'Nuevo'
+        user.save()
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.first_name, self.user.city), ('Nuevo', 'Asunción'))
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+    def test_cached_db_session_skips_session_table(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('reception_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if 'django_session' in q['sql']])
+        self.assertEqual(int(self.client.session[SESSION_KEY]), self.user.pk)
+
+
+from datetime import datetime, timedelta
+from django.utils import timezone
+from users.models import ConsultationStatusEvent
+from users.triage import TriageQueues, aging_boost, triage_order_by
+from users.wait_times import record_status_event
+
+
+@override_settings(CONSULTATION_EVENTS_POLL_SECONDS=0, TRIAGE_AGING_MINUTES=60, TRIAGE_MAX_BOOST=1)
+class TriageQueueTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        specialty = Specialty.objects.create(name='Emergencias', description='Guardia')
+        doctor_user = Users.objects.create_user(username='dr_triage', password='123', email='triage@test.com', is_doctor=True)
+        cls.doctor = Doctor.objects.create(user=doctor_user, specialty=specialty, bio='Bio')
+        cls.patient = Patient.objects.create(
+            first_name='Tito', last_name='Triage', phone='12345678',
+            identification_type='CI', identification_number='4440001',
+            gender='Male', date_of_birth=date(1990, 1, 1),
+            address_line='Calle 1', city='City', region='Region', postal_code='1111',
+            emergency_contact_name='E', emergency_contact_relationship='Madre',
+            emergency_contact_phone='98765432'
+        )
+        cls.hoy = date(2026, 3, 2)
+
+    def setUp(self):
+        # Reloj fijo a las 12:00 del día de la cola
+        reloj = mock.patch('django.utils.timezone.now', return_value=self._momento(time(12, 0)))
+        self.ahora = reloj.start()
+        self.addCleanup(reloj.stop)
+        self.colas = TriageQueues()
+
+    def _momento(self, hora):
+        return timezone.make_aware(datetime.combine(self.hoy, hora))
+
+    def _consulta(self, hora, priority, order, llegada=None, **kwargs):
+        consulta = Consultation.objects.create(
+            description='Guardia', date=self.hoy, time=hora, shift='MAÑANA', order=order,
+            priority=priority, consultorio='e1', doctor=self.doctor, patient=self.patient, **kwargs
+        )
+        if llegada:
+            evento = record_status_event(consulta, 'created')
+            ConsultationStatusEvent.objects.filter(pk=evento.pk).update(occurred_at=self._momento(llegada))
+        return consulta
+
+    def test_priority_first_with_bounded_aging(self):
+        self.assertEqual(aging_boost(self._momento(time(7, 0)), self._momento(time(12, 0))), 1)
+        # Nivel V que espera desde las 9:00: sube un nivel y va antes que un Nivel IV de las 11:50
+        viejo = self._consulta(time(9, 0), 'Nivel V', 1)
+        nuevo = self._consulta(time(11, 50), 'Nivel IV', 2)
+        # Agendado a las 8:00 pero dado de alta a las 11:30: espera media hora, no sube
+        tardio = self._consulta(time(8, 0), 'Nivel III', 3, llegada=time(11, 30))
+        # Un Nivel II que espera desde las 7:00 no llega al Nivel I
+        espera = self._consulta(time(7, 0), 'Nivel II', 4)
+        urgente = self._consulta(time(11, 55), 'NIVEL I', 5)
+        esperado = [urgente.pk, espera.pk, tardio.pk, viejo.pk, nuevo.pk]
+        self.assertEqual(self.colas.order(self.doctor.pk, 'MAÑANA'), esperado)
+        # La base ordena igual
+        en_base = Consultation.objects.filter(doctor=self.doctor).order_by(*triage_order_by(self.hoy))
+        self.assertEqual(list(en_base.values_list('pk', flat=True)), esperado)
+        with self.settings(TRIAGE_MAX_BOOST=0):
+            en_base = Consultation.objects.filter(doctor=self.doctor).order_by(*triage_order_by(self.hoy))
+            self.assertEqual(list(en_base.values_list('pk', flat=True)), [urgente.pk, espera.pk, tardio.pk, nuevo.pk, viejo.pk])
+
+    @override_settings(TRIAGE_MAX_BOOST=None)
+    def test_low_priority_not_starved(self):
+        # Cada 15 minutos llega un Nivel II y el doctor llama al primero de la cola: el Nivel V de las
+        # 8:00 sube un nivel por hora hasta empatar con los Nivel II y por su número de orden lo llaman
+        self.ahora.return_value = self._momento(time(8, 0))
+        viejo = self._consulta(time(8, 0), 'Nivel V', 1)
+        self._consulta(time(7, 45), 'Nivel II', 2)
+        for n in range(3, 40):
+            self.ahora.return_value += timedelta(minutes=15)
+            self._consulta(timezone.localtime(self.ahora.return_value).time(), 'Nivel II', n)
+            orden = self.colas.order(self.doctor.pk, 'MAÑANA')
+            en_base = Consultation.objects.filter(doctor=self.doctor, status='EN ESPERA').order_by(*triage_order_by(self.hoy))
+            self.assertEqual(en_base.values_list('pk', flat=True)[0], orden[0])
+            llamada = Consultation.objects.get(pk=orden[0])
+            llamada.status = 'EN CONSULTA'
+            llamada.save()
+            if llamada.pk == viejo.pk:
+                break
+        self.assertEqual(Consultation.objects.get(pk=viejo.pk).status, 'EN CONSULTA')
+        self.assertEqual(timezone.localtime(self.ahora.return_value).time(), time(11, 0))
+
+    def test_order_follows_waiting_time(self):
+        self.colas.order(self.doctor.pk, 'MAÑANA')
+        # Altas desde eventos: la espera cuenta desde el alta (12:00 y 12:30), no desde la hora agendada
+        bajo = self._consulta(time(8, 0), 'Nivel V', 1)
+        self.ahora.return_value = self._momento(time(12, 30))
+        medio = self._consulta(time(8, 15), 'Nivel IV', 2)
+        self.assertEqual(self.colas.order(self.doctor.pk, 'MAÑANA'), [medio.pk, bajo.pk])
+        self.ahora.return_value = self._momento(time(13, 0))
+        self.assertEqual(self.colas.order(self.doctor.pk, 'MAÑANA'), [bajo.pk, medio.pk])
+
+    def test_incremental_updates(self):
+        primera = self._consulta(time(8, 0), 'Nivel IV', 1)
+        segunda = self._consulta(time(8, 30), 'Nivel IV', 2)
+        self.assertEqual(self.colas.order(self.doctor.pk, 'MAÑANA'), [primera.pk, segunda.pk])
+
+        # Alta, cambio de prioridad y cambio de estado se aplican desde los eventos, sin leer las consultas
+        tercera = self._consulta(time(9, 0), 'Nivel IV', 3)
+        segunda.priority = 'NIVEL I'
+        segunda.save()
+        primera.status = 'EN CONSULTA'
+        primera.save()
+        with CaptureQueriesContext(connection) as queries:
+            orden = self.colas.order(self.doctor.pk, 'MAÑANA')
+        self.assertFalse(any('"users_consultation"' in q['sql'] for q in queries.captured_queries))
+        self.assertEqual(orden, [segunda.pk, tercera.pk])
+        self.assertEqual(self.colas.positions([(self.doctor.pk, 'MAÑANA')]), {segunda.pk: 1, tercera.pk: 2})
+
+        tercera.delete()
+        self.assertEqual(self.colas.order(self.doctor.pk, 'MAÑANA'), [segunda.pk])
+        self.assertEqual(self.colas.order(self.doctor.pk, 'TARDE'), [])
+
+    @override_settings(CONSULTATION_EVENTS_POLL_SECONDS=60)
+    def test_cached_order_does_not_query(self):
+        self._consulta(time(8, 0), 'Nivel IV', 1)
+        self.colas.order(self.doctor.pk, 'MAÑANA')
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                self.colas.positions([(self.doctor.pk, 'MAÑANA')])
+
+
+from doctors.services import call_next_consultation
+from users.models import WaitTimeRollup
+from users.wait_times import percentile, rollup_wait_times
+
+
+class WaitTimeRollupTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.specialty = Specialty.objects.create(name='Clínica', description='General')
+        cls.doctor_user = Users.objects.create_user(username='dr_espera', password='123', email='espera@test.com', is_doctor=True)
+        cls.doctor = Doctor.objects.create(user=cls.doctor_user, specialty=cls.specialty, bio='Bio')
+        cls.patient = Patient.objects.create(
+            first_name='Ema', last_name='Espera', phone='12345678',
+            identification_type='CI', identification_number='5550001',
+            gender='Female', date_of_birth=date(1990, 1, 1),
+            address_line='Calle 1', city='City', region='Region', postal_code='1111',
+            emergency_contact_name='E', emergency_contact_relationship='Madre',
+            emergency_contact_phone='98765432'
+        )
+        cls.fecha = date(2026, 3, 2)
+
+    def _consulta(self, hora, shift='MAÑANA', fecha=None):
+        return Consultation.objects.create(
+            description='Control', date=fecha or self.fecha, time=hora, shift=shift, order=hora.hour * 60 + hora.minute,
+            consultorio='c1', doctor=self.doctor, patient=self.patient
+        )
+
+    def _evento(self, consulta, event, hora):
+        evento = record_status_event(consulta, event)
+        ConsultationStatusEvent.objects.filter(pk=evento.pk).update(
+            occurred_at=timezone.make_aware(datetime.combine(self.fecha, hora))
+        )
+
+    def test_percentile_interpolates(self):
+        self.assertEqual(percentile([10.0], 90), 10.0)
+        self.assertEqual(percentile([0.0, 10.0, 20.0, 30.0, 40.0], 50), 20.0)
+        self.assertAlmostEqual(percentile([0.0, 10.0], 90), 9.0)
+
+    def test_rollup_levels(self):
+        # Espera desde la hora agendada hasta el primer llamado
+        for minutos in range(1, 11):
+            consulta = self._consulta(time(8, minutos))
+            self._evento(consulta, 'created', time(7, 0))
+            self._evento(consulta, 'called', time(8, 2 * minutos))
+            self._evento(consulta, 'requeued', time(8, 2 * minutos + 1))
+            self._evento(consulta, 'called', time(9, 0))
+        # Alta posterior a la hora agendada: la espera cuenta desde el alta
+        tarde = self._consulta(time(14, 0), shift='TARDE')
+        self._evento(tarde, 'created', time(14, 30))
+        self._evento(tarde, 'attended', time(14, 45))
+        # Llamado antes de la hora agendada: espera cero
+        temprano = self._consulta(time(15, 0), shift='TARDE')
+        self._evento(temprano, 'called', time(14, 50))
+        # Sin llamar todavía: no cuenta
+        self._evento(self._consulta(time(16, 0), shift='TARDE'), 'created', time(14, 0))
+
+        self.assertEqual(rollup_wait_times(self.fecha), 7)
+        dia = WaitTimeRollup.objects.get(date=self.fecha, level='day')
+        self.assertEqual(dia.count, 12)
+        self.assertEqual(dia.max, 15.0)
+        manana = WaitTimeRollup.objects.get(date=self.fecha, level='doctor', shift='MAÑANA')
+        self.assertEqual((manana.count, manana.p50, manana.max), (10, 5.5, 10.0))
+        self.assertEqual(manana.specialty_id, self.specialty.pk)
+        self.assertAlmostEqual(manana.p90, 9.1)
+        tarde = WaitTimeRollup.objects.get(date=self.fecha, level='specialty', shift='TARDE')
+        self.assertEqual((tarde.count, tarde.p50, tarde.mean), (2, 7.5, 7.5))
+
+        # Se puede recalcular sin duplicar filas
+        call_command('rollup_wait_times', '--date', self.fecha.isoformat(), '--days', '1', stdout=StringIO())
+        self.assertEqual(WaitTimeRollup.objects.filter(date=self.fecha).count(), 7)
+
+    def test_events_are_append_only(self):
+        evento = record_status_event(self._consulta(time(8, 0)), 'created')
+        with self.assertRaises(ValueError):
+            evento.save()
+
+    def test_call_next_records_actor(self):
+        hoy = timezone.localdate()
+        consulta = self._consulta(time(8, 0), fecha=hoy)
+        self.assertEqual(call_next_consultation(self.doctor, hoy, 'MAÑANA', actor=self.doctor_user), consulta)
+        evento = ConsultationStatusEvent.objects.get(consultation_id=consulta.pk)
+        self.assertEqual((evento.event, evento.actor, evento.doctor_id), ('called', self.doctor_user, self.doctor.pk))
@@ -0,0 +1,102 @@
+"""
+Medición por request: cantidad y tiempo de SQL, tiempo de render de templates y las consultas
+más lentas. Lo usa ServerTimingMiddleware (users/middleware.py); fuera de un request medido
+los hooks no hacen nada.
+"""
+import contextvars
+import functools
+import heapq
+import itertools
+from contextlib import ExitStack, contextmanager
+from time import perf_counter
+from django.db import connections
+from django.template.backends.django import Template as DjangoTemplate
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+# Largo máximo del SQL guardado para el log de requests lentos
+SQL_MAX_LENGTH = 500
+
+
+class RequestMetrics:
+    """Acumula las mediciones de un request; tiempos en segundos"""
+
+    def __init__(self, top_sql=5):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.view_started = None
+        self.top_sql = top_sql
+        self._slowest = []
+        self._seq = itertools.count()
+
+    def record_query(self, sql, duracion):
+        self.queries += 1
+        self.db_time += duracion
+        if self.top_sql <= 0:
+            return
+        # Montículo de tamaño fijo con las consultas más lentas
+        item = (duracion, next(self._seq), sql[:SQL_MAX_LENGTH])
+        if len(self._slowest) < self.top_sql:
+            heapq.heappush(self._slowest, item)
+        elif duracion > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, item)
+
+    def slowest_queries(self):
+        """[(segundos, sql)] de la más lenta a la más rápida"""
+        return [(duracion, sql) for duracion, _, sql in sorted(self._slowest, reverse=True)]
+
+
+def current_metrics():
+    """Mediciones del request en curso, o None si no se está midiendo"""
+    return _current.get()
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    inicio = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, perf_counter() - inicio)
+
+
+@contextmanager
+def collect_metrics(top_sql=5):
+    """Mide el SQL de todas las conexiones y el render de templates dentro del bloque"""
+    metrics = RequestMetrics(top_sql)
+    token = _current.set(metrics)
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(_query_wrapper))
+            yield metrics
+    finally:
+        _current.reset(token)
+
+
+def install_template_timer():
+    """
+    Envuelve una sola vez el render del backend de templates de Django.
+    Solo se mide el template principal (los include no pasan por el backend);
+    el tiempo incluye el SQL que se ejecute al recorrer querysets en el template.
+    """
+    if getattr(DjangoTemplate.render, '_timed', False):
+        return
+    original = DjangoTemplate.render
+
+    @functools.wraps(original)
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return original(self, context, request)
+        inicio = perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            metrics.template_time += perf_counter() - inicio
+
+    render._timed = True
+    DjangoTemplate.render = render
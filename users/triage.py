@@ -0,0 +1,174 @@
+"""
+Cola de atención por triage: orden en que cada doctor atiende a sus pacientes en espera del día.
+Manda la prioridad (Nivel I primero) y dentro de cada nivel el número de orden. Para que los de baja
+prioridad no esperen para siempre, la espera real (desde la hora agendada, o desde el alta si se
+agendó después, igual que en users/wait_times.py) sube la consulta un nivel cada TRIAGE_AGING_MINUTES,
+hasta llegar al Nivel II (o hasta TRIAGE_MAX_BOOST niveles si se define) y nunca hasta el Nivel I. Una vez
+en el Nivel II, el número de orden la desempata con los Nivel II que llegan después.
+El mismo orden se calcula en la base (triage_order_by, para llamar al siguiente con una sola consulta)
+y en memoria (TriageQueues, para mostrar la posición de cada paciente): cada cola (doctor, turno) se
+actualiza con cada alta o cambio de estado (ConsultationEvent, ver DailySnapshot en users/events.py) y
+solo se vuelve a ordenar cuando cambia o cuando alguna de sus consultas sube de nivel.
+"""
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.db.models import Case, Exists, F, Max, OuterRef, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .events import DailySnapshot
+from .models import Consultation, ConsultationStatusEvent
+
+WAITING_STATUS = 'EN ESPERA'
+
+# Posición de cada prioridad en priority_choices (Nivel I primero)
+PRIORITY_RANKS = {valor: rango for rango, (valor, _) in enumerate(Consultation.priority_choices)}
+# Una prioridad desconocida va después de todas
+UNKNOWN_RANK = len(PRIORITY_RANKS)
+
+
+def aging_minutes():
+    return getattr(settings, 'TRIAGE_AGING_MINUTES', 60)
+
+
+def max_boost():
+    """Niveles que puede subir una consulta por la espera; sin TRIAGE_MAX_BOOST, los que haga falta para llegar al Nivel II"""
+    if not aging_minutes():
+        return 0
+    tope = getattr(settings, 'TRIAGE_MAX_BOOST', None)
+    return UNKNOWN_RANK - 1 if tope is None else tope
+
+
+def waiting_since(fecha, hora, llegada=None):
+    """Momento desde el que espera el paciente: la hora agendada, o el alta si fue posterior"""
+    agendada = timezone.make_aware(datetime.combine(fecha, hora))
+    return max(agendada, llegada) if llegada else agendada
+
+
+def aging_boost(desde, ahora):
+    """Niveles que sube una consulta que espera desde `desde`"""
+    if not max_boost():
+        return 0
+    minutos = (ahora - desde).total_seconds() / 60
+    return min(max(int(minutos // aging_minutes()), 0), max_boost())
+
+
+def triage_rank(priority, desde, ahora):
+    """Nivel efectivo de la consulta (0 es Nivel I); la espera no alcanza para llegar al Nivel I"""
+    rango = PRIORITY_RANKS.get(priority, UNKNOWN_RANK)
+    return rango if rango == 0 else max(rango - aging_boost(desde, ahora), 1)
+
+
+def _waiting_before(fecha, limite):
+    """Condición de las consultas de `fecha` que esperan desde `limite` o antes, o None si ninguna"""
+    local = timezone.localtime(limite)
+    if local.date() < fecha:
+        return None
+    agendada = Q(time__lte=local.time()) if local.date() == fecha else Q()
+    alta_posterior = ConsultationStatusEvent.objects.filter(
+        consultation_id=OuterRef('pk'), event='created', occurred_at__gt=limite
+    )
+    return agendada & ~Exists(alta_posterior)
+
+
+def triage_order_by(fecha, ahora=None):
+    """Expresiones de order_by con el orden de la cola, para las consultas en espera de `fecha`"""
+    ahora = ahora or timezone.now()
+    rango = Case(
+        *[When(priority=valor, then=Value(r)) for valor, r in PRIORITY_RANKS.items()],
+        default=Value(UNKNOWN_RANK),
+    )
+    # Niveles ganados por la espera, del mayor al menor
+    niveles = []
+    for boost in range(max_boost(), 0, -1):
+        condicion = _waiting_before(fecha, ahora - timedelta(minutes=boost * aging_minutes()))
+        if condicion is not None:
+            niveles.append(When(condicion, then=Value(boost)))
+    subida = Case(*niveles, default=Value(0)) if niveles else Value(0)
+    efectivo = Case(
+        When(priority=Consultation.priority_choices[0][0], then=Value(0)),
+        default=Greatest(rango - subida, Value(1)),
+    )
+    return [efectivo, F('order'), F('pk')]
+
+
+class TriageQueues(DailySnapshot):
+    rebuild_setting = 'TRIAGE_REBUILD_SECONDS'
+
+    def __init__(self):
+        super().__init__()
+        # (doctor_id, turno) -> {id de consulta: (prioridad, espera desde, orden)}
+        self._queues = {}
+        # id de consulta -> (doctor_id, turno) de la cola en la que está
+        self._entries = {}
+        # id de consulta -> momento del alta (evento 'created' de ConsultationStatusEvent)
+        self._arrivals = {}
+        # (doctor_id, turno) -> (ids en orden de atención, momento en que alguna sube de nivel)
+        self._ordered = {}
+
+    def order(self, doctor_id, shift):
+        """Ids de las consultas en espera de hoy del doctor y turno, en orden de atención"""
+        with self._lock:
+            self._refresh()
+            return list(self._ordered_ids((doctor_id, shift), timezone.now()))
+
+    def positions(self, queues):
+        """{id de consulta: posición desde 1} para las colas (doctor_id, turno) indicadas"""
+        with self._lock:
+            self._refresh()
+            ahora = timezone.now()
+            return {
+                pk: posicion
+                for clave in queues
+                for posicion, pk in enumerate(self._ordered_ids(clave, ahora), start=1)
+            }
+
+    def _ordered_ids(self, clave, ahora):
+        ordenada = self._ordered.get(clave)
+        if ordenada is None or ordenada[1] <= ahora:
+            cola = self._queues.get(clave, {})
+            ids = sorted(cola, key=lambda pk: (triage_rank(cola[pk][0], cola[pk][1], ahora), cola[pk][2], pk))
+            ordenada = self._ordered[clave] = (ids, self._next_promotion(cola.values(), ahora))
+        return ordenada[0]
+
+    def _next_promotion(self, entradas, ahora):
+        """Próximo momento en que alguna consulta de la cola sube de nivel"""
+        proximo = datetime.max.replace(tzinfo=timezone.get_current_timezone())
+        for priority, desde, _ in entradas:
+            boost = aging_boost(desde, ahora)
+            if boost < max_boost() and triage_rank(priority, desde, ahora) > 1:
+                proximo = min(proximo, desde + timedelta(minutes=(boost + 1) * aging_minutes()))
+        return proximo
+
+    def _load(self, hoy):
+        self._queues, self._entries, self._ordered = {}, {}, {}
+        altas = ConsultationStatusEvent.objects.filter(date=hoy, event='created').values('consultation_id')
+        self._arrivals = dict(altas.annotate(llegada=Max('occurred_at')).values_list('consultation_id', 'llegada'))
+        filas = Consultation.objects.filter(date=hoy, status=WAITING_STATUS, doctor__isnull=False).values_list(
+            'id', 'doctor_id', 'shift', 'time', 'priority', 'order'
+        )
+        for pk, doctor_id, shift, hora, priority, order in filas:
+            clave = (doctor_id, shift)
+            self._queues.setdefault(clave, {})[pk] = (priority, waiting_since(hoy, hora, self._arrivals.get(pk)), order)
+            self._entries[pk] = clave
+
+    def _apply(self, evento):
+        data = evento['data']
+        pk = evento['consultation_id']
+        if evento['action'] == 'created':
+            self._arrivals[pk] = evento['created_at']
+        anterior = self._entries.pop(pk, None)
+        if anterior is not None:
+            del self._queues[anterior][pk]
+            self._ordered.pop(anterior, None)
+        if (evento['action'] != 'deleted' and data.get('status') == WAITING_STATUS
+                and data.get('doctor_id') and self._is_today(data)):
+            clave = (data['doctor_id'], data['shift'])
+            desde = waiting_since(self._date, time.fromisoformat(data['time']), self._arrivals.get(pk))
+            self._queues.setdefault(clave, {})[pk] = (data.get('priority'), desde, data['order'])
+            self._entries[pk] = clave
+            self._ordered.pop(clave, None)
+        elif evento['action'] == 'deleted':
+            self._arrivals.pop(pk, None)
+
+
+triage_queues = TriageQueues()
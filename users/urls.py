@@ -1,5 +1,5 @@
 from django.urls import path, include
-from .views import login_view, logout_view, dashboard_view
+from .views import login_view, logout_view, dashboard_view, metrics_view
 from django.conf.urls.static import static
 from django.conf import settings
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
@@ -10,6 +10,7 @@ urlpatterns = [
     path('logout/', logout_view, name='logout'),
     path('dashboard/', dashboard_view, name='dashboard'), # Dashboard general
     path('password-reset/', login_view, name='password-reset'), #temporal para que pueda recuperar contraseña
+    path('metrics', metrics_view, name='metrics'),  # Métricas para Prometheus
     
     path('doctors/', include('doctors.urls')),
     path('recepcion/', include('reception.urls')),
@@ -3,6 +3,11 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from .metrics import render_metrics
+from .roles import ROLE_ADMIN, ROLE_DOCTOR, ROLE_RECEPTION, request_role
 
 # Obtener el modelo de usuario personalizado
 Users = get_user_model()
@@ -33,12 +38,13 @@ def login_view(request):
 def dashboard_view(request):
     """Vista que redirecciona al dashboard especifico según el rol"""
     user = request.user
+    role = request_role(request)
 
-    if hasattr(user, 'doctor'):
+    if role == ROLE_DOCTOR:
         return redirect('doctor_dashboard')
-    elif hasattr(user, 'receptions'):
+    elif role == ROLE_RECEPTION:
         return redirect('reception_dashboard')
-    elif hasattr(user, 'administrator'):
+    elif role == ROLE_ADMIN:
         return redirect('admin_dashboard')
     else:
         return render(request, 'users/dashboard.html', {
@@ -54,3 +60,19 @@ def logout_view(request):
     logout(request)
     list(messages.get_messages(request))
     return redirect('login')
+
+
+# Métricas para Prometheus
+def metrics_view(request):
+    """
+    Exposición de métricas para el scraper ("Authorization: Bearer <METRICS_TOKEN>") o para un
+    administrador con sesión iniciada. Sin token configurado solo la ven los administradores.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    con_token = bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    es_admin = request.user.is_authenticated and (
+        request.user.is_staff or request.user.is_superuser or request_role(request) == ROLE_ADMIN
+    )
+    if not con_token and not es_admin:
+        return HttpResponse(status=403)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,117 @@
+"""
+Tiempos de espera de las consultas.
+Las vistas de recepción y de los doctores registran cada cambio de estado en ConsultationStatusEvent
+(solo inserción, con momento y usuario). La espera de una consulta es el tiempo desde que el paciente
+debía estar (la hora agendada, o el alta si se agendó después) hasta que el doctor lo llama; si pasó
+directo a atendido, hasta ese momento. El comando rollup_wait_times resume cada día en WaitTimeRollup
+con p50, p90 y p99 por día, turno, especialidad y médico.
+"""
+import math
+from collections import defaultdict
+from datetime import datetime
+from django.db import transaction
+from django.utils import timezone
+from .models import ConsultationStatusEvent, Doctor, WaitTimeRollup
+
+# Evento que corresponde a cada estado de la consulta
+STATUS_EVENTS = {
+    'EN ESPERA': 'requeued',
+    'EN CONSULTA': 'called',
+    'ATENDIDO': 'attended',
+    'CANCELADA': 'cancelled',
+}
+# Eventos que terminan la espera
+CALL_EVENTS = ('called', 'attended')
+
+
+def record_status_event(consulta, event, actor=None):
+    """Registra un evento de la consulta con su cola actual; `actor` es el usuario que lo hizo"""
+    specialty_id = None
+    if consulta.doctor_id:
+        specialty_id = Doctor.objects.filter(pk=consulta.doctor_id).values_list('specialty_id', flat=True).first()
+    return ConsultationStatusEvent.objects.create(
+        consultation_id=consulta.pk,
+        event=event,
+        actor=actor if actor is not None and actor.is_authenticated else None,
+        date=consulta.date,
+        scheduled_time=consulta.time,
+        shift=consulta.shift,
+        doctor_id=consulta.doctor_id,
+        specialty_id=specialty_id,
+    )
+
+
+def record_status_change(consulta, estado_anterior, actor=None):
+    """Registra el evento del estado nuevo si cambió; devuelve el evento o None"""
+    if consulta.status == estado_anterior or consulta.status not in STATUS_EVENTS:
+        return None
+    return record_status_event(consulta, STATUS_EVENTS[consulta.status], actor)
+
+
+def percentile(valores, p):
+    """Percentil `p` (0-100) de una lista ordenada, con interpolación lineal"""
+    if len(valores) == 1:
+        return valores[0]
+    posicion = (len(valores) - 1) * p / 100
+    inferior = math.floor(posicion)
+    superior = min(inferior + 1, len(valores) - 1)
+    return valores[inferior] + (valores[superior] - valores[inferior]) * (posicion - inferior)
+
+
+def wait_times(fecha):
+    """
+    Esperas de las consultas del día que ya fueron llamadas, como dicts con minutos, doctor,
+    especialidad y turno (los de la cola en la que se las llamó). Lee solo los eventos del día.
+    """
+    eventos = ConsultationStatusEvent.objects.filter(date=fecha).order_by('occurred_at', 'id').values(
+        'consultation_id', 'event', 'occurred_at', 'scheduled_time', 'shift', 'doctor_id', 'specialty_id'
+    )
+    altas, esperas = {}, {}
+    for evento in eventos:
+        pk = evento['consultation_id']
+        if evento['event'] == 'created':
+            altas.setdefault(pk, evento['occurred_at'])
+        elif evento['event'] in CALL_EVENTS and pk not in esperas:
+            agendada = timezone.make_aware(datetime.combine(fecha, evento['scheduled_time']))
+            desde = max(agendada, altas.get(pk, agendada))
+            esperas[pk] = {
+                'minutes': max((evento['occurred_at'] - desde).total_seconds() / 60, 0.0),
+                'doctor_id': evento['doctor_id'],
+                'specialty_id': evento['specialty_id'],
+                'shift': evento['shift'],
+            }
+    return list(esperas.values())
+
+
+def _summary(minutos):
+    minutos = sorted(minutos)
+    return {
+        'count': len(minutos),
+        'p50': percentile(minutos, 50),
+        'p90': percentile(minutos, 90),
+        'p99': percentile(minutos, 99),
+        'mean': sum(minutos) / len(minutos),
+        'max': minutos[-1],
+    }
+
+
+def rollup_wait_times(fecha):
+    """Recalcula los resúmenes de espera del día (se puede repetir); devuelve cuántas filas quedaron"""
+    grupos = defaultdict(list)
+    for espera in wait_times(fecha):
+        shift = espera['shift']
+        grupos[('day', None, None, '')].append(espera['minutes'])
+        grupos[('shift', None, None, shift)].append(espera['minutes'])
+        if espera['specialty_id']:
+            grupos[('specialty', None, espera['specialty_id'], shift)].append(espera['minutes'])
+        if espera['doctor_id']:
+            grupos[('doctor', espera['doctor_id'], espera['specialty_id'], shift)].append(espera['minutes'])
+    filas = [
+        WaitTimeRollup(date=fecha, level=level, doctor_id=doctor_id, specialty_id=specialty_id, shift=shift,
+                       **_summary(minutos))
+        for (level, doctor_id, specialty_id, shift), minutos in grupos.items()
+    ]
+    with transaction.atomic():
+        WaitTimeRollup.objects.filter(date=fecha).delete()
+        WaitTimeRollup.objects.bulk_create(filas)
+    return len(filas)
@@ -0,0 +1,99 @@
+"""
+Tablero público de la sala de espera: número llamado y siguientes de cada turno por consultorio.
+Cada proceso guarda en memoria las consultas en espera y en consulta del día (consultorio, turno,
+estado, orden) y las actualiza con los ConsultationEvent (users/events.py) que dejan los cambios
+de estado de los doctores y de recepción, leyendo la tabla de eventos como mucho cada CONSULTATION_EVENTS_POLL_SECONDS: las
+pantallas que consultan cada pocos segundos no tocan la tabla de consultas.
+La versión es el id de evento hasta el que ya no pueden llegar cambios atrasados (settled_id de
+EventCursor); un cliente que la envía recibe los turnos que cambiaron desde entonces, incluidos los
+de los últimos segundos aunque ya los haya recibido.
+"""
+from django.conf import settings
+from .events import DailySnapshot
+from .models import Consultation
+
+# Estados con los que una consulta aparece en el tablero
+WAITING_STATUS = 'EN ESPERA'
+CALLED_STATUS = 'EN CONSULTA'
+BOARD_STATUSES = (WAITING_STATUS, CALLED_STATUS)
+
+
+class WaitingBoard(DailySnapshot):
+    rebuild_setting = 'WAITING_BOARD_REBUILD_SECONDS'
+
+    def __init__(self):
+        super().__init__()
+        # consultorio -> turno -> {id de consulta: (estado, orden)}
+        self._queues = {}
+        # id de consulta -> (consultorio, turno, estado, orden)
+        self._positions = {}
+        # (consultorio, turno) -> id del último evento que lo cambió
+        self._versions = {}
+
+    def snapshot(self, consultorio, since=None):
+        """
+        Turnos del consultorio con el último número llamado y los siguientes en espera.
+        Con `since` (una versión devuelta antes) solo se incluyen los turnos que cambiaron después de ella.
+        Las versiones anteriores a la última reconstrucción reciben el tablero completo.
+        """
+        with self._lock:
+            self._refresh()
+            completo = since is None or since < self._base_version
+            colas = self._queues.get(consultorio, {})
+            turnos = [
+                self._shift_board(shift, etiqueta, colas.get(shift, {}))
+                for shift, etiqueta in Consultation.shift_choices
+                if completo or self._versions.get((consultorio, shift), 0) > since
+            ]
+            return {
+                'consultorio': consultorio,
+                'date': self._date.isoformat(),
+                'version': self._events.settled_id,
+                'full': completo,
+                'shifts': turnos,
+            }
+
+    def _shift_board(self, shift, etiqueta, cola):
+        llamados = sorted(order for status, order in cola.values() if status == CALLED_STATUS)
+        espera = sorted(order for status, order in cola.values() if status == WAITING_STATUS)
+        return {
+            'shift': shift,
+            'shift_display': etiqueta,
+            'current': llamados[-1] if llamados else None,
+            'next': espera[:getattr(settings, 'WAITING_BOARD_NEXT_COUNT', 3)],
+            'waiting': len(espera),
+        }
+
+    def _load(self, hoy):
+        filas = Consultation.objects.filter(date=hoy, status__in=BOARD_STATUSES).values_list(
+            'id', 'consultorio', 'shift', 'status', 'order'
+        )
+        self._queues, self._positions, self._versions = {}, {}, {}
+        for pk, *posicion in filas:
+            self._place(pk, tuple(posicion))
+
+    def _apply(self, evento):
+        data = evento['data']
+        pk = evento['consultation_id']
+        nueva = None
+        if evento['action'] != 'deleted' and data.get('status') in BOARD_STATUSES and self._is_today(data):
+            nueva = (data['consultorio'], data['shift'], data['status'], data['order'])
+        anterior = self._positions.get(pk)
+        if nueva == anterior:
+            return
+        if anterior is not None:
+            consultorio, shift = anterior[:2]
+            del self._queues[consultorio][shift][pk]
+            del self._positions[pk]
+            self._versions[(consultorio, shift)] = evento['id']
+        if nueva is not None:
+            self._place(pk, nueva)
+            self._versions[nueva[:2]] = evento['id']
+
+    def _place(self, pk, posicion):
+        consultorio, shift, status, order = posicion
+        self._queues.setdefault(consultorio, {}).setdefault(shift, {})[pk] = (status, order)
+        self._positions[pk] = posicion
+
+
+waiting_board = WaitingBoard()